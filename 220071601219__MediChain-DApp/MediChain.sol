@@ -10,10 +10,22 @@ contract MediChain {
 
     mapping(address => Patient) public patientInfo;
     mapping(address => Doctor) public doctorInfo;
-    mapping(string => address) public emailToAddress;
-    mapping(string => uint) public emailToDesignation;
-    mapping(uint => Transactions) public transactions;
+    mapping(bytes32 => EmailEntry) public emailRegistry; // emailKey(email) => registered account
+    mapping(uint => Transactions) private transactions; // read with getTransaction (fills in the settled flag)
     uint[] public transactionIds; // Store the list of transaction IDs
+    mapping(uint => uint) private settledBitmap; // transaction ID / 256 => settled flags of 256 transactions
+    mapping(address => uint) private unsettledOwed; // running total of unsettled transactions sent by an address
+    mapping(address => uint) private unsettledDue; // running total of unsettled transactions received by an address
+    mapping(bytes32 => RecordBatch) public recordBatches; // Merkle root => anchored batch of records
+    // false: audit history lives only in AuditLogged logs (cheaper writes, read it from logs)
+    bool public immutable storeAuditHistory;
+    // Deployer importing an earlier deployment (migratePatient/...); address(0) unless deployed for a
+    // migration, and once finishMigration() is called
+    address public migrator;
+
+    // 1-based positions in the access lists (0 = no access), for O(1) lookups and swap-and-pop removal
+    mapping(address => mapping(address => uint)) private doctorAccessIndex;  // patient => doctor => position
+    mapping(address => mapping(address => uint)) private patientAccessIndex; // doctor => patient => position
 
     struct Patient {
         string name;
@@ -23,8 +35,9 @@ contract MediChain {
         bool policyActive; // Placeholder for future policies
         uint[] transactions;
         address[] doctorAccessList;
-        Event[] medicalEvents;  // Audit history for medical events
-        string[] medicalRecords; // IPFS hashes of medical records (versioned)
+        AuditEntry[] medicalEvents;  // Audit history for medical events (empty without storeAuditHistory)
+        bytes32[] medicalRecords; // sha2-256 digests of the records' IPFS CIDs (versioned, see cid_codec.py), indexed by record id
+        uint deletedRecords; // records deleted from medicalRecords (their slots are zeroed, never reused)
     }
 
     struct Doctor {
@@ -40,105 +53,231 @@ contract MediChain {
         address sender;
         address receiver;
         uint value;
-        bool settled;
+        bool settled;  // filled in from settledBitmap by the getters (never stored)
     }
 
-    struct Event {
+    // Registered account for an email, packed into a single slot
+    struct EmailEntry {
+        address account;
+        uint8 designation;  // 1 = patient, 2 = doctor
+    }
+
+    enum AuditAction { Register, CreateOrUpdateRecord, DeleteRecord }
+
+    // Stored audit entry, packed into a single slot (20-byte actor, 5-byte timestamp, 1-byte action)
+    struct AuditEntry {
         address actor;  // Who modified the record
-        string action;  // Action performed (e.g., "update", "access", "delete")
-        uint timestamp;  // When it happened
+        uint40 timestamp;  // When it happened
+        AuditAction action;  // Action performed
+    }
+
+    // Records committed as one Merkle root instead of one slot each, packed into a single slot
+    struct RecordBatch {
+        address submitter;  // Doctor who anchored the root
+        uint40 timestamp;  // When it was anchored (0 = unknown root)
+        uint32 count;  // Number of (patient, ipfsHash) leaves
+    }
+
+    // Audit entry as returned by the getters, with the action spelled out
+    struct Event {
+        address actor;
+        string action;  // "register", "create/update record" or "delete record"
+        uint timestamp;
+    }
+
+    // A page of a patient's records with their ids (built by recordsPage)
+    struct RecordsPage {
+        uint[] ids;
+        bytes32[] records;
+        uint next;  // record id the next page starts at (0 = no more)
+    }
+
+    // Dashboard aggregates returned by getPatientOverview / getDoctorOverview
+    struct DoctorEntry {
+        address doctor;
+        string name;
+    }
+
+    struct PatientOverview {
+        string name;
+        string email;
+        uint age;
+        bool exists;
+        bool policyActive;
+        uint recordsTotal;
+        uint[] recordIds;  // one page, with the matching records
+        bytes32[] records;
+        uint recordsNext;  // record id the next page starts at (0 = no more)
+        uint eventsTotal;
+        Event[] events;  // one page
+        uint transactionsTotal;
+        Transactions[] transactions;  // one page
+        DoctorEntry[] doctors;  // the whole doctor directory
+    }
+
+    struct PatientSummary {
+        address patient;
+        string name;
+        uint recordsCount;
+        uint[] recordIds;  // the first records, with their ids
+        bytes32[] records;
+        uint recordsNext;  // record id the next page starts at (0 = no more)
+    }
+
+    struct DoctorOverview {
+        string name;
+        string email;
+        bool exists;
+        uint patientsTotal;
+        PatientSummary[] patients;  // one page of the access list
+        uint transactionsTotal;
+        Transactions[] transactions;  // one page
     }
 
     // Events for frontend notifications
-    event MedicalRecordUpdated(address indexed patient, string ipfsHash, uint timestamp);
-    event MedicalRecordDeleted(address indexed patient, uint index, uint timestamp);
+    event MedicalRecordUpdated(address indexed patient, uint recordId, bytes32 ipfsHash, uint timestamp);
+    event MedicalRecordDeleted(address indexed patient, uint recordId, uint timestamp);
     event AccessGranted(address indexed patient, address indexed doctor);
     event AccessRevoked(address indexed patient, address indexed doctor);
-    event PatientRegistered(address indexed patient, string email, uint designation);
-    event DoctorRegistered(address indexed doctor, string email);
-
-    constructor() {
+    event PatientRegistered(address indexed patient, string name, string email, uint age, uint designation);
+    event DoctorRegistered(address indexed doctor, string name, string email);
+    event TransactionCreated(uint id, address indexed sender, address indexed receiver, uint value);
+    event TransactionSettled(uint id, address indexed sender, address indexed receiver);
+    event RecordBatchAnchored(bytes32 indexed root, address indexed submitter, uint count, uint timestamp);
+    event MedicalRecordAnchored(address indexed patient, bytes32 indexed root, uint position, bytes32 ipfsHash, uint timestamp);
+    event AuditLogged(address indexed patient, address indexed actor, AuditAction action, uint timestamp);
+
+    constructor(bool _storeAuditHistory, bool _migrating) {
         name = "MediChain";
         transactionCount = 0;
+        storeAuditHistory = _storeAuditHistory;
+        migrator = _migrating ? msg.sender : address(0);
     }
 
     // Register patients and doctors
-    function register(string memory _name, uint _age, uint _designation, string memory _email, string memory _ipfsHash) public {
+    function register(string memory _name, uint _age, uint _designation, string memory _email, bytes32 _ipfsHash) public {
         require(msg.sender != address(0), "Invalid address");
-        require(bytes(_name).length > 0, "Name is required");
-        require(bytes(_email).length > 0, "Email is required");
-        require(emailToAddress[_email] == address(0), "Email already registered");
-        require(emailToDesignation[_email] == 0, "Designation already set");
-
-        address _addr = msg.sender;
-        require(!patientInfo[_addr].exists, "Already registered as patient");
-        require(!doctorInfo[_addr].exists, "Already registered as doctor");
 
         if (_designation == 1) { // Patient
-            require(_age > 0, "Age must be greater than 0");
-            require(bytes(_ipfsHash).length > 0, "IPFS hash is required for patient");
-
-            Patient storage pinfo = patientInfo[_addr];
-            pinfo.name = _name;
-            pinfo.email = _email;
-            pinfo.age = _age;
-            pinfo.exists = true;
-            pinfo.medicalRecords.push(_ipfsHash);
-            pinfo.medicalEvents.push(Event(_addr, "register", block.timestamp));
-            patientList.push(_addr);
-            emailToAddress[_email] = _addr;
-            emailToDesignation[_email] = _designation;
-
-            emit PatientRegistered(_addr, _email, _designation);
+            require(_ipfsHash != bytes32(0), "IPFS hash is required for patient");
+            registerPatient(msg.sender, _name, _email, _age);
+            patientInfo[msg.sender].medicalRecords.push(_ipfsHash);
+            logAudit(msg.sender, AuditAction.Register);
+            // Logged like any other record, so the initial record can be indexed from logs alone
+            emit MedicalRecordUpdated(msg.sender, 0, _ipfsHash, block.timestamp);
 
         } else if (_designation == 2) { // Doctor
-            Doctor storage dinfo = doctorInfo[_addr];
-            dinfo.name = _name;
-            dinfo.email = _email;
-            dinfo.exists = true;
-            doctorList.push(_addr);
-            emailToAddress[_email] = _addr;
-            emailToDesignation[_email] = _designation;
-
-            emit DoctorRegistered(_addr, _email);
+            registerDoctor(msg.sender, _name, _email);
 
         } else {
             revert("Invalid designation");
         }
     }
 
+    // Import a patient of an earlier deployment (records follow with migrateRecords)
+    function migratePatient(address _patient, string memory _name, string memory _email, uint _age) public {
+        require(msg.sender == migrator, "Only the migrator can import accounts");
+        registerPatient(_patient, _name, _email, _age);
+    }
+
+    // Import a doctor of an earlier deployment
+    function migrateDoctor(address _doctor, string memory _name, string memory _email) public {
+        require(msg.sender == migrator, "Only the migrator can import accounts");
+        registerDoctor(_doctor, _name, _email);
+    }
+
+    // Append records of an earlier deployment, converted to digests off-chain (cid_codec.py);
+    // a zero digest imports a deleted record, so record ids carry over
+    function migrateRecords(address _patient, bytes32[] calldata _ipfsHashes) external {
+        require(msg.sender == migrator, "Only the migrator can import records");
+        require(patientInfo[_patient].exists, "Patient is not registered");
+        Patient storage pinfo = patientInfo[_patient];
+        for (uint i = 0; i < _ipfsHashes.length; i++) {
+            pinfo.medicalRecords.push(_ipfsHashes[i]);
+            if (_ipfsHashes[i] == bytes32(0)) {
+                pinfo.deletedRecords++;
+            } else {
+                emit MedicalRecordUpdated(_patient, pinfo.medicalRecords.length - 1, _ipfsHashes[i], block.timestamp);
+            }
+        }
+    }
+
+    // Import a patient's doctor access list of an earlier deployment
+    function migrateAccess(address _patient, address[] calldata _doctors) external {
+        require(msg.sender == migrator, "Only the migrator can import access lists");
+        require(patientInfo[_patient].exists, "Patient not registered");
+        for (uint i = 0; i < _doctors.length; i++) {
+            require(doctorInfo[_doctors[i]].exists, "Doctor not registered");
+            require(!isDoctorAuthorized(_patient, _doctors[i]), "Doctor already has access");
+            addAccess(_patient, _doctors[i]);
+        }
+    }
+
+    // End the import: no account, record or access list can be migrated afterwards
+    function finishMigration() public {
+        require(msg.sender == migrator, "Only the migrator can finish the migration");
+        migrator = address(0);
+    }
+
     // Create or update the medical record
-    function createOrUpdateMedicalRecord(address _patient, string memory _ipfsHash) public {
+    function createOrUpdateMedicalRecord(address _patient, bytes32 _ipfsHash) public {
         require(doctorInfo[msg.sender].exists, "Only registered doctors can create/update medical records");
-        require(patientInfo[_patient].exists, "Patient is not registered");
-        require(isDoctorAuthorized(_patient, msg.sender), "Doctor not authorized for this patient");
+        addMedicalRecord(_patient, _ipfsHash);
+    }
 
-        // Update the medical record of the patient (versioning)
-        patientInfo[_patient].medicalRecords.push(_ipfsHash);
-        // Add event for auditing
-        patientInfo[_patient].medicalEvents.push(Event(msg.sender, "create/update record", block.timestamp));
+    // Create or update several records (for many patients or many files) in one transaction
+    function createOrUpdateMedicalRecords(address[] calldata _patients, bytes32[] calldata _ipfsHashes) external {
+        require(doctorInfo[msg.sender].exists, "Only registered doctors can create/update medical records");
+        require(_patients.length == _ipfsHashes.length, "Patients and records length mismatch");
+        for (uint i = 0; i < _patients.length; i++) {
+            addMedicalRecord(_patients[i], _ipfsHashes[i]);
+        }
+    }
+
+    // Anchor a batch of records as the root of a Merkle tree over recordLeaf(patient, ipfsHash):
+    // every record is checked against the patient's access list like addMedicalRecord, the root
+    // is computed here from the checked leaves, and only that one slot is written for the batch.
+    // Each record is logged (MedicalRecordAnchored) so it can be indexed and streamed; the
+    // proofs are kept off-chain (record_batches.py). Returns the root.
+    function anchorRecordBatch(address[] calldata _patients, bytes32[] calldata _ipfsHashes) external returns (bytes32 root) {
+        require(doctorInfo[msg.sender].exists, "Only registered doctors can anchor record batches");
+        require(_patients.length == _ipfsHashes.length, "Patients and records length mismatch");
+        require(_patients.length > 0, "Batch is empty");
+        bytes32[] memory nodes = new bytes32[](_patients.length);
+        for (uint i = 0; i < _patients.length; i++) {
+            require(patientInfo[_patients[i]].exists, "Patient is not registered");
+            require(isDoctorAuthorized(_patients[i], msg.sender), "Doctor not authorized for this patient");
+            require(_ipfsHashes[i] != bytes32(0), "IPFS hash is required");
+            nodes[i] = recordLeaf(_patients[i], _ipfsHashes[i]);
+        }
+        root = merkleRoot(nodes);
+        require(recordBatches[root].timestamp == 0, "Batch already anchored");
+        recordBatches[root] = RecordBatch(msg.sender, uint40(block.timestamp), uint32(_patients.length));
 
-        emit MedicalRecordUpdated(_patient, _ipfsHash, block.timestamp);
+        for (uint i = 0; i < _patients.length; i++) {
+            emit MedicalRecordAnchored(_patients[i], root, i, _ipfsHashes[i], block.timestamp);
+        }
+        emit RecordBatchAnchored(root, msg.sender, _patients.length, block.timestamp);
     }
 
-    // Delete a medical record
-    function deleteMedicalRecord(address _patient, uint _index) public {
+    // Delete a medical record by its id; later records keep their ids, so the cost
+    // does not depend on the record's position or the length of the history
+    function deleteMedicalRecord(address _patient, uint _recordId) public {
         require(patientInfo[_patient].exists, "Patient does not exist");
         // Only the patient or authorized doctor can delete
         require(msg.sender == _patient || isDoctorAuthorized(_patient, msg.sender), "Not authorized to delete records");
-        uint length = patientInfo[_patient].medicalRecords.length;
-        require(_index < length, "Index out of bounds");
+        Patient storage pinfo = patientInfo[_patient];
+        require(_recordId < pinfo.medicalRecords.length, "Record does not exist");
+        require(pinfo.medicalRecords[_recordId] != bytes32(0), "Record already deleted");
 
-        // Remove the record at _index by shifting and popping
-        for (uint i = _index; i < length - 1; i++) {
-            patientInfo[_patient].medicalRecords[i] = patientInfo[_patient].medicalRecords[i + 1];
-        }
-        patientInfo[_patient].medicalRecords.pop();
+        // Leave a zeroed slot (tombstone) in place of the record
+        delete pinfo.medicalRecords[_recordId];
+        pinfo.deletedRecords++;
 
         // Add event for auditing
-        patientInfo[_patient].medicalEvents.push(Event(msg.sender, "delete record", block.timestamp));
+        logAudit(_patient, AuditAction.DeleteRecord);
 
-        emit MedicalRecordDeleted(_patient, _index, block.timestamp);
+        emit MedicalRecordDeleted(_patient, _recordId, block.timestamp);
     }
 
     // Grant access to a doctor for a patient's medical record
@@ -147,11 +286,7 @@ contract MediChain {
         require(doctorInfo[_doctor].exists, "Doctor not registered");
         require(!isDoctorAuthorized(msg.sender, _doctor), "Doctor already has access");
 
-        // Add doctor to the patient's access list
-        patientInfo[msg.sender].doctorAccessList.push(_doctor);
-        doctorInfo[_doctor].patientAccessList.push(msg.sender);
-
-        emit AccessGranted(msg.sender, _doctor);
+        addAccess(msg.sender, _doctor);
     }
 
     // Revoke access from a doctor
@@ -161,8 +296,8 @@ contract MediChain {
         require(isDoctorAuthorized(msg.sender, _doctor), "Doctor does not have access");
 
         // Remove doctor from the access list
-        removeFromList(patientInfo[msg.sender].doctorAccessList, _doctor);
-        removeFromList(doctorInfo[_doctor].patientAccessList, msg.sender);
+        removeFromList(patientInfo[msg.sender].doctorAccessList, doctorAccessIndex[msg.sender], _doctor);
+        removeFromList(doctorInfo[_doctor].patientAccessList, patientAccessIndex[_doctor], msg.sender);
 
         emit AccessRevoked(msg.sender, _doctor);
     }
@@ -170,30 +305,48 @@ contract MediChain {
     // Create a transaction and store its ID
     function createTransaction(address _receiver, uint _value) public {
         require(msg.sender != _receiver, "Sender and receiver must be different");
+        addTransaction(msg.sender, _receiver, _value);
+    }
 
-        transactionCount++;
-        Transactions memory newTxn = Transactions({
-            id: transactionCount,
-            sender: msg.sender,
-            receiver: _receiver,
-            value: _value,
-            settled: false
-        });
-
-        transactions[transactionCount] = newTxn;
-        transactionIds.push(transactionCount); // Add transaction ID to list
-
-        Patient storage pinfo = patientInfo[msg.sender];
-        pinfo.transactions.push(transactionCount);
-        Doctor storage dinfo = doctorInfo[_receiver];
-        dinfo.transactions.push(transactionCount);
+    // Charge patients for care: one transaction per patient, with the patient as sender and this doctor as receiver
+    function createCharges(address[] calldata _patients, uint[] calldata _values) external {
+        require(doctorInfo[msg.sender].exists, "Only registered doctors can create charges");
+        require(_patients.length == _values.length, "Patients and values length mismatch");
+        for (uint i = 0; i < _patients.length; i++) {
+            require(patientInfo[_patients[i]].exists, "Patient is not registered");
+            require(isDoctorAuthorized(_patients[i], msg.sender), "Doctor not authorized for this patient");
+            require(_values[i] > 0, "Charge must be greater than 0");
+            addTransaction(_patients[i], msg.sender, _values[i]);
+        }
     }
 
     // Settle a transaction (update status)
     function settleTransaction(uint _transactionId) public {
-        Transactions storage txn = transactions[_transactionId];
-        require(msg.sender == txn.sender || msg.sender == txn.receiver, "Not authorized to settle this transaction");
-        txn.settled = true;
+        settle(_transactionId);
+    }
+
+    // Settle several transactions in one call; the flags of 256 consecutive IDs share one
+    // bitmap slot, so settling a run of recent transactions writes a handful of slots
+    function settleTransactions(uint[] calldata _transactionIds) external {
+        for (uint i = 0; i < _transactionIds.length; i++) {
+            settle(_transactionIds[i]);
+        }
+    }
+
+    // Check whether a transaction has been settled
+    function isTransactionSettled(uint _transactionId) public view returns (bool) {
+        return (settledBitmap[_transactionId >> 8] & (uint(1) << (_transactionId & 0xff))) != 0;
+    }
+
+    // Unsettled totals of an address: owed as sender and due as receiver, kept up to date
+    // by addTransaction and settle so the cost does not grow with the transaction history
+    function getUnsettledBalance(address _addr) public view returns (uint owed, uint due) {
+        return (unsettledOwed[_addr], unsettledDue[_addr]);
+    }
+
+    // Get a transaction with its settled flag (zeroed for unknown IDs)
+    function getTransaction(uint _transactionId) public view returns (Transactions memory) {
+        return loadTransaction(_transactionId);
     }
 
     // Get all transactions related to a specific address
@@ -202,14 +355,14 @@ contract MediChain {
             uint[] memory txnIds = patientInfo[_addr].transactions;
             Transactions[] memory result = new Transactions[](txnIds.length);
             for (uint i = 0; i < txnIds.length; i++) {
-                result[i] = transactions[txnIds[i]];
+                result[i] = loadTransaction(txnIds[i]);
             }
             return result;
         } else if (doctorInfo[_addr].exists) {
             uint[] memory txnIds = doctorInfo[_addr].transactions;
             Transactions[] memory result = new Transactions[](txnIds.length);
             for (uint i = 0; i < txnIds.length; i++) {
-                result[i] = transactions[txnIds[i]];
+                result[i] = loadTransaction(txnIds[i]);
             }
             return result;
         } else {
@@ -217,19 +370,148 @@ contract MediChain {
         }
     }
 
+    // Get the number of transactions related to an address
+    function getTransactionsCount(address _addr) public view returns (uint) {
+        return transactionIdsOf(_addr).length;
+    }
+
+    // Get a page of the transactions related to an address
+    function getTransactionsForAddressRange(address _addr, uint _offset, uint _limit) public view returns (Transactions[] memory) {
+        uint[] storage txnIds = transactionIdsOf(_addr);
+        (uint start, uint end) = pageBounds(txnIds.length, _offset, _limit);
+        Transactions[] memory result = new Transactions[](end - start);
+        for (uint i = start; i < end; i++) {
+            result[i - start] = loadTransaction(txnIds[i]);
+        }
+        return result;
+    }
+
     // Get audit history of patient records
     function getPatientAuditHistory(address _addr) view public returns (Event[] memory) {
         require(_addr != address(0), "Invalid address");
         require(patientInfo[_addr].exists, "Patient does not exist");
-        return patientInfo[_addr].medicalEvents;
+        AuditEntry[] storage entries = patientInfo[_addr].medicalEvents;
+        Event[] memory result = new Event[](entries.length);
+        for (uint i = 0; i < entries.length; i++) {
+            result[i] = toEvent(entries[i]);
+        }
+        return result;
+    }
+
+    // Get a page of the audit history of patient records
+    function getPatientAuditHistoryRange(address _addr, uint _offset, uint _limit) view public returns (Event[] memory) {
+        require(patientInfo[_addr].exists, "Patient does not exist");
+        AuditEntry[] storage entries = patientInfo[_addr].medicalEvents;
+        (uint start, uint end) = pageBounds(entries.length, _offset, _limit);
+        Event[] memory result = new Event[](end - start);
+        for (uint i = start; i < end; i++) {
+            result[i - start] = toEvent(entries[i]);
+        }
+        return result;
     }
 
-    // Get all medical records of a patient
-    function getMedicalRecords(address _addr) view public returns (string[] memory) {
+    // Get all medical records of a patient, indexed by record id (zero = deleted record)
+    function getMedicalRecords(address _addr) view public returns (bytes32[] memory) {
         require(patientInfo[_addr].exists, "Patient does not exist");
         return patientInfo[_addr].medicalRecords;
     }
 
+    // Get the number of (not deleted) medical records of a patient
+    function getMedicalRecordsCount(address _addr) view public returns (uint) {
+        require(patientInfo[_addr].exists, "Patient does not exist");
+        return patientInfo[_addr].medicalRecords.length - patientInfo[_addr].deletedRecords;
+    }
+
+    // Get the id the next medical record of a patient will get
+    function getNextRecordId(address _addr) view public returns (uint) {
+        require(patientInfo[_addr].exists, "Patient does not exist");
+        return patientInfo[_addr].medicalRecords.length;
+    }
+
+    // Get a page of the medical records of a patient: up to _limit records from record id
+    // _cursor on, skipping deleted ones, and the id the next page starts at (0 = no more)
+    function getMedicalRecordsRange(address _addr, uint _cursor, uint _limit) view public returns (uint[] memory ids, bytes32[] memory records, uint next) {
+        RecordsPage memory page = recordsPage(_addr, _cursor, _limit);
+        return (page.ids, page.records, page.next);
+    }
+
+    // Everything the patient dashboard shows in one call: info, a page each of records,
+    // audit events and transactions, and the doctor directory
+    function getPatientOverview(address _patient, uint _recordsCursor, uint _eventsOffset, uint _transactionsOffset, uint _limit) public view returns (PatientOverview memory overview) {
+        Patient storage p = patientInfo[_patient];
+        require(p.exists, "Patient does not exist");
+        overview.name = p.name;
+        overview.email = p.email;
+        overview.age = p.age;
+        overview.exists = p.exists;
+        overview.policyActive = p.policyActive;
+        overview.recordsTotal = p.medicalRecords.length - p.deletedRecords;
+        RecordsPage memory records = recordsPage(_patient, _recordsCursor, _limit);
+        overview.recordIds = records.ids;
+        overview.records = records.records;
+        overview.recordsNext = records.next;
+        overview.eventsTotal = p.medicalEvents.length;
+        overview.events = getPatientAuditHistoryRange(_patient, _eventsOffset, _limit);
+        overview.transactionsTotal = p.transactions.length;
+        overview.transactions = getTransactionsForAddressRange(_patient, _transactionsOffset, _limit);
+        overview.doctors = new DoctorEntry[](doctorList.length);
+        for (uint i = 0; i < doctorList.length; i++) {
+            overview.doctors[i] = DoctorEntry(doctorList[i], doctorInfo[doctorList[i]].name);
+        }
+    }
+
+    // Everything the doctor dashboard shows in one call: info, a page of patients with
+    // their record counts and first records, and a page of transactions
+    function getDoctorOverview(address _doctor, uint _patientsOffset, uint _recordsLimit, uint _transactionsOffset, uint _limit) public view returns (DoctorOverview memory overview) {
+        Doctor storage d = doctorInfo[_doctor];
+        require(d.exists, "Doctor does not exist");
+        overview.name = d.name;
+        overview.email = d.email;
+        overview.exists = d.exists;
+        overview.patientsTotal = d.patientAccessList.length;
+        (uint start, uint end) = pageBounds(d.patientAccessList.length, _patientsOffset, _limit);
+        overview.patients = new PatientSummary[](end - start);
+        for (uint i = start; i < end; i++) {
+            overview.patients[i - start] = patientSummary(d.patientAccessList[i], _recordsLimit);
+        }
+        overview.transactionsTotal = d.transactions.length;
+        overview.transactions = getTransactionsForAddressRange(_doctor, _transactionsOffset, _limit);
+    }
+
+    // Registry key of an email: keccak256 of it with surrounding whitespace trimmed and ASCII letters lower-cased
+    function emailKey(string memory _email) public pure returns (bytes32) {
+        bytes memory raw = bytes(_email);
+        uint start = 0;
+        uint end = raw.length;
+        while (start < end && isSpace(raw[start])) {
+            start++;
+        }
+        while (end > start && isSpace(raw[end - 1])) {
+            end--;
+        }
+        bytes memory normalized = new bytes(end - start);
+        for (uint i = start; i < end; i++) {
+            bytes1 c = raw[i];
+            if (c >= 0x41 && c <= 0x5A) {
+                c = bytes1(uint8(c) + 32);
+            }
+            normalized[i - start] = c;
+        }
+        return keccak256(normalized);
+    }
+
+    // Account, designation (0 = not registered) and display name registered for an email key
+    function lookupEmail(bytes32 _emailKey) public view returns (address, uint, string memory) {
+        EmailEntry storage entry = emailRegistry[_emailKey];
+        if (entry.designation == 1) {
+            return (entry.account, 1, patientInfo[entry.account].name);
+        }
+        if (entry.designation == 2) {
+            return (entry.account, 2, doctorInfo[entry.account].name);
+        }
+        return (address(0), 0, "");
+    }
+
     // Get patient access list
     function getPatientAccessList(address _patient) view public returns (address[] memory) {
         require(patientInfo[_patient].exists, "Patient does not exist");
@@ -247,37 +529,247 @@ contract MediChain {
         return doctorList;
     }
 
-    // Internal function to check if a doctor is authorized for a patient
-    function isDoctorAuthorized(address _patient, address _doctor) internal view returns (bool) {
-        address[] memory accessList = patientInfo[_patient].doctorAccessList;
-        for (uint i = 0; i < accessList.length; i++) {
-            if (accessList[i] == _doctor) {
-                return true;
+    // Check if a doctor is authorized for a patient
+    function isDoctorAuthorized(address _patient, address _doctor) public view returns (bool) {
+        return doctorAccessIndex[_patient][_doctor] != 0;
+    }
+
+    // Check that a record was included in an anchored batch; returns who anchored it and when
+    function verifyRecordInclusion(bytes32 _root, address _patient, bytes32 _ipfsHash, bytes32[] memory _proof) public view returns (bool, address, uint) {
+        RecordBatch storage batch = recordBatches[_root];
+        if (batch.timestamp == 0) {
+            return (false, address(0), 0);
+        }
+        bytes32 node = recordLeaf(_patient, _ipfsHash);
+        for (uint i = 0; i < _proof.length; i++) {
+            node = hashPair(node, _proof[i]);
+        }
+        if (node != _root) {
+            return (false, address(0), 0);
+        }
+        return (true, batch.submitter, batch.timestamp);
+    }
+
+    // Merkle leaf of a batched record (hashed twice so a leaf can never pass for an inner node)
+    function recordLeaf(address _patient, bytes32 _ipfsHash) public pure returns (bytes32) {
+        return keccak256(abi.encodePacked(keccak256(abi.encode(_patient, _ipfsHash))));
+    }
+
+    // Internal function collecting up to _limit records from record id _cursor on, skipping deleted ones
+    function recordsPage(address _addr, uint _cursor, uint _limit) internal view returns (RecordsPage memory page) {
+        require(patientInfo[_addr].exists, "Patient does not exist");
+        bytes32[] storage all = patientInfo[_addr].medicalRecords;
+        uint count = 0;
+        uint end = _cursor;
+        while (end < all.length && count < _limit) {
+            if (all[end] != bytes32(0)) {
+                count++;
+            }
+            end++;
+        }
+        page.ids = new uint[](count);
+        page.records = new bytes32[](count);
+        count = 0;
+        for (uint i = _cursor; i < end; i++) {
+            if (all[i] != bytes32(0)) {
+                page.ids[count] = i;
+                page.records[count] = all[i];
+                count++;
             }
         }
-        return false;
+        page.next = end < all.length ? end : 0;
     }
 
-    // Internal function to remove an address from a list
-    function removeFromList(address[] storage Array, address addr) internal {
-        require(addr != address(0), "Invalid address");
-        bool found = false;
-        uint index = 0;
-
-        for (uint i = 0; i < Array.length; i++) {
-            if (Array[i] == addr) {
-                found = true;
-                index = i;
-                break;
+    // Internal function building a doctor dashboard entry: a patient with its record count and first records
+    // (kept out of getDoctorOverview so its stack stays within reach without viaIR)
+    function patientSummary(address _patient, uint _recordsLimit) internal view returns (PatientSummary memory summary) {
+        RecordsPage memory page = recordsPage(_patient, 0, _recordsLimit);
+        summary.patient = _patient;
+        summary.name = patientInfo[_patient].name;
+        summary.recordsCount = getMedicalRecordsCount(_patient);
+        summary.recordIds = page.ids;
+        summary.records = page.records;
+        summary.recordsNext = page.next;
+    }
+
+    // Internal function reducing Merkle leaves to their root in place; an odd node is carried up unchanged
+    function merkleRoot(bytes32[] memory _nodes) internal pure returns (bytes32) {
+        uint length = _nodes.length;
+        while (length > 1) {
+            uint next = 0;
+            for (uint i = 0; i < length; i += 2) {
+                _nodes[next] = i + 1 < length ? hashPair(_nodes[i], _nodes[i + 1]) : _nodes[i];
+                next++;
             }
+            length = next;
         }
+        return _nodes[0];
+    }
 
-        require(found, "Address not found in the list");
+    // Internal function hashing two Merkle nodes in sorted order, so proofs need no left/right flags
+    function hashPair(bytes32 _a, bytes32 _b) internal pure returns (bytes32) {
+        return _a < _b ? keccak256(abi.encodePacked(_a, _b)) : keccak256(abi.encodePacked(_b, _a));
+    }
 
-        if (index < Array.length - 1) {
-            Array[index] = Array[Array.length - 1];
+    // Internal function to remove an address from a list using its stored position
+    function removeFromList(address[] storage Array, mapping(address => uint) storage positions, address addr) internal {
+        require(addr != address(0), "Invalid address");
+        uint position = positions[addr];
+        require(position != 0, "Address not found in the list");
+
+        uint lastPosition = Array.length;
+        if (position < lastPosition) {
+            address moved = Array[lastPosition - 1];
+            Array[position - 1] = moved;
+            positions[moved] = position;
         }
         Array.pop();
+        delete positions[addr];
+    }
+
+    // Internal function registering a patient account (name, email and age checked)
+    function registerPatient(address _addr, string memory _name, string memory _email, uint _age) internal {
+        require(_age > 0, "Age must be greater than 0");
+        bytes32 key = registerEmail(_addr, _name, _email);
+        Patient storage pinfo = patientInfo[_addr];
+        pinfo.name = _name;
+        pinfo.email = _email;
+        pinfo.age = _age;
+        pinfo.exists = true;
+        patientList.push(_addr);
+        emailRegistry[key] = EmailEntry(_addr, 1);
+
+        emit PatientRegistered(_addr, _name, _email, _age, 1);
+    }
+
+    // Internal function registering a doctor account
+    function registerDoctor(address _addr, string memory _name, string memory _email) internal {
+        bytes32 key = registerEmail(_addr, _name, _email);
+        Doctor storage dinfo = doctorInfo[_addr];
+        dinfo.name = _name;
+        dinfo.email = _email;
+        dinfo.exists = true;
+        doctorList.push(_addr);
+        emailRegistry[key] = EmailEntry(_addr, 2);
+
+        emit DoctorRegistered(_addr, _name, _email);
+    }
+
+    // Internal function checking a new account's details; returns its email registry key
+    function registerEmail(address _addr, string memory _name, string memory _email) internal view returns (bytes32 key) {
+        require(bytes(_name).length > 0, "Name is required");
+        require(bytes(_email).length > 0, "Email is required");
+        key = emailKey(_email);
+        require(emailRegistry[key].account == address(0), "Email already registered");
+        require(!patientInfo[_addr].exists, "Already registered as patient");
+        require(!doctorInfo[_addr].exists, "Already registered as doctor");
+    }
+
+    // Internal function adding a doctor to a patient's access list (and the patient to the doctor's)
+    function addAccess(address _patient, address _doctor) internal {
+        patientInfo[_patient].doctorAccessList.push(_doctor);
+        doctorAccessIndex[_patient][_doctor] = patientInfo[_patient].doctorAccessList.length;
+        doctorInfo[_doctor].patientAccessList.push(_patient);
+        patientAccessIndex[_doctor][_patient] = doctorInfo[_doctor].patientAccessList.length;
+
+        emit AccessGranted(_patient, _doctor);
+    }
+
+    // Internal function appending a record; every item is checked against the patient's access list
+    function addMedicalRecord(address _patient, bytes32 _ipfsHash) internal {
+        require(patientInfo[_patient].exists, "Patient is not registered");
+        require(isDoctorAuthorized(_patient, msg.sender), "Doctor not authorized for this patient");
+        require(_ipfsHash != bytes32(0), "IPFS hash is required");
+
+        // Update the medical record of the patient (versioning); its id is its position
+        patientInfo[_patient].medicalRecords.push(_ipfsHash);
+        // Add event for auditing
+        logAudit(_patient, AuditAction.CreateOrUpdateRecord);
+
+        emit MedicalRecordUpdated(_patient, patientInfo[_patient].medicalRecords.length - 1, _ipfsHash, block.timestamp);
+    }
+
+    // Internal function recording an audit entry for a patient (stored and/or logged)
+    function logAudit(address _patient, AuditAction _action) internal {
+        if (storeAuditHistory) {
+            patientInfo[_patient].medicalEvents.push(AuditEntry(msg.sender, uint40(block.timestamp), _action));
+        }
+        emit AuditLogged(_patient, msg.sender, _action, block.timestamp);
+    }
+
+    // Internal function expanding a stored audit entry to the getter shape
+    function toEvent(AuditEntry storage _entry) internal view returns (Event memory) {
+        return Event(_entry.actor, actionName(_entry.action), _entry.timestamp);
+    }
+
+    // Internal function naming an audit action the way the original string history did
+    function actionName(AuditAction _action) internal pure returns (string memory) {
+        if (_action == AuditAction.Register) {
+            return "register";
+        }
+        if (_action == AuditAction.CreateOrUpdateRecord) {
+            return "create/update record";
+        }
+        return "delete record";
+    }
+
+    // Internal function recording a transaction under its sender (as a patient) and receiver (as a doctor)
+    function addTransaction(address _sender, address _receiver, uint _value) internal {
+        transactionCount++;
+        transactions[transactionCount] = Transactions({
+            id: transactionCount,
+            sender: _sender,
+            receiver: _receiver,
+            value: _value,
+            settled: false
+        });
+        transactionIds.push(transactionCount); // Add transaction ID to list
+
+        patientInfo[_sender].transactions.push(transactionCount);
+        doctorInfo[_receiver].transactions.push(transactionCount);
+        unsettledOwed[_sender] += _value;
+        unsettledDue[_receiver] += _value;
+
+        emit TransactionCreated(transactionCount, _sender, _receiver, _value);
+    }
+
+    // Internal function flagging a transaction as settled; settling it again changes nothing
+    function settle(uint _transactionId) internal {
+        Transactions storage txn = transactions[_transactionId];
+        require(msg.sender == txn.sender || msg.sender == txn.receiver, "Not authorized to settle this transaction");
+        if (isTransactionSettled(_transactionId)) {
+            return;
+        }
+        settledBitmap[_transactionId >> 8] |= uint(1) << (_transactionId & 0xff);
+        unsettledOwed[txn.sender] -= txn.value;
+        unsettledDue[txn.receiver] -= txn.value;
+
+        emit TransactionSettled(_transactionId, txn.sender, txn.receiver);
+    }
+
+    // Internal function reading a transaction with its settled flag from the bitmap
+    function loadTransaction(uint _transactionId) internal view returns (Transactions memory txn) {
+        txn = transactions[_transactionId];
+        txn.settled = isTransactionSettled(_transactionId);
+    }
+
+    // Internal function returning the transaction IDs stored for a patient or doctor
+    function transactionIdsOf(address _addr) internal view returns (uint[] storage) {
+        if (patientInfo[_addr].exists) {
+            return patientInfo[_addr].transactions;
+        }
+        return doctorInfo[_addr].transactions;
+    }
+
+    // Internal function matching the whitespace emailKey trims
+    function isSpace(bytes1 _c) internal pure returns (bool) {
+        return _c == 0x20 || _c == 0x09 || _c == 0x0a || _c == 0x0d;
+    }
+
+    // Internal function clamping a page to the list length; offsets past the end give an empty page
+    function pageBounds(uint _length, uint _offset, uint _limit) internal pure returns (uint start, uint end) {
+        start = _offset > _length ? _length : _offset;
+        end = _limit > _length - start ? _length : start + _limit;
     }
 
     // Get the length of the patient list
@@ -309,7 +801,7 @@ contract MediChain {
 
     // Get a specific Patient Event by index
     function getPatientEvent(address _patient, uint index) public view returns (address, string memory, uint) {
-        Event storage evt = patientInfo[_patient].medicalEvents[index];
-        return (evt.actor, evt.action, evt.timestamp);
+        AuditEntry storage entry = patientInfo[_patient].medicalEvents[index];
+        return (entry.actor, actionName(entry.action), entry.timestamp);
     }
 }
@@ -1,43 +1,193 @@
 import os
-import json
-import requests
-from flask import Flask, redirect, render_template, request, jsonify, session, url_for, flash
+import time
+from flask import Flask, Response, g, redirect, stream_with_context, render_template, request, jsonify, send_file, session, url_for, flash
 from web3 import Web3  # type: ignore
 from flaskwebgui import FlaskUI
+from hexbytes import HexBytes  # type: ignore
 from dotenv import load_dotenv  # type: ignore
 
+from audit_export import EXPORT_FORMATS, AuditExporter, block_time_range, encode_rows, parse_export_cursor
+from batch_reads import BatchReader, run_plan
+from billing import format_balance, submit_charges, submit_settlements
+from blob_store import BlobStoreError, LocalBlobStore, blob_store_from_env
+from bulk_records import gas_bounded_chunks, submit_chunks, unauthorized_patients, upload_files
+from call_cache import CallCache
+from cid_codec import cid_to_digest, record_arg, record_cid
+from contract_abi import ABI_PATH, load_abi
+from email_index import email_key
+from event_stream import EventBroadcaster, Subscription, stream_events
+from fees import FeeOracle, GasEstimator
+from http_pool import pooled_session
+from indexer import EventIndexer, audit_in_logs, audit_logs
+from metrics import Metrics, function_selectors
+from record_batches import RecordBatcher, record_leaf, verify_proof
+from rpc_endpoints import provider_from_env, provider_urls
+from signer import FORK_AVAILABLE, Signer
+from tx_queue import FINAL_STATES, TransactionQueue
+
 # ---------------------- Load environment ---------------------- #
 load_dotenv()
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24)  # ⚠️ regenerate on each run; store persistently in production
+# ⚠️ Random per process unless SECRET_KEY is set; set it when running several server workers
+app.secret_key = os.getenv('SECRET_KEY') or os.urandom(24)
 
 # ---------------------- Web3 Setup ---------------------- #
-WEB3_PROVIDER_URL = os.getenv('WEB3_PROVIDER_URL', 'http://127.0.0.1:7545')
+# WEB3_PROVIDER_URLS (comma-separated) spreads reads over several nodes and fails over between them
+WEB3_PROVIDER_URLS = provider_urls()
 CONTRACT_ADDRESS = os.getenv('CONTRACT_ADDRESS')
-PINATA_API_KEY = os.getenv('PINATA_API_KEY')
-PINATA_SECRET_API_KEY = os.getenv('PINATA_SECRET_API_KEY')
 
-w3 = Web3(Web3.HTTPProvider(WEB3_PROVIDER_URL))
+# Keep-alive connection pools shared by every thread talking to the node or to Pinata
+RPC_POOL_SIZE = int(os.getenv('RPC_POOL_SIZE', '20'))
+PIN_POOL_SIZE = int(os.getenv('PIN_POOL_SIZE', '4'))
+rpc_session = pooled_session(RPC_POOL_SIZE)
+pin_session = pooled_session(PIN_POOL_SIZE)
+
+# ---------------------- Metrics ---------------------- #
+# Per-route and per-contract-function RPC/upload metrics on /metrics;
+# RPC_TRACE=1 also logs every node call made by each request.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+RPC_TRACE = os.getenv('RPC_TRACE', '0') == '1'
+metrics = Metrics(trace=RPC_TRACE, logger=app.logger)
+if RPC_TRACE:
+    app.logger.setLevel('INFO')
+if METRICS_ENABLED:
+    metrics.instrument_rpc_session(rpc_session)
+    metrics.instrument_http_session(pin_session, 'pinata')
+
+rpc_provider = provider_from_env(session=rpc_session)
+w3 = Web3(rpc_provider)
 if not w3.is_connected():
-    raise Exception(f"❌ Failed to connect to the Ethereum network at {WEB3_PROVIDER_URL}")
+    raise Exception(f"❌ Failed to connect to the Ethereum network at {', '.join(WEB3_PROVIDER_URLS)}")
 
 if not CONTRACT_ADDRESS:
     raise Exception("❌ CONTRACT_ADDRESS is missing in .env")
 
-# ---------------------- Contract Setup ---------------------- #
-with open('compiled_contract.json', 'r') as f:
-    compiled_sol = json.load(f)
-
-# Adjust these keys if your compiler output differs
-# Example expected layout: compiled_sol['contracts']['MediChain.sol']['MediChain']['abi']
-try:
-    contract_abi = compiled_sol['contracts']['MediChain.sol']['MediChain']['abi']
-except KeyError:
-    # Fallback to the path used earlier in your messages
-    contract_abi = compiled_sol['contracts']['contract.sol']['MediChain']['abi']
-
+# ---------------------- Signing ---------------------- #
+# Derived accounts are cached and transactions are signed on worker processes
+# (fork-only; 0 signs on the calling thread). Started before any other thread.
+SIGNER_PROCESSES = int(os.getenv('SIGNER_PROCESSES', str(os.cpu_count() or 1) if FORK_AVAILABLE else '0'))
+signer = Signer(w3, processes=SIGNER_PROCESSES).start()
+# Endpoint health probes run on a thread of their own, so only start them now
+rpc_provider.start()
+metrics.gauges['medichain_rpc_endpoints'] = rpc_provider.stats
+
+# Compact ABI written by deploy_contract.py (`--compile-only` regenerates it); a full
+# solc output file given as CONTRACT_ABI_PATH is read too
+contract_abi = load_abi(os.getenv('CONTRACT_ABI_PATH', ABI_PATH))
 contract = w3.eth.contract(address=Web3.to_checksum_address(CONTRACT_ADDRESS), abi=contract_abi)
+metrics.selectors = function_selectors(contract_abi)
+# Deployments with STORE_AUDIT_HISTORY=0 keep the audit history in AuditLogged logs only
+AUDIT_IN_LOGS = audit_in_logs(contract)
+
+# ---------------------- Blob Storage ---------------------- #
+# 'local' stores files content-addressed on disk and replicates to Pinata in the
+# background when keys are set; 'pinata' uploads synchronously as before.
+blob_store = blob_store_from_env(session=pin_session)
+if METRICS_ENABLED:
+    metrics.instrument_blob_store(blob_store)
+
+# ---------------------- Call Cache ---------------------- #
+# Repeated view calls (login lookups, doctor names, access checks) served from memory
+call_cache = CallCache(
+    w3, contract,
+    maxsize=int(os.getenv('CALL_CACHE_SIZE', '1024')),
+    refresh_interval=float(os.getenv('CALL_CACHE_REFRESH', '1')),
+)
+metrics.gauges['medichain_call_cache'] = call_cache.stats
+
+# ---------------------- Event Indexer ---------------------- #
+# Local SQLite projection of contract logs; set INDEXER_DB= (empty) to disable
+INDEXER_DB = os.getenv('INDEXER_DB', 'medichain_index.db')
+INDEXER_START_BLOCK = int(os.getenv('INDEXER_START_BLOCK', '0'))
+indexer = None
+if INDEXER_DB:
+    indexer = EventIndexer(
+        w3, contract, INDEXER_DB,
+        start_block=INDEXER_START_BLOCK,
+        confirmations=int(os.getenv('INDEXER_CONFIRMATIONS', '0')),
+        poll_interval=float(os.getenv('INDEXER_POLL_INTERVAL', '2')),
+    )
+    indexer.start()
+
+def use_indexer():
+    """Serve reads from the local projection only once it has caught up with the node."""
+    return indexer is not None and indexer.ready()
+
+# ---------------------- Transaction Queue ---------------------- #
+# Writes are signed/broadcast on worker threads and awaited by one receipt poller; routes return a job id.
+# Gas limits are estimated (plus GAS_MARGIN) and fees follow the latest block.
+PRIORITY_FEE_GWEI = os.getenv('PRIORITY_FEE_GWEI')
+fee_oracle = FeeOracle(
+    w3, priority_fee=w3.to_wei(PRIORITY_FEE_GWEI, 'gwei') if PRIORITY_FEE_GWEI else None)
+gas_estimator = GasEstimator(w3, margin=float(os.getenv('GAS_MARGIN', '1.2')))
+tx_queue = TransactionQueue(
+    w3,
+    workers=int(os.getenv('TX_WORKERS', '4')),
+    stuck_after=float(os.getenv('TX_STUCK_AFTER', '60')),
+    fees=fee_oracle,
+    gas=gas_estimator,
+    signer=signer,
+    session=rpc_session,
+)
+tx_queue.start()
+# How long a mined job may wait for the indexer before the dashboard reloads anyway
+TX_INDEX_WAIT = float(os.getenv('TX_INDEX_WAIT', '30'))
+
+def track_job(job_id):
+    """Remember a submitted job in the session so pages can poll its status."""
+    session['pending_jobs'] = session.get('pending_jobs', []) + [job_id]
+
+# ---------------------- Event Stream ---------------------- #
+# One shared log poller pushes record/access events to open dashboards (SSE)
+event_broadcaster = EventBroadcaster(w3, contract, poll_interval=float(os.getenv('EVENT_POLL_INTERVAL', '1')))
+SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', '15'))
+metrics.gauges['medichain_event_stream'] = event_broadcaster.stats
+
+def stream_audience(address, role, patients):
+    """``(patients, doctor)`` whose events a dashboard follows.
+
+    Doctors name the patients shown on their page; only those they are
+    authorized for are kept.
+    """
+    if role != 'doctor':
+        return [address], None
+    patients = [w3.to_checksum_address(p) for p in patients if w3.is_address(p)]
+    return [p for p in patients if call_cache.call('isDoctorAuthorized', p, address)], address
+
+# ---------------------- Record Batches ---------------------- #
+# Set RECORD_BATCH_DB to anchor bulk updates as Merkle roots (one storage write per
+# batch, one log per record) instead of pushing every record; proofs are kept in this SQLite file
+RECORD_BATCH_DB = os.getenv('RECORD_BATCH_DB', '')
+record_batcher = None
+if RECORD_BATCH_DB:
+    record_batcher = RecordBatcher(
+        w3, contract, tx_queue, RECORD_BATCH_DB,
+        max_batch=int(os.getenv('RECORD_BATCH_SIZE', '256')),
+    )
+    record_batcher.start()
+    metrics.gauges['medichain_record_batches'] = record_batcher.stats
+
+# ---------------------- Request Metrics ---------------------- #
+if METRICS_ENABLED:
+    @app.before_request
+    def start_request_metrics():
+        metrics.begin_request(request.endpoint)
+
+    @app.after_request
+    def record_response_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        metrics.end_request(g.get('metrics_status', 500))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled."}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 # ---------------------- Routes ---------------------- #
 @app.route('/')
@@ -56,16 +206,16 @@ def login():
 
     try:
         address = w3.to_checksum_address(address)
-        account = w3.eth.account.from_key(private_key)
-        if account.address != address:
+        if signer.address_of(private_key) != address:
             flash("Private key does not match the Ethereum address.", "danger")
             return redirect(url_for('index'))
     except Exception:
         flash("Invalid Ethereum address or private key.", "danger")
         return redirect(url_for('index'))
 
+    # One lookup by the locally hashed email: (account, designation, name)
     try:
-        designation = contract.functions.emailToDesignation(email).call()
+        registered_address, designation, name = call_cache.call('lookupEmail', email_key(email))
     except Exception as e:
         flash("Error fetching designation: " + str(e), "danger")
         return redirect(url_for('index'))
@@ -79,16 +229,8 @@ def login():
         flash("Invalid designation.", "danger")
         return redirect(url_for('index'))
 
-    # Fetch name based on role
-    try:
-        if role == 'patient':
-            patient = contract.functions.getPatientBasicInfo(address).call()
-            name = patient[0]
-        else:
-            doctor = contract.functions.getDoctorInfo(address).call()
-            name = doctor[0]
-    except Exception as e:
-        flash("Error verifying role: " + str(e), "danger")
+    if registered_address != address:
+        flash("This email is registered to a different Ethereum address.", "danger")
         return redirect(url_for('index'))
 
     # ⚠️ Storing private keys server-side is insecure; use client-side signing in production.
@@ -124,14 +266,13 @@ def register():
             else:
                 age = 0
 
-            account = w3.eth.account.from_key(private_key)
-            address = account.address
+            address = signer.address_of(private_key)
         except Exception:
             flash("Invalid details.", "danger")
             return redirect(url_for('index'))
 
         try:
-            existing_address = contract.functions.emailToAddress(email).call()
+            existing_address = call_cache.call('lookupEmail', email_key(email))[0]
             if existing_address and existing_address != '0x0000000000000000000000000000000000000000':
                 flash("Email already registered.", "danger")
                 return redirect(url_for('index'))
@@ -147,18 +288,13 @@ def register():
                     return redirect(url_for('index'))
                 ipfs_hash = upload_to_ipfs(file)
 
-            tx = contract.functions.register(name, age, designation_int, email, ipfs_hash).build_transaction({
-                'from': address,
-                'gas': 2_000_000,
-                'gasPrice': w3.to_wei('10', 'gwei'),
-                'nonce': w3.eth.get_transaction_count(address),
-            })
-
-            signed_tx = w3.eth.account.sign_transaction(tx, private_key)
-            tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-            w3.eth.wait_for_transaction_receipt(tx_hash)
+            job_id = tx_queue.submit(
+                contract.functions.register(name, age, designation_int, email, record_arg(contract, ipfs_hash)),
+                {'from': address},
+                private_key, "Registration")
+            track_job(job_id)
 
-            flash("Registration successful. Please log in.", "success")
+            flash("Registration submitted. You can log in once it is confirmed.", "info")
             return redirect(url_for('index'))
         except Exception as e:
             flash("Error during contract interaction: " + str(e), "danger")
@@ -166,29 +302,294 @@ def register():
 
     return render_template('index.html')
 
-# ---------------------- IPFS (Pinata) ---------------------- #
+# ---------------------- IPFS Storage ---------------------- #
+@app.route('/ipfs/<cid>')
+def ipfs_gateway(cid):
+    """Serves a record from the local blob store, falling back to the public gateway."""
+    if isinstance(blob_store, LocalBlobStore) and blob_store.exists(cid):
+        return send_file(os.path.abspath(blob_store.path(cid)), as_attachment=False, download_name=cid)
+    return redirect(f"https://ipfs.io/ipfs/{cid}")
+
 def upload_to_ipfs(file):
-    """Uploads a file to IPFS via Pinata and returns the IPFS hash."""
-    if not PINATA_API_KEY or not PINATA_SECRET_API_KEY:
-        raise Exception("Pinata API keys are not set in environment.")
-
-    url = 'https://api.pinata.cloud/pinning/pinFileToIPFS'
-    headers = {
-        'pinata_api_key': PINATA_API_KEY,
-        'pinata_secret_api_key': PINATA_SECRET_API_KEY
-    }
-    files = {'file': (file.filename, file.stream, file.content_type)}
-    try:
-        response = requests.post(url, files=files, headers=headers, timeout=60)
-        if response.status_code == 200:
-            return response.json()['IpfsHash']
-        app.logger.error(f"Pinata upload failed: {response.text}")
-        raise Exception("IPFS upload failed.")
-    except requests.exceptions.RequestException as e:
-        app.logger.error(f"Error uploading file to Pinata: {e}")
+    """Stores an uploaded file in the configured blob store and returns its IPFS CID."""
+    try:
+        return blob_store.put(file.stream, file.filename, file.content_type)
+    except BlobStoreError as e:
+        app.logger.error(str(e))
         raise Exception("IPFS upload error.")
 
+# ---------------------- Pagination ---------------------- #
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', '25'))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '500'))
+
+def parse_cursor(name='cursor', args=None):
+    """Offset cursor from the query string; missing or malformed values start at 0."""
+    args = request.args if args is None else args
+    try:
+        return max(int(args.get(name, 0)), 0)
+    except ValueError:
+        return 0
+
+def parse_limit(args=None):
+    args = request.args if args is None else args
+    try:
+        limit = int(args.get('limit', PAGE_SIZE))
+    except ValueError:
+        limit = PAGE_SIZE
+    return min(max(limit, 1), MAX_PAGE_SIZE)
+
+def make_page(offset, count, total):
+    """Describes a slice of a list: where it starts, the next cursor (or None) and the total."""
+    next_cursor = offset + count if offset + count < total else None
+    return {'offset': offset, 'next': next_cursor, 'total': total}
+
+def make_record_page(cursor, next_cursor, total):
+    """Like ``make_page`` for records, whose cursors are record ids (deleted ids are skipped)."""
+    return {'offset': cursor, 'next': next_cursor or None, 'total': total}
+
+def paged_json(items, page, jsonify=jsonify):
+    """JSON list response with the next cursor in the X-Next-Cursor header (asgi.py passes Quart's jsonify)."""
+    response = jsonify(items)
+    response.headers['X-Total-Count'] = str(page['total'])
+    if page['next'] is not None:
+        response.headers['X-Next-Cursor'] = str(page['next'])
+    return response
+
+def format_records(record_ids, record_data):
+    """Records with their stable ids, from the parallel id and digest lists of the contract."""
+    return [{"id": record_id, "ipfsHash": record_cid(record)} for record_id, record in zip(record_ids, record_data)]
+
+def format_events(event_data):
+    """Audit events tuple layout: (actor, action, timestamp)."""
+    return [{"actor": evt[0], "action": evt[1], "timestamp": evt[2]} for evt in event_data]
+
+def logged_audit_page(patient_address, offset, limit):
+    """A page of audit events and the total from AuditLogged logs (see AUDIT_IN_LOGS).
+
+    Served from the indexer's projection of those logs whenever an indexer is
+    configured, even while it catches up; the logs are only scanned without one.
+    """
+    if indexer is not None:
+        return (indexer.audit_history(patient_address, offset, limit),
+                indexer.audit_history_count(patient_address))
+    events = audit_logs(contract, patient_address, INDEXER_START_BLOCK)
+    return events[offset:offset + limit], len(events)
+
+def anchored_records_page(patient_address, offset, limit):
+    """A page of a patient's Merkle-anchored records and the total.
+
+    Records are only anchored where RECORD_BATCH_DB is set; they are read from
+    the indexer's projection or, without an indexer, from the batcher's store.
+    """
+    if record_batcher is None:
+        return [], 0
+    source = indexer if indexer is not None else record_batcher
+    return (source.anchored_records(patient_address, offset, limit),
+            source.anchored_records_count(patient_address))
+
+def format_transactions(txn_data):
+    """Transactions tuple layout: (id, sender, receiver, value, settled)."""
+    transactions = []
+    for txn in txn_data:
+        transactions.append({
+            "TransactionID": txn[0],
+            "Sender": txn[1],
+            "Receiver": txn[2],
+            "Value": txn[3],
+            "Settled": txn[4]
+        })
+    return transactions
+
+# ---------------------- Read Plans ---------------------- #
+# Each plan yields batches of view calls and returns the assembled data, so the
+# same logic serves the threaded Flask routes (run_plan: one JSON-RPC batch per
+# step) and the async server in asgi.py (concurrent calls per step).
+def read(plan):
+    """Runs a read plan over the pooled RPC session."""
+    return run_plan(plan, BatchReader(w3, contract, session=rpc_session))
+
+def format_doctors(doctor_entries):
+    """Doctor directory tuple layout: (address, name)."""
+    return [{'name': doc[1], 'address': doc[0]} for doc in doctor_entries]
+
+def patient_view_plan(address, cursors):
+    """Patient info, one page each of records, events and transactions, and the doctor directory."""
+    overview, balance = yield [
+        ('getPatientOverview', address, cursors['records'], cursors['events'], cursors['transactions'], PAGE_SIZE),
+        ('getUnsettledBalance', address),
+    ]
+    # Expected: (name, email, age, exists, policyActive, recordsTotal, recordIds, records, recordsNext,
+    #            eventsTotal, events, transactionsTotal, transactions, doctors)
+    (name, email, age, exists, policy_active, records_total, record_ids, record_data, records_next,
+     events_total, event_data, txns_total, txn_data, doctor_entries) = overview
+    medical_records = format_records(record_ids, record_data)
+    events = format_events(event_data)
+    if AUDIT_IN_LOGS:
+        events, events_total = logged_audit_page(address, cursors['events'], PAGE_SIZE)
+    anchored, anchored_total = anchored_records_page(address, cursors['anchored'], PAGE_SIZE)
+    user_info = {
+        'Name': name,
+        'Email': email,
+        'Age': age,
+        'Exists': exists,
+        'Policy Active': policy_active,
+        **balance_info(format_balance(*balance)),
+        'Medical Records': medical_records,
+        'Anchored Records': anchored,
+        'Medical Events': events,
+    }
+    pages = {
+        'records': make_record_page(cursors['records'], records_next, records_total),
+        'anchored': make_page(cursors['anchored'], len(anchored), anchored_total),
+        'events': make_page(cursors['events'], len(events), events_total),
+        'transactions': make_page(cursors['transactions'], len(txn_data), txns_total),
+    }
+    return user_info, format_doctors(doctor_entries), format_transactions(txn_data), pages
+
+def doctor_view_plan(address, cursors):
+    """Doctor info, a page of patients with their first records, and a page of transactions."""
+    overview, balance = yield [
+        ('getDoctorOverview', address, cursors['patients'], PAGE_SIZE, cursors['transactions'], PAGE_SIZE),
+        ('getUnsettledBalance', address),
+    ]
+    # Expected: (name, email, exists, patientsTotal, patients, transactionsTotal, transactions)
+    name, email, exists, patients_total, patient_summaries, txns_total, txn_data = overview
+    user_info = {
+        'Name': name,
+        'Email': email,
+        'Exists': exists,
+        **balance_info(format_balance(*balance)),
+    }
+    # Patient summary layout: (address, name, recordsCount, first record ids, first records, recordsNext)
+    anchored = {summary[0]: anchored_records_page(summary[0], 0, PAGE_SIZE) for summary in patient_summaries}
+    patients = [{
+        'name': summary[1],
+        'address': summary[0],
+        'medicalRecords': format_records(summary[3], summary[4]),
+        'recordsCount': summary[2],
+        'recordsNext': summary[5] or None,
+        'anchoredRecords': anchored[summary[0]][0],
+        'anchoredCount': anchored[summary[0]][1],
+    } for summary in patient_summaries]
+    pages = {
+        'patients': make_page(cursors['patients'], len(patients), patients_total),
+        'transactions': make_page(cursors['transactions'], len(txn_data), txns_total),
+    }
+    return user_info, patients, format_transactions(txn_data), pages
+
+def transactions_page_plan(address, offset, limit):
+    if use_indexer() and indexer.indexes_transactions:
+        transactions = indexer.transactions(address, offset, limit)
+        return transactions, make_page(offset, len(transactions), indexer.transactions_count(address))
+    total, txn_data = yield [
+        ('getTransactionsCount', address),
+        ('getTransactionsForAddressRange', address, offset, limit),
+    ]
+    return format_transactions(txn_data), make_page(offset, len(txn_data), total)
+
+def unsettled_balance_plan(address):
+    """Unsettled totals of an address, from the indexer when it is caught up."""
+    if use_indexer() and indexer.indexes_transactions:
+        return indexer.unsettled_balance(address)
+    balance, = yield [('getUnsettledBalance', address)]
+    return format_balance(*balance)
+
+def unsettleable_plan(address, transaction_ids):
+    """Those of ``transaction_ids`` that ``address`` cannot settle: unknown, someone else's or already settled."""
+    ids = sorted(transaction_ids)
+    # Transactions layout: (id, sender, receiver, value, settled)
+    txns = yield [('getTransaction', transaction_id) for transaction_id in ids]
+    return {transaction_id for transaction_id, txn in zip(ids, txns)
+            if address not in (txn[1], txn[2]) or txn[4]}
+
+def balance_info(balance):
+    """Dashboard info lines for an unsettled balance."""
+    return {
+        'Unsettled Owed (Wei)': balance['owed'],
+        'Unsettled Due (Wei)': balance['due'],
+    }
+
+def audit_page_plan(patient_address, offset, limit):
+    """A page of audit events and the total, from the indexer when it is caught up."""
+    if use_indexer() and indexer.patient(patient_address):
+        return (indexer.audit_history(patient_address, offset, limit),
+                indexer.audit_history_count(patient_address))
+    if AUDIT_IN_LOGS:
+        return logged_audit_page(patient_address, offset, limit)
+    total, audit_page = yield [
+        ('getPatientEventsCount', patient_address),
+        ('getPatientAuditHistoryRange', patient_address, offset, limit),
+    ]
+    return format_events(audit_page), total
+
+def records_page_plan(patient_address, cursor, limit):
+    """A page of records from record id ``cursor`` on, and its page description."""
+    if use_indexer() and indexer.patient(patient_address):
+        records, next_cursor = indexer.medical_records(patient_address, cursor, limit)
+        return records, make_record_page(cursor, next_cursor, indexer.medical_records_count(patient_address))
+    total, (record_ids, record_data, next_cursor) = yield [
+        ('getMedicalRecordsCount', patient_address),
+        ('getMedicalRecordsRange', patient_address, cursor, limit),
+    ]
+    return format_records(record_ids, record_data), make_record_page(cursor, next_cursor, total)
+
 # ---------------------- Dashboard ---------------------- #
+def dashboard_cursors(args=None):
+    return {
+        'records': parse_cursor('records_cursor', args),
+        'events': parse_cursor('events_cursor', args),
+        'transactions': parse_cursor('transactions_cursor', args),
+        'patients': parse_cursor('patients_cursor', args),
+        'anchored': parse_cursor('anchored_cursor', args),
+    }
+
+def patient_dashboard_plan(address, cursors):
+    pinfo = indexer.patient(address) if use_indexer() else None
+    if not pinfo:
+        return (yield from patient_view_plan(address, cursors))
+
+    # The policy flag is not logged, so it is the one value read from the contract
+    (_, _, _, _, policy_active), = yield [('getPatientBasicInfo', address)]
+    medical_records, records_next = indexer.medical_records(address, cursors['records'], PAGE_SIZE)
+    anchored = indexer.anchored_records(address, cursors['anchored'], PAGE_SIZE)
+    events = indexer.audit_history(address, cursors['events'], PAGE_SIZE)
+    user_info = {
+        'Name': pinfo['name'],
+        'Email': pinfo['email'],
+        'Age': pinfo['age'],
+        'Exists': True,
+        'Policy Active': policy_active,
+        **balance_info(indexer.unsettled_balance(address)),
+        'Medical Records': medical_records,
+        'Anchored Records': anchored,
+        'Medical Events': events,
+    }
+    doctors = indexer.doctors()
+    transactions, txn_page = yield from transactions_page_plan(address, cursors['transactions'], PAGE_SIZE)
+    pages = {
+        'records': make_record_page(cursors['records'], records_next, indexer.medical_records_count(address)),
+        'anchored': make_page(cursors['anchored'], len(anchored), indexer.anchored_records_count(address)),
+        'events': make_page(cursors['events'], len(events), indexer.audit_history_count(address)),
+        'transactions': txn_page,
+    }
+    return user_info, doctors, transactions, pages
+
+def doctor_dashboard_plan(address, cursors):
+    dinfo = indexer.doctor(address) if use_indexer() else None
+    if not dinfo:
+        return (yield from doctor_view_plan(address, cursors))
+
+    user_info = {
+        'Name': dinfo['name'],
+        'Email': dinfo['email'],
+        'Exists': True,
+        **balance_info(indexer.unsettled_balance(address)),
+    }
+    patients = indexer.doctor_patients(address, cursors['patients'], PAGE_SIZE, records_limit=PAGE_SIZE)
+    patients_page = make_page(cursors['patients'], len(patients), indexer.doctor_patients_count(address))
+    transactions, txn_page = yield from transactions_page_plan(address, cursors['transactions'], PAGE_SIZE)
+    return user_info, patients, transactions, {'patients': patients_page, 'transactions': txn_page}
+
 @app.route('/dashboard')
 def dashboard():
     if 'address' not in session:
@@ -198,108 +599,30 @@ def dashboard():
     address = session['address']
     role = session['role']
     name = session['name']
-
-    user_info = {}
-    transactions = []
-    patients = []
-    doctors = []
+    cursors = dashboard_cursors()
 
     try:
         if role == 'patient':
-            pinfo = contract.functions.getPatientBasicInfo(address).call()
-            # Expected: (name, email, age, exists, policyActive)
-            user_info = {
-                'Name': pinfo[0],
-                'Email': pinfo[1],
-                'Age': pinfo[2],
-                'Exists': pinfo[3],
-                'Policy Active': pinfo[4],
-            }
-
-            # Medical records
-            medical_records = contract.functions.getMedicalRecords(address).call()
-            user_info['Medical Records'] = medical_records
-
-            # Events
-            events_count = contract.functions.getPatientEventsCount(address).call()
-            user_info['Medical Events'] = []
-            for i in range(events_count):
-                evt = contract.functions.getPatientEvent(address, i).call()
-                # Expected: (actor, action, timestamp)
-                user_info['Medical Events'].append({
-                    "actor": evt[0],
-                    "action": evt[1],
-                    "timestamp": evt[2]
-                })
-
-            # Transactions (tuple layout assumed: (id, sender, receiver, value, settled))
-            txn_data = contract.functions.getTransactionsForAddress(address).call()
-            for txn in txn_data:
-                transactions.append({
-                    "TransactionID": txn[0],
-                    "Sender": txn[1],
-                    "Receiver": txn[2],
-                    "Value": txn[3],
-                    "Settled": txn[4]
-                })
-
-            # Doctors list
-            doctors_addresses = contract.functions.getAllDoctors().call()
-            for doc_addr in doctors_addresses:
-                if doc_addr and doc_addr != '0x0000000000000000000000000000000000000000':
-                    doc_info = contract.functions.getDoctorInfo(doc_addr).call()
-                    doctors.append({
-                        'name': doc_info[0],
-                        'address': doc_addr
-                    })
-
+            user_info, doctors, transactions, pages = read(patient_dashboard_plan(address, cursors))
             return render_template('patient_dashboard.html',
                                    user_info=user_info,
                                    transactions=transactions,
                                    name=name,
                                    role=role,
-                                   doctors=doctors)
+                                   doctors=doctors,
+                                   pages=pages,
+                                   page_size=PAGE_SIZE)
 
         elif role == 'doctor':
-            dinfo = contract.functions.getDoctorInfo(address).call()
-            # Expected: (name, email, exists, <maybe transactions>, patientAccessList)
-            user_info = {
-                'Name': dinfo[0],
-                'Email': dinfo[1],
-                'Exists': dinfo[2],
-            }
-
-            # Patient access list typically at index 4 in your earlier code
-            patient_access_list = []
-            if len(dinfo) > 4:
-                patient_access_list = dinfo[4]
-
-            for patient_address in patient_access_list:
-                pinfo = contract.functions.getPatientBasicInfo(patient_address).call()
-                medical_records = contract.functions.getMedicalRecords(patient_address).call()
-                patients.append({
-                    'name': pinfo[0],
-                    'address': patient_address,
-                    'medicalRecords': medical_records
-                })
-
-            # Doctor transactions (use same tuple layout as patient)
-            txn_data = contract.functions.getTransactionsForAddress(address).call()
-            for txn in txn_data:
-                transactions.append({
-                    "TransactionID": txn[0],
-                    "Sender": txn[1],
-                    "Receiver": txn[2],
-                    "Value": txn[3],
-                    "Settled": txn[4]
-                })
-
+            user_info, patients, transactions, pages = read(doctor_dashboard_plan(address, cursors))
             return render_template('doctor_dashboard.html',
                                    user_info=user_info,
                                    transactions=transactions,
                                    name=name,
                                    role=role,
-                                   patients=patients)
+                                   patients=patients,
+                                   pages=pages,
+                                   page_size=PAGE_SIZE)
 
         else:
             user_info = {'Error': 'Unknown role.'}
@@ -356,23 +679,88 @@ def update_medical_record():
         return redirect(url_for('dashboard'))
 
     try:
-        txn = contract.functions.createOrUpdateMedicalRecord(patient_address, ipfs_hash).build_transaction({
-            'from': doctor_address,
-            'gas': 500_000,
-            'gasPrice': w3.to_wei('20', 'gwei'),
-            'nonce': w3.eth.get_transaction_count(doctor_address),
-        })
-
-        signed_txn = w3.eth.account.sign_transaction(txn, private_key)
-        tx_hash = w3.eth.send_raw_transaction(signed_txn.raw_transaction)
-        w3.eth.wait_for_transaction_receipt(tx_hash)
-        flash("Medical record updated successfully.", "success")
+        job_id = tx_queue.submit(
+            contract.functions.createOrUpdateMedicalRecord(patient_address, record_arg(contract, ipfs_hash)),
+            {'from': doctor_address},
+            private_key, "Medical record update")
+        track_job(job_id)
+        flash("Medical record update submitted.", "info")
         return redirect(url_for('dashboard'))
     except Exception as e:
         app.logger.error(f"Error processing the transaction: {e}")
         flash("Error processing the transaction.", "danger")
         return redirect(url_for('dashboard'))
 
+# ---------------------- Bulk Record Update (Doctor) ---------------------- #
+# Per-transaction gas budget for bulk updates; default is 80% of the block gas limit
+BULK_MAX_GAS = int(os.getenv('BULK_MAX_GAS', '0')) or None
+
+@app.route('/bulk_update_medical_records', methods=['POST'])
+def bulk_update_medical_records():
+    if 'address' not in session or session.get('role') != 'doctor':
+        flash("Only doctors can update medical records.", "danger")
+        return redirect(url_for('index'))
+
+    doctor_address = session['address']
+    private_key = session['private_key']
+
+    files = [f for f in request.files.getlist('file') if f and f.filename]
+    patients = request.form.getlist('patient_address')
+    if not files:
+        flash("No files uploaded.", "danger")
+        return redirect(url_for('dashboard'))
+    if len(patients) == 1:
+        # Several files for one patient
+        patients = patients * len(files)
+    if len(patients) != len(files):
+        flash("Each file needs a patient address.", "danger")
+        return redirect(url_for('dashboard'))
+
+    try:
+        patients = [w3.to_checksum_address(p) for p in patients]
+    except Exception as e:
+        flash(f"Invalid patient address format: {str(e)}", "danger")
+        return redirect(url_for('dashboard'))
+
+    try:
+        denied = unauthorized_patients(contract, doctor_address, patients)
+    except Exception as e:
+        app.logger.error(f"Error checking access: {e}")
+        flash("Error checking access.", "danger")
+        return redirect(url_for('dashboard'))
+    if denied:
+        flash("Not authorized for: " + ", ".join(sorted(denied)), "danger")
+        return redirect(url_for('dashboard'))
+
+    try:
+        cids = upload_files(blob_store, [(f.stream, f.filename, f.content_type) for f in files])
+    except BlobStoreError as e:
+        app.logger.error(str(e))
+        flash("IPFS upload error.", "danger")
+        return redirect(url_for('dashboard'))
+
+    if record_batcher is not None:
+        try:
+            batches = record_batcher.add(doctor_address, private_key, list(zip(patients, cids)))
+            for _, job_id in batches:
+                track_job(job_id)
+            flash(f"{len(cids)} medical records submitted in {len(batches)} anchored batch(es).", "info")
+        except Exception as e:
+            app.logger.error(f"Error anchoring the bulk update: {e}")
+            flash("Error anchoring the bulk update.", "danger")
+        return redirect(url_for('dashboard'))
+
+    try:
+        chunks = gas_bounded_chunks(contract, doctor_address, list(zip(patients, cids)), BULK_MAX_GAS)
+        for job_id in submit_chunks(tx_queue, contract, doctor_address, private_key, chunks):
+            track_job(job_id)
+        flash(f"{len(cids)} medical records submitted in {len(chunks)} transaction(s).", "info")
+        return redirect(url_for('dashboard'))
+    except Exception as e:
+        app.logger.error(f"Error processing the bulk update: {e}")
+        flash("Error processing the bulk update.", "danger")
+        return redirect(url_for('dashboard'))
+
 # ---------------------- Delete Medical Record ---------------------- #
 @app.route('/delete_medical_record', methods=['POST'])
 def delete_medical_record():
@@ -389,18 +777,18 @@ def delete_medical_record():
         return redirect(url_for('dashboard'))
 
     patient_address = request.form.get('patient_address')
-    record_index = request.form.get('record_index')
+    record_id = request.form.get('record_id')
 
-    if not patient_address or record_index is None:
-        flash("Missing patient address or record index.", "danger")
+    if not patient_address or record_id is None:
+        flash("Missing patient address or record id.", "danger")
         return redirect(url_for('dashboard'))
 
     try:
         patient_address = w3.to_checksum_address(patient_address)
-        # Assuming UI shows record ids starting from 1
-        record_index = int(record_index) - 1
-        if record_index < 0:
-            raise ValueError("Record index must be >= 1")
+        # Record ids are stable: deleting a record leaves the others' ids unchanged
+        record_id = int(record_id)
+        if record_id < 0:
+            raise ValueError("Record id must be >= 0")
     except Exception as e:
         flash(f"Invalid input: {str(e)}", "danger")
         return redirect(url_for('dashboard'))
@@ -411,21 +799,16 @@ def delete_medical_record():
                 flash("Patients can only delete their own records.", "danger")
                 return redirect(url_for('dashboard'))
         elif role == 'doctor':
-            if not contract.functions.isDoctorAuthorized(patient_address, address).call():
+            if not call_cache.call('isDoctorAuthorized', patient_address, address):
                 flash("You are not authorized to delete records for this patient.", "danger")
                 return redirect(url_for('dashboard'))
 
-        txn = contract.functions.deleteMedicalRecord(patient_address, record_index).build_transaction({
-            'from': address,
-            'gas': 500_000,
-            'gasPrice': w3.to_wei('20', 'gwei'),
-            'nonce': w3.eth.get_transaction_count(address),
-        })
-
-        signed_txn = w3.eth.account.sign_transaction(txn, private_key)
-        tx_hash = w3.eth.send_raw_transaction(signed_txn.raw_transaction)
-        w3.eth.wait_for_transaction_receipt(tx_hash)
-        flash("Medical record deleted successfully.", "success")
+        job_id = tx_queue.submit(
+            contract.functions.deleteMedicalRecord(patient_address, record_id),
+            {'from': address},
+            private_key, "Medical record deletion")
+        track_job(job_id)
+        flash("Medical record deletion submitted.", "info")
         return redirect(url_for('dashboard'))
     except Exception as e:
         app.logger.error(f"Error deleting medical record: {e}")
@@ -454,7 +837,7 @@ def grant_access():
         return redirect(url_for('dashboard'))
 
     try:
-        doctor_info = contract.functions.getDoctorInfo(doctor_address).call()
+        doctor_info = call_cache.call('getDoctorInfo', doctor_address)
         if not doctor_info[2]:  # exists flag
             flash("Doctor does not exist.", "danger")
             return redirect(url_for('dashboard'))
@@ -463,16 +846,12 @@ def grant_access():
         return redirect(url_for('dashboard'))
 
     try:
-        txn = contract.functions.grantAccessToDoctor(doctor_address).build_transaction({
-            'from': patient_address,
-            'gas': 500_000,
-            'gasPrice': w3.to_wei('20', 'gwei'),
-            'nonce': w3.eth.get_transaction_count(patient_address),
-        })
-        signed_txn = w3.eth.account.sign_transaction(txn, private_key)
-        tx_hash = w3.eth.send_raw_transaction(signed_txn.raw_transaction)
-        w3.eth.wait_for_transaction_receipt(tx_hash)
-        flash("Access granted successfully.", "success")
+        job_id = tx_queue.submit(
+            contract.functions.grantAccessToDoctor(doctor_address),
+            {'from': patient_address},
+            private_key, "Access grant")
+        track_job(job_id)
+        flash("Access grant submitted.", "info")
         return redirect(url_for('dashboard'))
     except Exception as e:
         app.logger.error(f"Error granting access: {e}")
@@ -500,7 +879,7 @@ def revoke_access():
         return redirect(url_for('dashboard'))
 
     try:
-        doctor_info = contract.functions.getDoctorInfo(doctor_address).call()
+        doctor_info = call_cache.call('getDoctorInfo', doctor_address)
         if not doctor_info[2]:
             flash("Doctor does not exist.", "danger")
             return redirect(url_for('dashboard'))
@@ -509,16 +888,12 @@ def revoke_access():
         return redirect(url_for('dashboard'))
 
     try:
-        txn = contract.functions.revokeAccessToDoctor(doctor_address).build_transaction({
-            'from': patient_address,
-            'gas': 500_000,
-            'gasPrice': w3.to_wei('20', 'gwei'),
-            'nonce': w3.eth.get_transaction_count(patient_address),
-        })
-        signed_txn = w3.eth.account.sign_transaction(txn, private_key)
-        tx_hash = w3.eth.send_raw_transaction(signed_txn.raw_transaction)
-        w3.eth.wait_for_transaction_receipt(tx_hash)
-        flash("Access revoked successfully.", "success")
+        job_id = tx_queue.submit(
+            contract.functions.revokeAccessToDoctor(doctor_address),
+            {'from': patient_address},
+            private_key, "Access revocation")
+        track_job(job_id)
+        flash("Access revocation submitted.", "info")
         return redirect(url_for('dashboard'))
     except Exception as e:
         app.logger.error(f"Error revoking access: {e}")
@@ -537,22 +912,324 @@ def get_patient_audit():
     except Exception as e:
         return jsonify({"error": f"Invalid address format: {str(e)}"}), 400
 
+    offset = parse_cursor()
+    limit = parse_limit()
+
     try:
-        audit_history = contract.functions.getPatientAuditHistory(patient_address).call()
-        if not audit_history:
+        events_list, total = read(audit_page_plan(patient_address, offset, limit))
+        if not total:
             return jsonify({"error": "No audit history found for this address"}), 404
-
-        events_list = []
-        for evt in audit_history:
-            events_list.append({
-                "actor": evt[0],
-                "action": evt[1],
-                "timestamp": evt[2]
-            })
-        return jsonify(events_list)
+        return paged_json(events_list, make_page(offset, len(events_list), total))
     except Exception as e:
         return jsonify({"error": f"Failed to get audit history: {str(e)}"}), 500
 
+# ---------------------- Audit Export ---------------------- #
+audit_exporter = AuditExporter(w3, contract, session=rpc_session, indexer=indexer,
+                               page_size=int(os.getenv('EXPORT_PAGE_SIZE', '200')),
+                               audit_in_logs=AUDIT_IN_LOGS, from_block=INDEXER_START_BLOCK)
+# Compliance accounts allowed to export the audit history of every patient
+AUDIT_EXPORT_ADMINS = {Web3.to_checksum_address(a.strip())
+                       for a in os.getenv('AUDIT_EXPORT_ADMINS', '').split(',') if a.strip()}
+
+def parse_int_arg(name):
+    value = request.args.get(name)
+    return int(value) if value not in (None, '') else None
+
+@app.route('/export_audit', methods=['GET'])
+def export_audit():
+    """Streams audit events as NDJSON or CSV, for one patient or all of them."""
+    if 'address' not in session:
+        return jsonify({"error": "Please log in first."}), 401
+
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(sorted(EXPORT_FORMATS))}"}), 400
+
+    patient_address = request.args.get('patient_address')
+    if patient_address:
+        try:
+            patient_address = w3.to_checksum_address(patient_address.strip())
+        except Exception as e:
+            return jsonify({"error": f"Invalid address format: {str(e)}"}), 400
+
+    # Patients export their own history, doctors that of patients who granted them
+    # access; the all-patients export is reserved for AUDIT_EXPORT_ADMINS
+    address = session['address']
+    if address not in AUDIT_EXPORT_ADMINS and not patient_address:
+        return jsonify({"error": "Not authorized to export every patient's audit history"}), 403
+    if address not in AUDIT_EXPORT_ADMINS and patient_address != address and not (
+            session.get('role') == 'doctor'
+            and call_cache.call('isDoctorAuthorized', patient_address, address)):
+        return jsonify({"error": "Not authorized to export this audit history"}), 403
+
+    try:
+        cursor = parse_export_cursor(request.args.get('cursor'), all_patients=not patient_address)
+        since, until = block_time_range(w3, parse_int_arg('from_block'), parse_int_arg('to_block'),
+                                        parse_int_arg('since'), parse_int_arg('until'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid range or cursor: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to resolve block range: {str(e)}"}), 500
+
+    rows = audit_exporter.rows(patient_address or None, cursor, since, until)
+    body = encode_rows(rows, fmt, on_error=lambda e: app.logger.error(f"Audit export failed: {e}"))
+    filename = f"audit-{patient_address or 'all'}.{fmt}"
+    return Response(stream_with_context(body), mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+# ---------------------- Paged Records & Transactions ---------------------- #
+@app.route('/get_medical_records', methods=['GET'])
+def get_medical_records():
+    if 'address' not in session:
+        return jsonify({"error": "Please log in first."}), 401
+
+    try:
+        patient_address = w3.to_checksum_address(request.args.get('patient_address', '').strip())
+    except Exception as e:
+        return jsonify({"error": f"Invalid address format: {str(e)}"}), 400
+
+    address = session['address']
+    if patient_address != address and not (
+            session.get('role') == 'doctor'
+            and call_cache.call('isDoctorAuthorized', patient_address, address)):
+        return jsonify({"error": "Not authorized to view these records"}), 403
+
+    try:
+        records, page = read(records_page_plan(patient_address, parse_cursor(), parse_limit()))
+        return paged_json(records, page)
+    except Exception as e:
+        return jsonify({"error": f"Failed to get medical records: {str(e)}"}), 500
+
+@app.route('/get_anchored_records', methods=['GET'])
+def get_anchored_records():
+    if 'address' not in session:
+        return jsonify({"error": "Please log in first."}), 401
+
+    try:
+        patient_address = w3.to_checksum_address(request.args.get('patient_address', '').strip())
+    except Exception as e:
+        return jsonify({"error": f"Invalid address format: {str(e)}"}), 400
+
+    address = session['address']
+    if patient_address != address and not (
+            session.get('role') == 'doctor'
+            and call_cache.call('isDoctorAuthorized', patient_address, address)):
+        return jsonify({"error": "Not authorized to view these records"}), 403
+
+    offset, limit = parse_cursor(), parse_limit()
+    try:
+        records, total = anchored_records_page(patient_address, offset, limit)
+        return paged_json(records, make_page(offset, len(records), total))
+    except Exception as e:
+        return jsonify({"error": f"Failed to get anchored records: {str(e)}"}), 500
+
+@app.route('/get_transactions', methods=['GET'])
+def get_transactions():
+    if 'address' not in session:
+        return jsonify({"error": "Please log in first."}), 401
+
+    try:
+        transactions, page = read(transactions_page_plan(session['address'], parse_cursor(), parse_limit()))
+        return paged_json(transactions, page)
+    except Exception as e:
+        return jsonify({"error": f"Failed to get transactions: {str(e)}"}), 500
+
+# ---------------------- Billing ---------------------- #
+@app.route('/create_charges', methods=['POST'])
+def create_charges():
+    """Charge one or more patients (parallel ``patient_address`` / ``value`` fields)."""
+    if 'address' not in session or session.get('role') != 'doctor':
+        flash("Only doctors can create charges.", "danger")
+        return redirect(url_for('index'))
+
+    doctor_address = session['address']
+    patients = request.form.getlist('patient_address')
+    values = request.form.getlist('value')
+    if not patients or len(patients) != len(values):
+        flash("Each charge needs a patient address and a value.", "danger")
+        return redirect(url_for('dashboard'))
+
+    try:
+        patients = [w3.to_checksum_address(p.strip()) for p in patients]
+        values = [int(v) for v in values]
+        if min(values) <= 0:
+            raise ValueError("Charges must be greater than 0")
+    except Exception as e:
+        flash(f"Invalid input: {str(e)}", "danger")
+        return redirect(url_for('dashboard'))
+
+    try:
+        denied = unauthorized_patients(contract, doctor_address, patients)
+        if denied:
+            flash("Not authorized for: " + ", ".join(sorted(denied)), "danger")
+            return redirect(url_for('dashboard'))
+        job_ids = submit_charges(tx_queue, contract, doctor_address, session['private_key'],
+                                 list(zip(patients, values)))
+        for job_id in job_ids:
+            track_job(job_id)
+        flash(f"{len(patients)} charge(s) submitted in {len(job_ids)} transaction(s).", "info")
+    except Exception as e:
+        app.logger.error(f"Error creating charges: {e}")
+        flash("Error creating charges.", "danger")
+    return redirect(url_for('dashboard'))
+
+@app.route('/settle_transactions', methods=['POST'])
+def settle_transactions():
+    """Settle the selected transactions (``transaction_id`` fields) in as few transactions as possible."""
+    if 'address' not in session:
+        flash("Please log in first.", "danger")
+        return redirect(url_for('index'))
+
+    address = session['address']
+    try:
+        transaction_ids = {int(t) for t in request.form.getlist('transaction_id')}
+    except ValueError as e:
+        flash(f"Invalid input: {str(e)}", "danger")
+        return redirect(url_for('dashboard'))
+    if not transaction_ids:
+        flash("No transactions selected.", "danger")
+        return redirect(url_for('dashboard'))
+
+    try:
+        unknown = read(unsettleable_plan(address, transaction_ids))
+        if unknown:
+            flash("Not yours or already settled: " + ", ".join(map(str, sorted(unknown))), "danger")
+            return redirect(url_for('dashboard'))
+        job_ids = submit_settlements(tx_queue, contract, address, session['private_key'], transaction_ids)
+        for job_id in job_ids:
+            track_job(job_id)
+        flash(f"{len(transaction_ids)} settlement(s) submitted in {len(job_ids)} transaction(s).", "info")
+    except Exception as e:
+        app.logger.error(f"Error settling transactions: {e}")
+        flash("Error settling transactions.", "danger")
+    return redirect(url_for('dashboard'))
+
+@app.route('/unsettled_balance', methods=['GET'])
+def unsettled_balance():
+    if 'address' not in session:
+        return jsonify({"error": "Please log in first."}), 401
+    try:
+        return jsonify(read(unsettled_balance_plan(session['address'])))
+    except Exception as e:
+        return jsonify({"error": f"Failed to get unsettled balance: {str(e)}"}), 500
+
+# ---------------------- Record Verification ---------------------- #
+@app.route('/verify_record', methods=['GET'])
+def verify_record():
+    """Batched records of a patient (or one ``cid``) with their Merkle proofs, checked on chain."""
+    if record_batcher is None:
+        return jsonify({"error": "Record batching is disabled."}), 404
+    if 'address' not in session:
+        return jsonify({"error": "Please log in first."}), 401
+
+    try:
+        patient_address = w3.to_checksum_address(request.args.get('patient_address', '').strip())
+    except Exception as e:
+        return jsonify({"error": f"Invalid address format: {str(e)}"}), 400
+
+    address = session['address']
+    if patient_address != address and not (
+            session.get('role') == 'doctor'
+            and call_cache.call('isDoctorAuthorized', patient_address, address)):
+        return jsonify({"error": "Not authorized to view these records"}), 403
+
+    records = record_batcher.proofs(patient_address, request.args.get('cid') or None)
+    anchored = [r for r in records if r['status'] == 'anchored']
+    try:
+        results = BatchReader(w3, contract, session=rpc_session).call_many(
+            [('verifyRecordInclusion', r['root'], r['patient'], cid_to_digest(r['cid']), r['proof'])
+             for r in anchored])
+    except Exception as e:
+        return jsonify({"error": f"Failed to verify records: {str(e)}"}), 500
+    for record, (included, submitter, timestamp) in zip(anchored, results):
+        record['included'] = included
+        record['anchored_by'] = submitter
+        record['anchored_at'] = timestamp
+    return jsonify({"patient": patient_address, "records": records})
+
+def parse_hash(value):
+    """A 0x-prefixed 32-byte hex string (Merkle root or proof node) as bytes."""
+    if not isinstance(value, str) or not value.startswith('0x'):
+        raise ValueError(f"{value!r} is not a 0x-prefixed hex string")
+    node = HexBytes(value)
+    if len(node) != 32:
+        raise ValueError(f"{value} is not 32 bytes long")
+    return node
+
+@app.route('/verify_record', methods=['POST'])
+def verify_record_proof():
+    """Check a proof handed out by ``GET /verify_record`` for the patient or one of their doctors."""
+    if 'address' not in session:
+        return jsonify({"error": "Please log in first."}), 401
+
+    data = request.get_json(silent=True) or {}
+    try:
+        patient_address = w3.to_checksum_address(str(data.get('patient_address', '')).strip())
+    except Exception as e:
+        return jsonify({"error": f"Invalid address format: {str(e)}"}), 400
+
+    address = session['address']
+    if patient_address != address and not (
+            session.get('role') == 'doctor'
+            and call_cache.call('isDoctorAuthorized', patient_address, address)):
+        return jsonify({"error": "Not authorized to verify these records"}), 403
+
+    try:
+        cid, root, proof = str(data['cid']), parse_hash(data['root']), [parse_hash(h) for h in data['proof']]
+        valid = verify_proof(record_leaf(patient_address, cid), proof, root)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid proof: {str(e)}"}), 400
+
+    included, submitter, timestamp = False, None, None
+    if valid:
+        try:
+            included, submitter, timestamp = contract.functions.verifyRecordInclusion(
+                root, patient_address, cid_to_digest(cid), proof).call()
+        except Exception as e:
+            return jsonify({"error": f"Failed to verify record: {str(e)}"}), 500
+    return jsonify({"patient": patient_address, "cid": cid, "root": root.to_0x_hex(), "valid_proof": valid,
+                    "included": included, "anchored_by": submitter, "anchored_at": timestamp})
+
+# ---------------------- Live Events ---------------------- #
+@app.route('/events', methods=['GET'])
+def live_events():
+    if 'address' not in session:
+        return jsonify({"error": "Please log in first."}), 401
+
+    try:
+        patients, doctor = stream_audience(session['address'], session.get('role'), request.args.getlist('patient'))
+    except Exception as e:
+        return jsonify({"error": f"Failed to check access: {str(e)}"}), 500
+    subscription = Subscription(patients, doctor)
+    events = stream_events(event_broadcaster, subscription, request.headers.get('Last-Event-ID'), SSE_HEARTBEAT)
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# ---------------------- Transaction Status ---------------------- #
+@app.route('/tx_status/<job_id>', methods=['GET'])
+def tx_status(job_id):
+    pending = session.get('pending_jobs', [])
+    if job_id not in pending:
+        return jsonify({"error": "Unknown job id"}), 404
+
+    status = tx_queue.status(job_id)
+    if status is None:
+        session['pending_jobs'] = [j for j in pending if j != job_id]
+        return jsonify({"error": "Job expired"}), 404
+
+    # The dashboard reload after confirmation waits until the index has caught up
+    # with the mined block; the indexer's own thread does the syncing. With
+    # INDEXER_CONFIRMATIONS the checkpoint only passes the block once enough blocks
+    # follow it, which a quiet chain may never produce, so the wait is bounded.
+    indexed = True
+    if status['status'] == 'mined' and indexer is not None:
+        last = indexer.checkpoint()
+        indexed = last is not None and last >= status['block_number']
+    index_timeout = not indexed and time.time() - status['updated_at'] > TX_INDEX_WAIT
+    if status['status'] in FINAL_STATES and (indexed or index_timeout):
+        session['pending_jobs'] = [j for j in pending if j != job_id]
+    return jsonify({**status, 'indexed': indexed, 'index_timeout': index_timeout})
+
 # ---------------------- Logout ---------------------- #
 @app.route('/logout')
 def logout():
@@ -0,0 +1,264 @@
+"""Production (ASGI) serving mode.
+
+The read-heavy routes (dashboard and the paged JSON endpoints) run as async
+Quart views: the contract calls of each read plan fan out concurrently over a
+pooled keep-alive aiohttp connection to the node. Every other route is served
+by the Flask app in ``app.py`` on a thread pool, so sessions, flash messages,
+templates and the background workers are shared between the two.
+
+    pip install -r requirements-async.txt
+    SECRET_KEY=... hypercorn asgi:application --bind 0.0.0.0:8000
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, abort, flash, g, jsonify, make_response, redirect, render_template, request, session, url_for
+from web3 import AsyncWeb3, Web3  # type: ignore
+
+from app import (METRICS_ENABLED, PAGE_SIZE, RPC_POOL_SIZE, SSE_HEARTBEAT, WEB3_PROVIDER_URLS, app as flask_app,
+                 audit_page_plan, call_cache, contract, dashboard_cursors, doctor_dashboard_plan, event_broadcaster,
+                 make_page, metrics, paged_json, parse_cursor, parse_limit, patient_dashboard_plan,
+                 records_page_plan, rpc_provider, stream_audience, transactions_page_plan)
+from batch_reads import PlanResults
+from event_stream import AsyncSubscription, stream_events_async
+
+# Contract calls in flight at once across all requests
+ASYNC_CONCURRENCY = int(os.getenv('ASYNC_CONCURRENCY', '64'))
+# Threads serving the Flask routes and the synchronous parts of read plans
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', '32'))
+# Flask routes receive fully buffered request bodies (record uploads)
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', str(64 * 1024 * 1024)))
+
+quart_app = Quart(__name__)
+quart_app.secret_key = flask_app.secret_key
+
+# One async client per node; each read plan runs on the node the app's provider routes reads to
+aw3s = {uri: AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(uri)) for uri in WEB3_PROVIDER_URLS}
+acontracts = {uri: aw3.eth.contract(address=contract.address, abi=contract.abi) for uri, aw3 in aw3s.items()}
+_rpc_slots = asyncio.Semaphore(ASYNC_CONCURRENCY)
+_rpc_session = None
+
+@quart_app.before_serving
+async def open_pools():
+    global _rpc_session
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='medichain-asgi'))
+    _rpc_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=RPC_POOL_SIZE, keepalive_timeout=60),
+        timeout=aiohttp.ClientTimeout(total=30))
+    for aw3 in aw3s.values():
+        await aw3.provider.cache_async_session(_rpc_session)
+
+@quart_app.after_serving
+async def close_pools():
+    if _rpc_session is not None:
+        await _rpc_session.close()
+
+# ---------------------- Request Metrics ---------------------- #
+# Same per-route metrics as the Flask routes; node calls of the async client are timed one by one
+if METRICS_ENABLED:
+    @quart_app.before_request
+    async def start_request_metrics():
+        metrics.begin_request(request.endpoint)
+
+    @quart_app.after_request
+    async def record_response_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @quart_app.teardown_request
+    async def finish_request_metrics(exc):
+        metrics.end_request(g.get('metrics_status', 500))
+
+async def _timed(method, function, call):
+    started = time.perf_counter()
+    try:
+        return await call
+    finally:
+        metrics.observe_rpc(method, function, time.perf_counter() - started)
+
+# ---------------------- Read Plans ---------------------- #
+async def _contract_call(acontract, block, fn_name, *args):
+    async with _rpc_slots:
+        return await _timed('eth_call', fn_name,
+                            getattr(acontract.functions, fn_name)(*args).call(block_identifier=block))
+
+def _step(plan, value):
+    """Advance a plan; returns (finished, next calls or final result)."""
+    try:
+        return False, plan.send(value)
+    except StopIteration as done:
+        return True, done.value
+
+async def read(plan):
+    """Runs a read plan with each step's calls issued concurrently, all at one block.
+
+    The plan's own code (indexer lookups) is synchronous and runs on the
+    thread pool so it never blocks the event loop. Every call goes to the
+    node reads are currently routed to; connection failures count against
+    it in the app's provider.
+    """
+    uri = rpc_provider.read_endpoint()
+    block = None
+    finished, value = await asyncio.to_thread(_step, plan, None)
+    try:
+        while not finished:
+            if block is None:
+                block = await _timed('eth_blockNumber', '', aw3s[uri].eth.block_number)
+            results = await asyncio.gather(*(_contract_call(acontracts[uri], block, *call) for call in value))
+            finished, value = await asyncio.to_thread(_step, plan, PlanResults(results, block))
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        rpc_provider.report_failure(uri, e)
+        raise
+    return value
+
+# ---------------------- Async Routes ---------------------- #
+@quart_app.route('/dashboard')
+async def dashboard():
+    if 'address' not in session:
+        await flash("Please log in first.", "danger")
+        return redirect(url_for('index'))
+
+    address = session['address']
+    role = session['role']
+    name = session['name']
+    cursors = dashboard_cursors(request.args)
+
+    try:
+        if role == 'patient':
+            user_info, doctors, transactions, pages = await read(patient_dashboard_plan(address, cursors))
+            return await render_template('patient_dashboard.html',
+                                         user_info=user_info,
+                                         transactions=transactions,
+                                         name=name,
+                                         role=role,
+                                         doctors=doctors,
+                                         pages=pages,
+                                         page_size=PAGE_SIZE)
+
+        elif role == 'doctor':
+            user_info, patients, transactions, pages = await read(doctor_dashboard_plan(address, cursors))
+            return await render_template('doctor_dashboard.html',
+                                         user_info=user_info,
+                                         transactions=transactions,
+                                         name=name,
+                                         role=role,
+                                         patients=patients,
+                                         pages=pages,
+                                         page_size=PAGE_SIZE)
+
+        else:
+            user_info = {'Error': 'Unknown role.'}
+            return await render_template('dashboard.html', user_info=user_info, name=name, role=role)
+
+    except Exception as e:
+        quart_app.logger.error(f"Error fetching dashboard data: {e}")
+        await flash("Error fetching dashboard data.", "danger")
+        return redirect(url_for('index'))
+
+@quart_app.route('/get_patient_audit', methods=['GET'])
+async def get_patient_audit():
+    patient_address = request.args.get('patient_address')
+    if not patient_address:
+        return jsonify({"error": "patient_address is required"}), 400
+
+    try:
+        patient_address = Web3.to_checksum_address(patient_address.strip())
+    except Exception as e:
+        return jsonify({"error": f"Invalid address format: {str(e)}"}), 400
+
+    offset = parse_cursor(args=request.args)
+    limit = parse_limit(request.args)
+
+    try:
+        events_list, total = await read(audit_page_plan(patient_address, offset, limit))
+        if not total:
+            return jsonify({"error": "No audit history found for this address"}), 404
+        return paged_json(events_list, make_page(offset, len(events_list), total), jsonify)
+    except Exception as e:
+        return jsonify({"error": f"Failed to get audit history: {str(e)}"}), 500
+
+@quart_app.route('/get_medical_records', methods=['GET'])
+async def get_medical_records():
+    if 'address' not in session:
+        return jsonify({"error": "Please log in first."}), 401
+
+    try:
+        patient_address = Web3.to_checksum_address(request.args.get('patient_address', '').strip())
+    except Exception as e:
+        return jsonify({"error": f"Invalid address format: {str(e)}"}), 400
+
+    address = session['address']
+    if patient_address != address and not (
+            session.get('role') == 'doctor'
+            and await asyncio.to_thread(call_cache.call, 'isDoctorAuthorized', patient_address, address)):
+        return jsonify({"error": "Not authorized to view these records"}), 403
+
+    try:
+        records, page = await read(records_page_plan(patient_address, parse_cursor(args=request.args),
+                                                     parse_limit(request.args)))
+        return paged_json(records, page, jsonify)
+    except Exception as e:
+        return jsonify({"error": f"Failed to get medical records: {str(e)}"}), 500
+
+@quart_app.route('/get_transactions', methods=['GET'])
+async def get_transactions():
+    if 'address' not in session:
+        return jsonify({"error": "Please log in first."}), 401
+
+    try:
+        transactions, page = await read(transactions_page_plan(
+            session['address'], parse_cursor(args=request.args), parse_limit(request.args)))
+        return paged_json(transactions, page, jsonify)
+    except Exception as e:
+        return jsonify({"error": f"Failed to get transactions: {str(e)}"}), 500
+
+@quart_app.route('/events', methods=['GET'])
+async def live_events():
+    if 'address' not in session:
+        return jsonify({"error": "Please log in first."}), 401
+
+    try:
+        patients, doctor = await asyncio.to_thread(
+            stream_audience, session['address'], session.get('role'), request.args.getlist('patient'))
+    except Exception as e:
+        return jsonify({"error": f"Failed to check access: {str(e)}"}), 500
+    subscription = AsyncSubscription(patients, doctor)
+    events = stream_events_async(event_broadcaster, subscription, request.headers.get('Last-Event-ID'),
+                                 SSE_HEARTBEAT)
+    response = await make_response(events, {'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+                                             'X-Accel-Buffering': 'no'})
+    response.timeout = None  # streams for as long as the page is open
+    return response
+
+# ---------------------- Flask Routes ---------------------- #
+async def _served_by_flask(**kwargs):
+    abort(404)
+
+# Register the Flask endpoints so url_for() in shared templates can build them;
+# requests for these paths never reach Quart (see application below).
+for _rule in flask_app.url_map.iter_rules():
+    if _rule.endpoint not in quart_app.view_functions:
+        quart_app.add_url_rule(_rule.rule, _rule.endpoint, _served_by_flask, methods=_rule.methods)
+
+ASYNC_PATHS = {'/dashboard', '/get_patient_audit', '/get_medical_records', '/get_transactions', '/events'}
+wsgi_app = AsyncioWSGIMiddleware(flask_app, max_body_size=MAX_UPLOAD_SIZE)
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan' or scope.get('path') in ASYNC_PATHS:
+        await quart_app(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
+
+# ---------------------- Entrypoint ---------------------- #
+if __name__ == "__main__":
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [os.getenv('BIND', '127.0.0.1:8000')]
+    asyncio.run(serve(application, config))
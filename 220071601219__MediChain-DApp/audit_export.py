@@ -0,0 +1,211 @@
+"""Streaming audit history export for compliance.
+
+    python audit_export.py > audit.ndjson                       # every patient
+    python audit_export.py --patient 0xABC... --format csv
+    python audit_export.py --from-block 1200 --cursor 17:40     # resume an interrupted export
+
+Rows are produced one page at a time (``page_size`` events per RPC batch),
+so memory stays flat however long the histories are. Every row carries the
+cursor to resume *after* it: an event index for a single patient, or
+``<patient index>:<event index>`` when walking ``patientList``. Audit
+arrays are append-only on chain, so cursors stay valid across blocks.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+from dotenv import load_dotenv  # type: ignore
+from web3 import Web3  # type: ignore
+
+from batch_reads import BatchReader
+from contract_abi import ABI_PATH, load_abi
+from indexer import audit_in_logs, audit_logs
+from rpc_endpoints import provider_from_env
+
+EXPORT_FIELDS = ('patient', 'index', 'actor', 'action', 'timestamp', 'cursor')
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def parse_export_cursor(value, all_patients):
+    """``(patient_index, event_index)`` from a cursor string; raises ``ValueError`` when malformed."""
+    if not value:
+        return 0, 0
+    if all_patients:
+        patient_index, event_index = value.split(':')
+        cursor = int(patient_index), int(event_index)
+    else:
+        cursor = 0, int(value)
+    if min(cursor) < 0:
+        raise ValueError("cursor must not be negative")
+    return cursor
+
+
+def block_time_range(w3, from_block=None, to_block=None, since=None, until=None):
+    """Narrow a ``since``/``until`` timestamp range to the timestamps of a block range.
+
+    Audit events store a timestamp but no block number, so a block range is
+    applied as the range between the two blocks' timestamps.
+    """
+    if from_block is not None:
+        start = w3.eth.get_block(from_block)['timestamp']
+        since = start if since is None else max(since, start)
+    if to_block is not None:
+        end = w3.eth.get_block(to_block)['timestamp']
+        until = end if until is None else min(until, end)
+    return since, until
+
+
+class AuditExporter:
+    """Yields audit events as dicts, for one patient or for every patient in ``patientList``.
+
+    All chain reads of one export are pinned to the block it started at.
+    Histories of patients the (caught-up) indexer knows are read from
+    SQLite instead, and with ``audit_in_logs`` (no on-chain audit storage)
+    the rest come from ``AuditLogged`` logs since ``from_block``.
+    """
+
+    def __init__(self, w3, contract, session=None, indexer=None, page_size=200,
+                 audit_in_logs=False, from_block=0):
+        self.w3 = w3
+        self.contract = contract
+        self.session = session
+        self.indexer = indexer
+        self.page_size = page_size
+        self.audit_in_logs = audit_in_logs
+        self.from_block = from_block
+
+    def rows(self, patient=None, cursor=(0, 0), since=None, until=None):
+        reader = BatchReader(self.w3, self.contract, session=self.session)
+        reader.pin()
+        if patient is not None:
+            for index, event in self._events(reader, patient, cursor[1], since, until):
+                yield dict(event, patient=patient, index=index, cursor=str(index + 1))
+            return
+
+        patient_index, start = cursor
+        for patient_index, patient in self._patients(reader, patient_index):
+            for index, event in self._events(reader, patient, start, since, until):
+                yield dict(event, patient=patient, index=index, cursor=f"{patient_index}:{index + 1}")
+            start = 0
+
+    def _patients(self, reader, start):
+        total = reader.call_many([('getPatientListLength',)])[0]
+        for offset in range(start, total, self.page_size):
+            indexes = range(offset, min(offset + self.page_size, total))
+            addresses = reader.call_many([('patientList', i) for i in indexes])
+            yield from zip(indexes, addresses)
+
+    def _use_indexer(self, patient):
+        return self.indexer is not None and self.indexer.ready() and self.indexer.patient(patient)
+
+    def _events(self, reader, patient, start, since, until):
+        if self._use_indexer(patient):
+            total = self.indexer.audit_history_count(patient)
+
+            def fetch(offset):
+                return self.indexer.audit_history(patient, offset, self.page_size)
+        elif self.audit_in_logs:
+            events = audit_logs(self.contract, patient, self.from_block, reader.block)
+            total = len(events)
+
+            def fetch(offset):
+                return events[offset:offset + self.page_size]
+        else:
+            total = reader.call_many([('getPatientEventsCount', patient)])[0]
+            if since is not None and start < total:
+                start = max(start, self._first_at(reader, patient, since, start, total))
+
+            def fetch(offset):
+                page = reader.call_many([('getPatientAuditHistoryRange', patient, offset, self.page_size)])[0]
+                return [{'actor': evt[0], 'action': evt[1], 'timestamp': evt[2]} for evt in page]
+
+        index = start
+        while index < total:
+            page = fetch(index)
+            if not page:
+                return
+            for event in page:
+                if until is not None and event['timestamp'] > until:
+                    return
+                if since is None or event['timestamp'] >= since:
+                    yield index, event
+                index += 1
+
+    def _first_at(self, reader, patient, since, low, high):
+        """First event index at or after ``since`` (events are appended in time order)."""
+        while low < high:
+            mid = (low + high) // 2
+            if reader.call_many([('getPatientEvent', patient, mid)])[0][2] < since:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+
+def encode_rows(rows, fmt, on_error=None):
+    """Serialise rows incrementally as NDJSON lines or CSV (with a header).
+
+    A failure after streaming has started can no longer change the response
+    status, so ``on_error`` is told about it and NDJSON output ends with an
+    ``{"error": ...}`` line.
+    """
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        yield buffer.getvalue()
+    try:
+        for row in rows:
+            if fmt == 'csv':
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerow(row)
+                yield buffer.getvalue()
+            else:
+                yield json.dumps({field: row[field] for field in EXPORT_FIELDS}) + '\n'
+    except Exception as e:
+        if on_error:
+            on_error(e)
+        if fmt == 'ndjson':
+            yield json.dumps({'error': str(e)}) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patient", help="export one patient (default: every patient)")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--cursor", help="resume after the row carrying this cursor")
+    parser.add_argument("--from-block", type=int)
+    parser.add_argument("--to-block", type=int)
+    parser.add_argument("--since", type=int, help="unix timestamp")
+    parser.add_argument("--until", type=int, help="unix timestamp")
+    parser.add_argument("--output", help="file to write (default: stdout)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    w3 = Web3(provider_from_env())
+    contract = w3.eth.contract(address=Web3.to_checksum_address(os.getenv('CONTRACT_ADDRESS')),
+                               abi=load_abi(os.getenv('CONTRACT_ABI_PATH', ABI_PATH)))
+    patient = Web3.to_checksum_address(args.patient) if args.patient else None
+    since, until = block_time_range(w3, args.from_block, args.to_block, args.since, args.until)
+
+    exporter = AuditExporter(w3, contract, audit_in_logs=audit_in_logs(contract),
+                             from_block=int(os.getenv('INDEXER_START_BLOCK', '0')))
+    rows = exporter.rows(patient, parse_export_cursor(args.cursor, patient is None), since, until)
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        for chunk in encode_rows(rows, args.format, on_error=lambda e: print(f"❌ {e}", file=sys.stderr)):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
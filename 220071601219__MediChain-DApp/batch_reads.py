@@ -0,0 +1,148 @@
+import itertools
+
+import requests
+from web3 import Web3  # type: ignore
+
+# Shared keep-alive session for batch POSTs
+_session = requests.Session()
+_ids = itertools.count(1)
+
+
+class BatchCallError(Exception):
+    """Raised when one of the calls in a batch fails."""
+
+
+def can_batch(w3):
+    """Whether ``w3``'s provider takes JSON-RPC batches (HTTP, or routed through ``post_batch``)."""
+    endpoint = getattr(w3.provider, 'endpoint_uri', None)
+    return hasattr(w3.provider, 'post_batch') or bool(endpoint and str(endpoint).startswith('http'))
+
+
+def post_batch(w3, calls, session=None, min_block=None):
+    """Send ``[(method, params), ...]`` as one JSON-RPC batch and return the responses in order.
+
+    Providers routing between several nodes get the batch through their
+    ``post_batch`` (sent to a node known to have reached ``min_block``).
+    """
+    batch = [{'jsonrpc': '2.0', 'id': next(_ids), 'method': method, 'params': params} for method, params in calls]
+    provider_post = getattr(w3.provider, 'post_batch', None)
+    if provider_post is not None:
+        responses = provider_post(batch, min_block=min_block)
+    else:
+        response = (session or _session).post(w3.provider.endpoint_uri, json=batch, timeout=30)
+        response.raise_for_status()
+        responses = response.json()
+    by_id = {item['id']: item for item in responses}
+    # Batch responses may arrive in any order
+    return [by_id[request['id']] for request in batch]
+
+
+def _collapse(output):
+    """ABI type string for an output, expanding tuple components."""
+    abi_type = output['type']
+    if abi_type.startswith('tuple'):
+        inner = ','.join(_collapse(c) for c in output['components'])
+        return f"({inner}){abi_type[len('tuple'):]}"
+    return abi_type
+
+
+def _normalize(abi_type, components, value):
+    """Checksum addresses the way ``ContractFunction.call()`` does."""
+    if abi_type.endswith(']'):
+        inner = abi_type[:abi_type.rindex('[')]
+        return [_normalize(inner, components, v) for v in value]
+    if abi_type == 'tuple':
+        return tuple(_normalize(c['type'], c.get('components'), v) for c, v in zip(components, value))
+    if abi_type == 'address':
+        return Web3.to_checksum_address(value)
+    return value
+
+
+class BatchReader:
+    """Runs many contract view calls in one JSON-RPC batch, pinned to a single block.
+
+    Over HTTP providers the calls are sent as one batch POST (through
+    ``post_batch`` on providers that route between several nodes); any other
+    provider falls back to sequential ``eth_call`` requests at the same block.
+    """
+
+    def __init__(self, w3, contract, session=None):
+        self.w3 = w3
+        self.contract = contract
+        self.session = session or _session
+        self.block = None
+        self._functions = {
+            item['name']: item for item in contract.abi if item.get('type') == 'function'
+        }
+
+    def pin(self, block_identifier=None):
+        """Fix the block all subsequent batches read from (defaults to the current head)."""
+        if block_identifier is None:
+            block_identifier = self.w3.eth.block_number
+        self.block = block_identifier
+        return self.block
+
+    def call_many(self, calls):
+        """Execute ``[(fn_name, *args), ...]`` and return the decoded results in order."""
+        if not calls:
+            return []
+        if self.block is None:
+            self.pin()
+        block = hex(self.block) if isinstance(self.block, int) else self.block
+
+        encode = getattr(self.contract, 'encode_abi', None) or self.contract.encodeABI
+        payloads = []
+        for fn_name, *args in calls:
+            payloads.append({
+                'to': self.contract.address,
+                'data': encode(fn_name, args=list(args)),
+            })
+
+        if can_batch(self.w3):
+            raw_results = post_batch(self.w3, [('eth_call', [payload, block]) for payload in payloads], self.session,
+                                     min_block=self.block if isinstance(self.block, int) else None)
+        else:
+            raw_results = [
+                {'result': self.w3.eth.call(payload, block_identifier=self.block)} for payload in payloads
+            ]
+
+        results = []
+        for (fn_name, *_), response in zip(calls, raw_results):
+            if 'error' in response:
+                raise BatchCallError(f"{fn_name} failed: {response['error'].get('message')}")
+            results.append(self._decode(fn_name, response['result']))
+        return results
+
+    def _decode(self, fn_name, data):
+        outputs = self._functions[fn_name]['outputs']
+        types = [_collapse(o) for o in outputs]
+        if isinstance(data, str):
+            data = Web3.to_bytes(hexstr=data)
+        values = self.w3.codec.decode(types, data)
+        values = [
+            _normalize(o['type'], o.get('components'), v) for o, v in zip(outputs, values)
+        ]
+        return values[0] if len(values) == 1 else values
+
+
+class PlanResults(list):
+    """Results of one step of a read plan, with the block they were read at."""
+
+    def __init__(self, results, block):
+        super().__init__(results)
+        self.block = block
+
+
+def run_plan(plan, reader):
+    """Drive a read plan with a ``BatchReader``.
+
+    A plan is a generator that yields lists of ``(fn_name, *args)`` calls,
+    receives their results as ``PlanResults`` and returns the assembled view.
+    Every step goes out as one batch, all pinned to the block of the first.
+    """
+    try:
+        calls = next(plan)
+        while True:
+            calls = plan.send(PlanResults(reader.call_many(calls), reader.block))
+    except StopIteration as done:
+        return done.value
@@ -0,0 +1,143 @@
+"""Billing ledger: doctors' charges to patients and their settlement.
+
+Charges are created with ``createCharges`` (the patient as sender, the
+doctor as receiver) and settled with ``settleTransactions``, both in chunks
+of ``BILLING_CHUNK`` per transaction. Settled flags are kept in a bitmap on
+chain, so settling a run of recent transactions writes a few slots instead
+of one per transaction.
+
+    BILLING_PRIVATE_KEY=0x... python billing.py charge charges.csv
+    BILLING_PRIVATE_KEY=0x... python billing.py settle 12 13 14
+    BILLING_PRIVATE_KEY=0x... python billing.py settle --all
+    python billing.py balance 0xADDRESS
+
+The charges file is a CSV with ``patient_address`` and ``value`` (wei)
+columns, or a JSON list of objects with the same keys.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+
+from dotenv import load_dotenv  # type: ignore
+from web3 import Web3  # type: ignore
+
+from contract_abi import ABI_PATH, load_abi
+from rpc_endpoints import provider_from_env
+from tx_queue import FINAL_STATES, TransactionQueue
+
+# Charges / settlements per transaction
+BILLING_CHUNK = int(os.getenv('BILLING_CHUNK', '200'))
+
+
+def read_charges(path):
+    with open(path, 'r', newline='') as f:
+        rows = json.load(f) if path.endswith('.json') else list(csv.DictReader(f))
+    return [(Web3.to_checksum_address(row['patient_address'].strip()), int(row['value'])) for row in rows]
+
+
+def chunked(items, size=BILLING_CHUNK):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def format_balance(owed, due):
+    """``getUnsettledBalance`` result in the layout of ``EventIndexer.unsettled_balance``."""
+    return {'owed': owed, 'due': due}
+
+
+def unsettled_transaction_ids(contract, address, page_size=BILLING_CHUNK):
+    """IDs of the unsettled transactions of ``address``, paged through its transaction list."""
+    total = contract.functions.getTransactionsCount(address).call()
+    ids = []
+    for offset in range(0, total, page_size):
+        # Transactions layout: (id, sender, receiver, value, settled)
+        page = contract.functions.getTransactionsForAddressRange(address, offset, page_size).call()
+        ids += [txn[0] for txn in page if not txn[4]]
+    return ids
+
+
+def submit_charges(tx_queue, contract, doctor, private_key, charges):
+    """Queue ``(patient, value)`` charges from ``doctor``, one transaction per chunk; returns the job ids."""
+    return [
+        tx_queue.submit(contract.functions.createCharges([patient for patient, _ in chunk],
+                                                         [value for _, value in chunk]),
+                        {'from': doctor}, private_key, f"Create charges ({len(chunk)})")
+        for chunk in chunked(charges)
+    ]
+
+
+def submit_settlements(tx_queue, contract, sender, private_key, transaction_ids):
+    """Queue the settlement of ``transaction_ids``, one transaction per chunk; returns the job ids."""
+    return [
+        tx_queue.submit(contract.functions.settleTransactions(chunk), {'from': sender}, private_key,
+                        f"Settle transactions ({len(chunk)})")
+        for chunk in chunked(sorted(transaction_ids))
+    ]
+
+
+def wait(tx_queue, job_ids):
+    while True:
+        statuses = [tx_queue.status(job_id) for job_id in job_ids]
+        if all(status['status'] in FINAL_STATES for status in statuses):
+            break
+        time.sleep(1)
+    for status in statuses:
+        mark = '✅' if status['status'] == 'mined' else '❌'
+        print(f"{mark} {status['description']}: {status['status']} {status['tx_hash'] or status['error']}")
+    return all(status['status'] == 'mined' for status in statuses)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    charge = commands.add_parser("charge", help="create charges from a CSV or JSON file (doctors)")
+    charge.add_argument("charges", help="CSV or JSON file of patient_address/value pairs")
+    settle = commands.add_parser("settle", help="settle transactions (either party)")
+    settle.add_argument("ids", type=int, nargs="*", help="transaction IDs")
+    settle.add_argument("--all", action="store_true", help="settle every unsettled transaction of the account")
+    balance = commands.add_parser("balance", help="show an address's unsettled balance")
+    balance.add_argument("address")
+    args = parser.parse_args()
+
+    load_dotenv()
+    w3 = Web3(provider_from_env())
+    contract = w3.eth.contract(address=Web3.to_checksum_address(os.getenv('CONTRACT_ADDRESS')),
+                               abi=load_abi(os.getenv('CONTRACT_ABI_PATH', ABI_PATH)))
+
+    if args.command == "balance":
+        result = format_balance(*contract.functions.getUnsettledBalance(Web3.to_checksum_address(args.address)).call())
+        print(json.dumps(result, indent=2))
+        return
+
+    private_key = os.getenv('BILLING_PRIVATE_KEY')
+    if not private_key:
+        raise SystemExit("BILLING_PRIVATE_KEY is not set")
+    sender = w3.eth.account.from_key(private_key).address
+
+    if args.command == "charge":
+        charges = read_charges(args.charges)
+        if not charges:
+            return
+        tx_queue = TransactionQueue(w3, workers=1)
+        tx_queue.start()
+        job_ids = submit_charges(tx_queue, contract, sender, private_key, charges)
+        print(f"⏳ Submitted {len(charges)} charges in {len(job_ids)} transactions")
+    else:
+        ids = set(args.ids)
+        if args.all:
+            ids |= set(unsettled_transaction_ids(contract, sender))
+        if not ids:
+            print("Nothing to settle")
+            return
+        tx_queue = TransactionQueue(w3, workers=1)
+        tx_queue.start()
+        job_ids = submit_settlements(tx_queue, contract, sender, private_key, ids)
+        print(f"⏳ Submitted {len(ids)} settlements in {len(job_ids)} transactions")
+
+    if not wait(tx_queue, job_ids):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# go-ipfs defaults: 256 KiB fixed-size chunks, balanced DAG with up to 174 links per node
+CHUNK_SIZE = 262144
+MAX_LINKS = 174
+
+PINATA_PIN_URL = 'https://api.pinata.cloud/pinning/pinFileToIPFS'
+PINATA_LIST_URL = 'https://api.pinata.cloud/data/pinList'
+
+_B58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+
+class BlobStoreError(Exception):
+    """Raised when a blob cannot be stored."""
+
+
+# ---------------------- CID computation ---------------------- #
+def _varint(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _uint_field(number, value):
+    return _varint(number << 3) + _varint(value)
+
+
+def _bytes_field(number, data):
+    return _varint(number << 3 | 2) + _varint(len(data)) + data
+
+
+def _unixfs_file(data, filesize, blocksizes=()):
+    """UnixFS ``Data`` message for a file node (Type=File)."""
+    out = _uint_field(1, 2)
+    if data:
+        out += _bytes_field(2, data)
+    out += _uint_field(3, filesize)
+    for size in blocksizes:
+        out += _uint_field(4, size)
+    return out
+
+
+def _dag_pb_node(unixfs_data, links=()):
+    """dag-pb ``PBNode``; links are serialised before data."""
+    out = b''
+    for multihash, tsize in links:
+        link = _bytes_field(1, multihash) + _bytes_field(2, b'') + _uint_field(3, tsize)
+        out += _bytes_field(2, link)
+    return out + _bytes_field(1, unixfs_data)
+
+
+def _sha256_multihash(data):
+    return b'\x12\x20' + hashlib.sha256(data).digest()
+
+
+def b58encode(data):
+    n = int.from_bytes(data, 'big')
+    out = ''
+    while n:
+        n, rem = divmod(n, 58)
+        out = _B58_ALPHABET[rem] + out
+    return '1' * (len(data) - len(data.lstrip(b'\0'))) + out
+
+
+class CidBuilder:
+    """Computes the CIDv0 ``ipfs add`` would assign, one chunk at a time.
+
+    Only a (multihash, tsize, filesize) triple is kept per chunk, so memory
+    stays small however large the file is.
+    """
+
+    def __init__(self):
+        self._nodes = []
+
+    def add_chunk(self, chunk):
+        node = _dag_pb_node(_unixfs_file(chunk, len(chunk)))
+        self._nodes.append((_sha256_multihash(node), len(node), len(chunk)))
+
+    def finish(self):
+        level = self._nodes or [self._leaf_for_empty_file()]
+        while len(level) > 1:
+            level = [self._parent(level[i:i + MAX_LINKS]) for i in range(0, len(level), MAX_LINKS)]
+        return b58encode(level[0][0])
+
+    @staticmethod
+    def _leaf_for_empty_file():
+        node = _dag_pb_node(_unixfs_file(b'', 0))
+        return _sha256_multihash(node), len(node), 0
+
+    @staticmethod
+    def _parent(children):
+        filesize = sum(c[2] for c in children)
+        data = _unixfs_file(b'', filesize, [c[2] for c in children])
+        node = _dag_pb_node(data, [(c[0], c[1]) for c in children])
+        return _sha256_multihash(node), len(node) + sum(c[1] for c in children), filesize
+
+
+def _read_chunk(stream, size):
+    """Read exactly ``size`` bytes unless the stream ends first."""
+    parts = []
+    remaining = size
+    while remaining:
+        data = stream.read(remaining)
+        if not data:
+            break
+        parts.append(data)
+        remaining -= len(data)
+    return b''.join(parts)
+
+
+# ---------------------- Backends ---------------------- #
+class LocalBlobStore:
+    """Content-addressed blob store on local disk.
+
+    Uploads are streamed to a temporary file in ``CHUNK_SIZE`` pieces while the
+    IPFS-compatible CID is computed, then moved to ``<root>/<cid>``. A blob that
+    already exists is not stored twice, and only new blobs are handed to the
+    optional replicator.
+    """
+
+    def __init__(self, root, replicator=None):
+        self.root = root
+        self.replicator = replicator
+        self._tmp = os.path.join(root, 'tmp')
+        os.makedirs(self._tmp, exist_ok=True)
+
+    def path(self, cid):
+        return os.path.join(self.root, os.path.basename(cid))
+
+    def exists(self, cid):
+        return os.path.isfile(self.path(cid))
+
+    def put(self, stream, filename=None, content_type=None):
+        builder = CidBuilder()
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = _read_chunk(stream, CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    tmp.write(chunk)
+                    builder.add_chunk(chunk)
+            cid = builder.finish()
+            if self.exists(cid):
+                os.remove(tmp_path)
+                return cid
+            os.replace(tmp_path, self.path(cid))
+        except OSError as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise BlobStoreError(f"Could not store blob: {e}")
+
+        if self.replicator:
+            self.replicator.replicate(cid, self.path(cid), filename, content_type)
+        return cid
+
+
+class PinataBlobStore:
+    """Synchronous Pinata upload, kept for deployments without local storage."""
+
+    def __init__(self, api_key, secret_api_key, session=None, timeout=60):
+        self.headers = {'pinata_api_key': api_key, 'pinata_secret_api_key': secret_api_key}
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+    def put(self, stream, filename=None, content_type=None):
+        files = {'file': (filename, stream, content_type)}
+        # Records are stored as CIDv0 digests (cid_codec.py), whatever the account's default
+        data = {'pinataOptions': json.dumps({'cidVersion': 0})}
+        try:
+            response = self.session.post(PINATA_PIN_URL, files=files, data=data, headers=self.headers,
+                                         timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise BlobStoreError(f"Error uploading file to Pinata: {e}")
+        if response.status_code != 200:
+            raise BlobStoreError(f"Pinata upload failed: {response.text}")
+        return response.json()['IpfsHash']
+
+
+class _MultipartFile:
+    """File-like multipart/form-data body streamed from disk with a known length."""
+
+    def __init__(self, path, filename, content_type):
+        self.boundary = os.urandom(16).hex()
+        self._head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type or "application/octet-stream"}\r\n\r\n'
+        ).encode()
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode()
+        self._file = open(path, 'rb')
+        self._size = os.path.getsize(path)
+        self._stage = 0
+        self._pos = 0
+
+    def __len__(self):
+        return len(self._head) + self._size + len(self._tail)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self)
+        out = b''
+        while len(out) < size and self._stage < 3:
+            if self._stage == 1:
+                data = self._file.read(size - len(out))
+                if not data:
+                    self._stage = 2
+                out += data
+                continue
+            part = self._head if self._stage == 0 else self._tail
+            data = part[self._pos:self._pos + size - len(out)]
+            self._pos += len(data)
+            out += data
+            if self._pos >= len(part):
+                self._stage += 1
+                self._pos = 0
+        return out
+
+    def close(self):
+        self._file.close()
+
+
+class PinataReplicator:
+    """Pins locally stored blobs to Pinata in the background.
+
+    Before uploading, a CID is checked against a local marker and then against
+    Pinata's pin list, so identical content is transferred at most once.
+    """
+
+    def __init__(self, api_key, secret_api_key, state_dir, session=None, workers=2, timeout=600):
+        self.headers = {'pinata_api_key': api_key, 'pinata_secret_api_key': secret_api_key}
+        self.session = session or requests.Session()
+        self.state_dir = state_dir
+        self.workers = workers
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._threads = []
+        os.makedirs(state_dir, exist_ok=True)
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'medichain-pin-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        """Block until every queued blob has been pinned (or has failed)."""
+        self._queue.join()
+
+    def replicate(self, cid, path, filename=None, content_type=None):
+        if not self.is_pinned(cid):
+            self._queue.put((cid, path, filename or cid, content_type))
+
+    def is_pinned(self, cid):
+        return os.path.exists(os.path.join(self.state_dir, os.path.basename(cid)))
+
+    def _mark_pinned(self, cid):
+        open(os.path.join(self.state_dir, os.path.basename(cid)), 'w').close()
+
+    def _work(self):
+        while True:
+            cid, path, filename, content_type = self._queue.get()
+            try:
+                self._pin(cid, path, filename, content_type)
+            except Exception as e:
+                logger.error(f"Pinning {cid} to Pinata failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _remote_has(self, cid):
+        response = self.session.get(PINATA_LIST_URL, headers=self.headers, timeout=30,
+                                    params={'status': 'pinned', 'hashContains': cid})
+        response.raise_for_status()
+        return response.json().get('count', 0) > 0
+
+    def _pin(self, cid, path, filename, content_type):
+        if self.is_pinned(cid):
+            return
+        if self._remote_has(cid):
+            self._mark_pinned(cid)
+            return
+        body = _MultipartFile(path, filename, content_type)
+        try:
+            response = self.session.post(
+                PINATA_PIN_URL, data=body, timeout=self.timeout,
+                headers={**self.headers, 'Content-Type': f'multipart/form-data; boundary={body.boundary}'})
+        finally:
+            body.close()
+        response.raise_for_status()
+        pinned_cid = response.json()['IpfsHash']
+        if pinned_cid != cid:
+            logger.warning(f"Pinata returned {pinned_cid} for local blob {cid}")
+        self._mark_pinned(cid)
+
+
+def blob_store_from_env(session=None):
+    """Blob store selected by ``STORAGE_BACKEND``.
+
+    'local' stores files content-addressed under ``BLOB_STORE_DIR`` and
+    replicates them to Pinata in the background when keys are set; 'pinata'
+    uploads synchronously.
+    """
+    api_key = os.getenv('PINATA_API_KEY')
+    secret_api_key = os.getenv('PINATA_SECRET_API_KEY')
+    if os.getenv('STORAGE_BACKEND', 'local') == 'pinata':
+        if not api_key or not secret_api_key:
+            raise BlobStoreError("Pinata API keys are not set in environment.")
+        return PinataBlobStore(api_key, secret_api_key, session=session)
+
+    root = os.getenv('BLOB_STORE_DIR', 'blobs')
+    replicator = None
+    if api_key and secret_api_key:
+        replicator = PinataReplicator(api_key, secret_api_key, os.path.join(root, 'pinned'), session=session)
+        replicator.start()
+    return LocalBlobStore(root, replicator=replicator)
@@ -0,0 +1,201 @@
+"""Bulk medical record upload for lab integrations.
+
+Reads a manifest of (patient address, file) pairs, stores the files
+concurrently in the configured blob store and commits the records with
+``createOrUpdateMedicalRecords`` in as few transactions as the gas budget
+allows (one ``MedicalRecordUpdated`` event per record). With ``--anchor``
+the records are instead committed as Merkle roots (one storage write and one
+``MedicalRecordAnchored`` event per record for each batch of
+``RECORD_BATCH_SIZE``), with the proofs kept in ``RECORD_BATCH_DB``.
+
+    DOCTOR_PRIVATE_KEY=0x... python bulk_records.py results.csv
+    DOCTOR_PRIVATE_KEY=0x... python bulk_records.py results.json --max-gas 3000000 --workers 8
+    DOCTOR_PRIVATE_KEY=0x... RECORD_BATCH_DB=record_batches.db python bulk_records.py results.csv --anchor
+
+The manifest is a CSV with ``patient_address`` and ``file`` columns, or a
+JSON list of objects with the same keys. Relative paths are resolved against
+the manifest's directory.
+"""
+import argparse
+import csv
+import json
+import mimetypes
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv  # type: ignore
+from web3 import Web3  # type: ignore
+from web3.exceptions import ContractLogicError  # type: ignore
+
+from batch_reads import BatchReader
+from blob_store import blob_store_from_env
+from cid_codec import record_arg
+from contract_abi import ABI_PATH, load_abi
+from record_batches import RecordBatcher
+from rpc_endpoints import provider_from_env
+from tx_queue import FINAL_STATES, TransactionQueue
+
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '4'))
+# Share of the block gas limit a single batch may use when no budget is given
+BLOCK_GAS_SHARE = 0.8
+
+
+def read_manifest(path):
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r', newline='') as f:
+        rows = json.load(f) if path.endswith('.json') else list(csv.DictReader(f))
+    return [
+        (Web3.to_checksum_address(row['patient_address'].strip()), os.path.join(base, row['file']))
+        for row in rows
+    ]
+
+
+def _put(blob_store, source, filename, content_type):
+    if isinstance(source, str):
+        with open(source, 'rb') as stream:
+            return blob_store.put(stream, filename, content_type)
+    return blob_store.put(source, filename, content_type)
+
+
+def upload_files(blob_store, files, workers=UPLOAD_WORKERS):
+    """Store ``(path or stream, filename, content_type)`` triples concurrently; returns CIDs in order."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda f: _put(blob_store, *f), files))
+
+
+def unauthorized_patients(contract, doctor, patients):
+    """Patients (from ``patients``) whose access list does not include ``doctor``."""
+    unique = sorted(set(patients))
+    reader = BatchReader(contract.w3, contract)
+    allowed = reader.call_many([('isDoctorAuthorized', patient, doctor) for patient in unique])
+    return {patient for patient, ok in zip(unique, allowed) if not ok}
+
+
+def batch_call(contract, records):
+    return contract.functions.createOrUpdateMedicalRecords(
+        [patient for patient, _ in records], [record_arg(contract, cid) for _, cid in records])
+
+
+def gas_bounded_chunks(contract, sender, records, max_gas=None, margin=1.2, max_items=200):
+    """Split ``(patient, cid)`` pairs into batches whose estimated gas (with margin) fits ``max_gas``.
+
+    Returns ``[(records, gas_limit), ...]``. A batch that would revert raises
+    ``ContractLogicError``; check authorization first.
+    """
+    if max_gas is None:
+        max_gas = int(contract.w3.eth.get_block('latest')['gasLimit'] * BLOCK_GAS_SHARE)
+    chunks = []
+    start, size = 0, max_items
+    while start < len(records):
+        size = min(size, len(records) - start)
+        chunk = records[start:start + size]
+        try:
+            gas = int(batch_call(contract, chunk).estimate_gas({'from': sender}) * margin)
+        except ContractLogicError:
+            raise
+        except Exception:
+            # e.g. "exceeds block gas limit" for an oversized first guess
+            if size == 1:
+                raise
+            size //= 2
+            continue
+        if gas > max_gas and size > 1:
+            size = max(1, min(size - 1, size * max_gas // gas))
+            continue
+        chunks.append((chunk, gas))
+        start += size
+    return chunks
+
+
+def submit_chunks(tx_queue, contract, sender, private_key, chunks):
+    """Queue one transaction per chunk; returns the job ids."""
+    return [
+        tx_queue.submit(batch_call(contract, chunk), {'from': sender, 'gas': gas}, private_key,
+                        f"Bulk record update ({len(chunk)} records)")
+        for chunk, gas in chunks
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest", help="CSV or JSON manifest of patient_address/file pairs")
+    parser.add_argument("--max-gas", type=int, help="gas budget per transaction (default: 80%% of the block limit)")
+    parser.add_argument("--workers", type=int, default=UPLOAD_WORKERS, help="concurrent file uploads")
+    parser.add_argument("--anchor", action="store_true",
+                        help="anchor the records as Merkle roots instead of storing each one on chain")
+    args = parser.parse_args()
+
+    load_dotenv()
+    private_key = os.getenv('DOCTOR_PRIVATE_KEY')
+    if not private_key:
+        raise SystemExit("DOCTOR_PRIVATE_KEY is not set")
+    w3 = Web3(provider_from_env())
+    contract = w3.eth.contract(address=Web3.to_checksum_address(os.getenv('CONTRACT_ADDRESS')),
+                               abi=load_abi(os.getenv('CONTRACT_ABI_PATH', ABI_PATH)))
+    doctor = w3.eth.account.from_key(private_key).address
+
+    items = read_manifest(args.manifest)
+    denied = unauthorized_patients(contract, doctor, [patient for patient, _ in items])
+    for patient in sorted(denied):
+        print(f"⚠️ Skipping records for {patient}: not authorized")
+    items = [(patient, path) for patient, path in items if patient not in denied]
+    if not items:
+        return
+
+    blob_store = blob_store_from_env()
+    started = time.time()
+    cids = upload_files(blob_store, [(path, os.path.basename(path), mimetypes.guess_type(path)[0])
+                                     for _, path in items], args.workers)
+    print(f"📂 Stored {len(cids)} files in {time.time() - started:.1f}s")
+
+    records = [(patient, cid) for (patient, _), cid in zip(items, cids)]
+    if args.anchor:
+        anchor_records(w3, contract, doctor, private_key, records)
+    else:
+        commit_records(w3, contract, doctor, private_key, records, args.max_gas)
+
+    replicator = getattr(blob_store, 'replicator', None)
+    if replicator:
+        replicator.join()
+
+
+def commit_records(w3, contract, doctor, private_key, records, max_gas):
+    chunks = gas_bounded_chunks(contract, doctor, records, max_gas)
+    tx_queue = TransactionQueue(w3, workers=min(len(chunks), 4))
+    tx_queue.start()
+    job_ids = submit_chunks(tx_queue, contract, doctor, private_key, chunks)
+    print(f"⏳ Submitted {len(records)} records in {len(job_ids)} transactions")
+
+    while True:
+        statuses = [tx_queue.status(job_id) for job_id in job_ids]
+        if all(status['status'] in FINAL_STATES for status in statuses):
+            break
+        time.sleep(1)
+    for (chunk, gas), status in zip(chunks, statuses):
+        mark = '✅' if status['status'] == 'mined' else '❌'
+        print(f"{mark} {len(chunk)} records, gas limit {gas}: {status['status']} {status['tx_hash'] or status['error']}")
+
+
+def anchor_records(w3, contract, doctor, private_key, records):
+    tx_queue = TransactionQueue(w3, workers=1)
+    tx_queue.start()
+    batcher = RecordBatcher(w3, contract, tx_queue, os.getenv('RECORD_BATCH_DB') or 'record_batches.db',
+                            max_batch=int(os.getenv('RECORD_BATCH_SIZE', '256')))
+    roots = [root for root, _ in batcher.add(doctor, private_key, records)]
+    print(f"⏳ Submitted {len(records)} records in {len(roots)} Merkle batches")
+
+    while True:
+        batcher.refresh(roots)
+        if all(batcher.batch(root)['status'] != 'submitted' for root in roots):
+            break
+        time.sleep(1)
+    for root in roots:
+        batch = batcher.batch(root)
+        if batch['status'] == 'failed':
+            print(f"❌ {batch['count']} records, root {root}: not anchored")
+        else:
+            print(f"✅ {batch['count']} records, root {root}: {batch['tx_hash'] or 'already anchored'}")
+
+if __name__ == "__main__":
+    main()
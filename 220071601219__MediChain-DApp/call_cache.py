@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import OrderedDict
+
+from web3 import Web3  # type: ignore
+
+MISS = object()
+
+
+class CallCache:
+    """Bounded LRU cache for contract view calls with log-driven invalidation.
+
+    Each entry is keyed by (function, args) and is valid from the block it was
+    read at until a contract log touches it. At most every ``refresh_interval``
+    seconds the cache fetches the contract's logs for the new blocks, drops
+    entries whose arguments mention an address indexed in those logs (decoded
+    with the event ABI; other indexed arguments are ignored), and drops every
+    entry without an address argument (global lookups such as
+    ``getAllDoctors`` or ``lookupEmail``). Everything else carries over
+    to the new block without another ``eth_call``.
+
+    The hashes of the last ``reorg_depth`` blocks seen are kept: when one no
+    longer matches the chain, entries read after the common ancestor are
+    dropped and the logs from there on are scanned again.
+    """
+
+    def __init__(self, w3, contract, maxsize=1024, refresh_interval=1.0, reorg_depth=64):
+        self.w3 = w3
+        self.contract = contract
+        self.maxsize = maxsize
+        self.refresh_interval = refresh_interval
+        self.reorg_depth = reorg_depth
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.reorgs = 0
+
+        # topic0 -> topic positions of the event's indexed address arguments
+        self._address_topics = {}
+        for item in contract.abi:
+            if item.get('type') == 'event' and not item.get('anonymous'):
+                signature = f"{item['name']}({','.join(i['type'] for i in item['inputs'])})"
+                indexed = [i for i in item['inputs'] if i.get('indexed')]
+                self._address_topics[bytes(Web3.keccak(text=signature))] = [
+                    position for position, i in enumerate(indexed, 1) if i['type'] == 'address']
+
+        self._entries = OrderedDict()  # key -> (value, block read at)
+        self._lock = threading.Lock()
+        self._block = None
+        self._hashes = OrderedDict()  # block number -> hash, for the last reorg_depth blocks seen
+        # Bumped on every rollback, so a read that started before one is not cached
+        self._epoch = 0
+        self._refreshed_at = 0.0
+
+    # ---------------------- Invalidation ---------------------- #
+    def refresh(self):
+        """Advance to the node head, invalidating entries touched by new logs (or orphaned by a reorg)."""
+        head = self.w3.eth.get_block('latest')
+        number, head_hash = head['number'], bytes(head['hash'])
+        with self._lock:
+            block = self._block
+        if block is not None and self._hashes.get(block) != (
+                head_hash if block == number else self._chain_hash(block)):
+            self._rollback(self._common_ancestor())
+        with self._lock:
+            if self._block is None:
+                # First refresh, or a reorg deeper than reorg_depth: start over from the head
+                self._block = number
+                self._remember(number, head_hash)
+            start = self._block + 1
+        if number >= start:
+            logs = self.w3.eth.get_logs({
+                'address': self.contract.address,
+                'fromBlock': start,
+                'toBlock': number,
+            })
+            with self._lock:
+                self._invalidate(logs)
+                self._block = number
+                self._remember(number, head_hash)
+        self._refreshed_at = time.time()
+
+    def _chain_hash(self, number):
+        block = self.w3.eth.get_block(number)
+        return bytes(block['hash']) if block else None
+
+    def _remember(self, number, block_hash):
+        self._hashes[number] = block_hash
+        while len(self._hashes) > self.reorg_depth:
+            self._hashes.popitem(last=False)
+
+    def _common_ancestor(self):
+        """Newest remembered block still on the chain, or None past ``reorg_depth``."""
+        for number in reversed(list(self._hashes)):
+            if self._chain_hash(number) == self._hashes[number]:
+                return number
+        return None
+
+    def _rollback(self, ancestor):
+        with self._lock:
+            self._epoch += 1
+            self.reorgs += 1
+            if ancestor is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._hashes.clear()
+                self._block = None
+                return
+            for key, (_, block) in list(self._entries.items()):
+                if block > ancestor:
+                    del self._entries[key]
+                    self.invalidations += 1
+            for number in [n for n in self._hashes if n > ancestor]:
+                del self._hashes[number]
+            self._block = ancestor
+
+    def _invalidate(self, logs):
+        if not logs:
+            return
+        touched = set()
+        everything = False
+        for log in logs:
+            positions = self._address_topics.get(bytes(log['topics'][0])) if log['topics'] else None
+            if positions is None:
+                # Not an event of this ABI: its arguments can't be told apart
+                everything = True
+                break
+            for position in positions:
+                touched.add(Web3.to_checksum_address(bytes(log['topics'][position])[-20:]))
+        for key in list(self._entries):
+            addresses = {arg for arg in key[1] if isinstance(arg, str) and Web3.is_address(arg)}
+            if everything or not addresses or addresses & touched:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def _maybe_refresh(self):
+        if self._block is None or time.time() - self._refreshed_at >= self.refresh_interval:
+            self.refresh()
+
+    # ---------------------- Lookups ---------------------- #
+    @staticmethod
+    def _key(fn_name, args):
+        return fn_name, tuple(Web3.to_checksum_address(a) if isinstance(a, str) and Web3.is_address(a) else a
+                              for a in args)
+
+    def lookup(self, fn_name, *args):
+        """Cached value for the call, or ``MISS``. Counts towards hit/miss stats."""
+        self._maybe_refresh()
+        key = self._key(fn_name, args)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return MISS
+
+    def store(self, fn_name, args, value, block, epoch=None):
+        """Cache a value read at ``block``.
+
+        Reads older than the cache's block are dropped, and so are reads
+        started before a rollback (``epoch`` no longer current).
+        """
+        with self._lock:
+            if block is None or (self._block is not None and block < self._block):
+                return
+            if epoch is not None and epoch != self._epoch:
+                return
+            key = self._key(fn_name, args)
+            self._entries[key] = (value, block)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def call(self, fn_name, *args):
+        """``contract.functions.<fn_name>(*args).call()`` served from the cache when possible."""
+        value = self.lookup(fn_name, *args)
+        if value is not MISS:
+            return value
+        with self._lock:
+            block, epoch = self._block, self._epoch
+        value = getattr(self.contract.functions, fn_name)(*args).call(block_identifier=block)
+        self.store(fn_name, args, value, block, epoch)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'reorgs': self.reorgs,
+                'size': len(self._entries),
+                'block': self._block,
+            }
@@ -0,0 +1,113 @@
+"""IPFS CIDs <-> the ``bytes32`` digests MediChain stores for records.
+
+The contract keeps only the 32-byte sha2-256 digest of a record's CID (one
+storage slot instead of a dynamic string), and a digest is always read back
+as the ``Qm...`` CIDv0 the blob store and Pinata produce. Writes therefore
+accept CIDv0 only: a CIDv1 (``bafy...``) would come back as a different
+string, so it is rejected rather than silently rewritten. Conversion happens
+at the contract boundary: writes go through ``record_arg`` and everything
+read back through ``record_cid``, which also passes through the plain
+strings of deployments made before the switch.
+"""
+import base64
+
+from blob_store import _B58_ALPHABET, b58encode
+
+DAG_PB = 0x70
+SHA2_256 = 0x12
+EMPTY_DIGEST = bytes(32)
+
+
+def b58decode(text):
+    n = 0
+    for char in text:
+        index = _B58_ALPHABET.find(char)
+        if index < 0:
+            raise ValueError(f"Invalid base58 character {char!r}")
+        n = n * 58 + index
+    body = n.to_bytes((n.bit_length() + 7) // 8, 'big')
+    return b'\0' * (len(text) - len(text.lstrip('1'))) + body
+
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while offset < len(data):
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+    raise ValueError("Truncated varint")
+
+
+def _multibase_decode(text):
+    prefix, body = text[0], text[1:]
+    if prefix in 'bB':
+        body = body.upper()
+        return base64.b32decode(body + '=' * (-len(body) % 8))
+    if prefix == 'z':
+        return b58decode(body)
+    if prefix in 'fF':
+        return bytes.fromhex(body)
+    raise ValueError(f"Unsupported multibase prefix {prefix!r}")
+
+
+def _multihash_digest(data):
+    code, offset = _read_varint(data, 0)
+    length, offset = _read_varint(data, offset)
+    if code != SHA2_256 or length != 32 or len(data) - offset != 32:
+        raise ValueError("Only sha2-256 CIDs fit a bytes32 digest")
+    return data[offset:]
+
+
+def cid_to_digest(cid, allow_v1=False):
+    """32-byte digest of a CIDv0; raises ``ValueError`` for anything else.
+
+    With ``allow_v1`` a dag-pb CIDv1 is accepted too (migration only): its
+    digest reads back as the CIDv0 of the same content.
+    """
+    cid = cid.strip()
+    if cid.startswith('Qm'):
+        return _multihash_digest(b58decode(cid))
+    if not cid:
+        raise ValueError("Empty CID")
+    if not allow_v1:
+        raise ValueError(f"Only CIDv0 (Qm...) records can be stored, got {cid!r}")
+    data = _multibase_decode(cid)
+    version, offset = _read_varint(data, 0)
+    codec, offset = _read_varint(data, offset)
+    if version != 1:
+        raise ValueError(f"Unsupported CID version {version}")
+    if codec != DAG_PB:
+        raise ValueError(f"Only dag-pb CIDs fit a bytes32 digest (codec 0x{codec:x})")
+    return _multihash_digest(data[offset:])
+
+
+def digest_to_cid(digest):
+    """CIDv0 (``Qm...``) of a stored digest."""
+    digest = bytes(digest)
+    if len(digest) != 32:
+        raise ValueError("A record digest is 32 bytes")
+    return b58encode(bytes([SHA2_256, 32]) + digest)
+
+
+def record_cid(value):
+    """CID of a record as read from the contract (digest, or string on older deployments); '' when unset."""
+    if isinstance(value, str):
+        return value
+    return '' if bytes(value) == EMPTY_DIGEST else digest_to_cid(value)
+
+
+def stores_digests(contract):
+    """True for deployments keeping records as ``bytes32`` digests."""
+    item = next((i for i in contract.abi
+                 if i.get('type') == 'function' and i.get('name') == 'createOrUpdateMedicalRecord'), None)
+    return item is not None and item['inputs'][1]['type'] == 'bytes32'
+
+
+def record_arg(contract, cid):
+    """Record argument for a contract write: the digest (empty CID: zero) or, on older deployments, the CID."""
+    if not stores_digests(contract):
+        return cid
+    return cid_to_digest(cid) if cid else EMPTY_DIGEST
@@ -0,0 +1,25 @@
+"""Loading the MediChain ABI without pulling in the compiler.
+
+deploy_contract.py writes contract_abi.json; the app and the command-line
+tools only read it, so they import this module rather than deploy_contract
+(which needs py-solc-x).
+"""
+import json
+import os
+
+ABI_PATH = "contract_abi.json"
+
+
+def load_abi(path=ABI_PATH):
+    """The contract ABI from a compact ABI file or from a full solc standard-JSON output."""
+    if not os.path.exists(path):
+        raise SystemExit(f"❌ {path} not found. Run `python deploy_contract.py --compile-only` to generate it.")
+    with open(path, "r") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return data
+    # Full compiler output, e.g. an ABI kept from an earlier deployment for migrate_records.py
+    for contracts in data.get("contracts", {}).values():
+        if "MediChain" in contracts:
+            return contracts["MediChain"]["abi"]
+    raise SystemExit(f"❌ {path} contains neither an ABI nor a compiled MediChain contract.")
@@ -1,86 +1,166 @@
+"""Compile and deploy MediChain.
+
+    python deploy_contract.py                 # compile (if the source changed) and deploy
+    python deploy_contract.py --migrate       # deploy with the deployer as migrator (migrate_records.py)
+    python deploy_contract.py --compile-only  # just refresh contract_abi.json / contract_bytecode.bin
+
+Compiler output is cached under SOLC_CACHE_DIR keyed by the SHA-256 of the
+source, compiler version and settings, so an unchanged MediChain.sol skips
+both the solc installation check and the compilation.
+"""
+import argparse
+import hashlib
 import json
 import os
 from web3 import Web3  # type: ignore
-from solcx import compile_standard, install_solc, set_solc_version  # type: ignore
+from solcx import compile_standard, get_installed_solc_versions, install_solc  # type: ignore
 from dotenv import load_dotenv
 
+from contract_abi import ABI_PATH
+from fees import FeeOracle
+from rpc_endpoints import provider_from_env
+
 # Load environment variables from .env
 load_dotenv()
 
-# Connect to Ganache
-GANACHE_URL = os.getenv("WEB3_PROVIDER_URL", "http://127.0.0.1:7545")
-w3 = Web3(Web3.HTTPProvider(GANACHE_URL))
+SOLC_VERSION = "0.8.0"
+SOURCE_PATH = "MediChain.sol"
+CACHE_DIR = os.getenv("SOLC_CACHE_DIR", ".solc_cache")
+BYTECODE_PATH = "contract_bytecode.bin"
+OPTIMIZER_RUNS = int(os.getenv("SOLC_OPTIMIZER_RUNS", "200"))
+GAS_MARGIN = float(os.getenv("GAS_MARGIN", "1.2"))
+# 0 deploys without on-chain audit storage; history is then read from AuditLogged logs
+STORE_AUDIT_HISTORY = os.getenv("STORE_AUDIT_HISTORY", "1") == "1"
+# Ganache's first account, used when PRIVATE_KEY is not set
+DEFAULT_PRIVATE_KEY = "0x54cae190a79d8c3493a45fc5bf3ca6577aeeb43979c2af85a16466f069d330ec"
 
-# ✅ Handle both Web3 v6 and v7
-if hasattr(w3, "is_connected"):
-    connected = w3.is_connected()
-else:
-    connected = w3.isConnected()
 
-if not connected:
-    raise Exception("❌ Failed to connect to Ganache! Is it running?")
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
 
-# Install and set Solidity version
-install_solc("0.8.0")
-set_solc_version("0.8.0")
 
-# Read contract
-with open("MediChain.sol", "r") as file:
-    contract_source_code = file.read()
+def compile_contract(source_path=SOURCE_PATH):
+    """ABI and bytecode of MediChain, from the compile cache when the source is unchanged."""
+    with open(source_path, "r") as file:
+        contract_source_code = file.read()
 
-compiled_sol = compile_standard(
-    {
+    standard_input = {
         "language": "Solidity",
         "sources": {"MediChain.sol": {"content": contract_source_code}},
         "settings": {
-            "outputSelection": {
-                "*": {"*": ["abi", "evm.bytecode", "evm.sourceMap"]}
-            }
+            # Unoptimized, the runtime code exceeds the 24 KB limit nodes enforce (EIP-170)
+            "optimizer": {"enabled": True, "runs": OPTIMIZER_RUNS},
+            "outputSelection": {"*": {"*": ["abi", "evm.bytecode.object"]}},
         },
     }
-)
-
-# Extract ABI and Bytecode
-contract_abi = compiled_sol["contracts"]["MediChain.sol"]["MediChain"]["abi"]
-contract_bytecode = compiled_sol["contracts"]["MediChain.sol"]["MediChain"]["evm"]["bytecode"]["object"]
-
-# Get deployer account from private key
-private_key = os.getenv("PRIVATE_KEY") or "0x54cae190a79d8c3493a45fc5bf3ca6577aeeb43979c2af85a16466f069d330ec"
-account = w3.eth.account.from_key(private_key)
-deployer_address = account.address
-
-# Check balance
-balance = w3.eth.get_balance(deployer_address)
-print(f"Deployer ({deployer_address}) balance: {w3.from_wei(balance, 'ether')} ETH")
-
-if balance == 0:
-    raise Exception("❌ Deployer account has 0 ETH in Ganache. Fund it first.")
-
-# Create contract instance
-MediChain = w3.eth.contract(abi=contract_abi, bytecode=contract_bytecode)
-
-# Build deployment transaction
-transaction = MediChain.constructor().build_transaction(
-    {
-        "from": deployer_address,
-        "nonce": w3.eth.get_transaction_count(deployer_address),
-        "gas": 6721975,
-        "gasPrice": w3.to_wei("20", "gwei"),
-    }
-)
+    key = hashlib.sha256(json.dumps([SOLC_VERSION, standard_input], sort_keys=True).encode()).hexdigest()
+    cache_path = os.path.join(CACHE_DIR, f"{key}.json")
+    if os.path.exists(cache_path):
+        with open(cache_path, "r") as f:
+            cached = json.load(f)
+        return cached["abi"], cached["bytecode"]
+
+    if SOLC_VERSION not in {str(v) for v in get_installed_solc_versions()}:
+        install_solc(SOLC_VERSION)
+    compiled_sol = compile_standard(standard_input, solc_version=SOLC_VERSION)
+    artifact = compiled_sol["contracts"]["MediChain.sol"]["MediChain"]
+    abi, bytecode = artifact["abi"], artifact["evm"]["bytecode"]["object"]
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    _write_atomic(cache_path, json.dumps({"abi": abi, "bytecode": bytecode}, separators=(",", ":")))
+    return abi, bytecode
+
+
+def write_artifacts(abi, bytecode):
+    """Compact ABI for app.py and the bytecode as a separate hex file."""
+    _write_atomic(ABI_PATH, json.dumps(abi, separators=(",", ":")))
+    _write_atomic(BYTECODE_PATH, bytecode)
+
+
+def constructor_args(contract_abi, store_audit_history=STORE_AUDIT_HISTORY, migrating=False):
+    """Constructor arguments for this ABI (older builds take fewer flags, the oldest none)."""
+    constructor = next((item for item in contract_abi if item.get("type") == "constructor"), None)
+    return [store_audit_history, migrating][:len(constructor.get("inputs", [])) if constructor else 0]
+
+
+def connect():
+    # Connect to Ganache (or any of the nodes in WEB3_PROVIDER_URLS)
+    w3 = Web3(provider_from_env())
+
+    # ✅ Handle both Web3 v6 and v7
+    if hasattr(w3, "is_connected"):
+        connected = w3.is_connected()
+    else:
+        connected = w3.isConnected()
+
+    if not connected:
+        raise Exception("❌ Failed to connect to Ganache! Is it running?")
+    return w3
+
+
+def deployer_key():
+    """Private key of the deploying account (also the migrator of a contract deployed with ``--migrate``)."""
+    return os.getenv("PRIVATE_KEY") or DEFAULT_PRIVATE_KEY
+
+
+def deploy(w3, contract_abi, contract_bytecode, migrating=False):
+    # Get deployer account from private key
+    private_key = deployer_key()
+    account = w3.eth.account.from_key(private_key)
+    deployer_address = account.address
+
+    # Check balance
+    balance = w3.eth.get_balance(deployer_address)
+    print(f"Deployer ({deployer_address}) balance: {w3.from_wei(balance, 'ether')} ETH")
+
+    if balance == 0:
+        raise Exception("❌ Deployer account has 0 ETH in Ganache. Fund it first.")
+
+    # Create contract instance
+    MediChain = w3.eth.contract(abi=contract_abi, bytecode=contract_bytecode)
+
+    # Build deployment transaction: estimated gas plus a margin, fees from the latest block
+    constructor = MediChain.constructor(*constructor_args(contract_abi, migrating=migrating))
+    gas = int(constructor.estimate_gas({"from": deployer_address}) * GAS_MARGIN)
+    transaction = constructor.build_transaction(
+        {
+            "from": deployer_address,
+            "nonce": w3.eth.get_transaction_count(deployer_address),
+            "gas": gas,
+            **FeeOracle(w3).fees(),
+        }
+    )
+
+    # Sign with private key
+    signed_tx = w3.eth.account.sign_transaction(transaction, private_key)
+
+    # Send tx
+    tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+    print(f"⏳ Deploying contract... tx hash: {tx_hash.hex()}")
+
+    # Wait for confirmation
+    tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    print(f"✅ Contract deployed at: {tx_receipt.contractAddress}")
+    return tx_receipt.contractAddress
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compile-only", action="store_true", help="write the artifacts without deploying")
+    parser.add_argument("--migrate", action="store_true",
+                        help="let the deployer import an earlier deployment (migrate_records.py)")
+    args = parser.parse_args()
 
-# Sign with private key
-signed_tx = w3.eth.account.sign_transaction(transaction, private_key)
+    contract_abi, contract_bytecode = compile_contract()
+    write_artifacts(contract_abi, contract_bytecode)
+    print(f"📂 ABI saved to {ABI_PATH}, bytecode to {BYTECODE_PATH}")
 
-# Send tx
-tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-print(f"⏳ Deploying contract... tx hash: {tx_hash.hex()}")
+    if not args.compile_only:
+        deploy(connect(), contract_abi, contract_bytecode, migrating=args.migrate)
 
-# Wait for confirmation
-tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-print(f"✅ Contract deployed at: {tx_receipt.contractAddress}")
 
-# Save ABI + Bytecode
-with open("compiled_contract.json", "w") as f:
-    json.dump(compiled_sol, f, indent=4)
-print("📂 Compiled contract saved to compiled_contract.json")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+from web3 import Web3  # type: ignore
+
+# Whitespace MediChain.emailKey trims from both ends
+_WHITESPACE = b' \t\n\r'
+
+
+def normalize_email(email):
+    """UTF-8 bytes of ``email`` as the contract normalizes it.
+
+    Surrounding whitespace is trimmed and only ASCII letters are lower-cased
+    (``bytes.lower``), exactly like ``emailKey`` on chain.
+    """
+    return email.encode().strip(_WHITESPACE).lower()
+
+
+def email_key(email):
+    """``emailRegistry`` key of an email, computed locally (same as ``MediChain.emailKey``)."""
+    return bytes(Web3.keccak(normalize_email(email)))
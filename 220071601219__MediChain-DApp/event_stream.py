@@ -0,0 +1,309 @@
+"""Live contract activity for open dashboards (server-sent events).
+
+One ``EventBroadcaster`` thread follows the contract's record and access
+events with ``eth_getLogs`` (filtered on the indexed patient/doctor topics
+of whoever is listening) and fans every log out to the matching
+subscriptions, so any number of connected browsers cost one pair of log
+queries per poll instead of a full dashboard reload each.
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+
+from web3 import Web3  # type: ignore
+
+from cid_codec import record_cid
+from indexer import _event_topic
+
+logger = logging.getLogger(__name__)
+
+STREAM_EVENTS = (
+    'MedicalRecordUpdated',
+    'MedicalRecordDeleted',
+    'AccessGranted',
+    'AccessRevoked',
+    'MedicalRecordAnchored',
+)
+ACCESS_EVENTS = ('AccessGranted', 'AccessRevoked')
+
+# Past this many addresses the topic filter is dropped and logs are matched locally
+MAX_TOPIC_ADDRESSES = 500
+
+
+def _topic(address):
+    return '0x' + address[2:].lower().rjust(64, '0')
+
+
+def format_sse(event):
+    """``text/event-stream`` frame for an event dict (``id`` lets browsers resume)."""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+
+def parse_event_id(value):
+    """``(block, log index)`` from a ``Last-Event-ID``; ``None`` when missing or malformed."""
+    try:
+        block, log_index = value.split(':')
+        return int(block), int(log_index)
+    except (AttributeError, ValueError):
+        return None
+
+
+class Subscription:
+    """Events for one browser: a patient's own, or a doctor's and their patients'.
+
+    Delivered from the broadcaster thread into a bounded queue; a client
+    too slow to keep up is told to reload (``overflowed``) instead of
+    holding events back for everyone.
+    """
+
+    def __init__(self, patients=(), doctor=None, max_pending=100):
+        self.patients = set(patients)
+        self.doctor = doctor
+        self.overflowed = False
+        self._queue = queue.Queue(max_pending)
+
+    def matches(self, event):
+        if event['event'] in ACCESS_EVENTS and event['doctor'] == self.doctor:
+            return True
+        return event['patient'] in self.patients
+
+    def deliver(self, event):
+        # A doctor follows the records of patients as they grant or revoke access
+        if self.doctor is not None and event.get('doctor') == self.doctor:
+            if event['event'] == 'AccessGranted':
+                self.patients.add(event['patient'])
+            else:
+                self.patients.discard(event['patient'])
+        self._put(event)
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Next event, or ``None`` after ``timeout`` seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription(Subscription):
+    """``Subscription`` read from an asyncio event loop without holding a thread."""
+
+    def __init__(self, patients=(), doctor=None, max_pending=100, loop=None):
+        super().__init__(patients, doctor, max_pending)
+        self._loop = loop or asyncio.get_running_loop()
+        self._async_queue = asyncio.Queue(max_pending)
+
+    def _put(self, event):
+        self._loop.call_soon_threadsafe(self._put_nowait, event)
+
+    def _put_nowait(self, event):
+        try:
+            self._async_queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self._async_queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroadcaster:
+    """Polls the contract's record/access logs once for every connected client.
+
+    Started lazily by the first subscription. A reconnecting browser
+    (``Last-Event-ID``) is sent what it missed with one catch-up query, up
+    to ``max_catch_up`` blocks back; past that it is told to reload.
+    """
+
+    def __init__(self, w3, contract, poll_interval=1.0, max_catch_up=5000):
+        self.w3 = w3
+        self.contract = contract
+        self.poll_interval = poll_interval
+        self.max_catch_up = max_catch_up
+        # Older deployments lack some of the events (MedicalRecordAnchored)
+        logged = {item['name'] for item in contract.abi if item.get('type') == 'event'}
+        self._names = {bytes(_event_topic(contract, name)): name for name in STREAM_EVENTS if name in logged}
+        self._topics = ['0x' + topic.hex() for topic in self._names]
+        self._access_topics = ['0x' + topic.hex() for topic, name in self._names.items() if name in ACCESS_EVENTS]
+        self._subscriptions = set()
+        self._last_block = None
+        # Held for a whole poll so a subscription joins between two of them
+        self._poll_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------------------- Subscriptions ---------------------- #
+    def subscribe(self, subscription, after=None):
+        """Register ``subscription``; with ``after`` (an event id) first send what it missed.
+
+        Returns False when ``after`` is more than ``max_catch_up`` blocks old.
+        """
+        with self._poll_lock:
+            if self._last_block is None:
+                self._last_block = self.w3.eth.block_number
+            if after is not None and self._last_block > after[0]:
+                if self._last_block - after[0] > self.max_catch_up:
+                    return False
+                logs = self._fetch(after[0], self._last_block, subscription.patients,
+                                   {subscription.doctor} - {None})
+                for event in self._events(logs):
+                    if (event['blockNumber'], event['logIndex']) > after and subscription.matches(event):
+                        subscription.deliver(event)
+            with self._lock:
+                self._subscriptions.add(subscription)
+        self.start()
+        return True
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscriptions),
+                'block': self._last_block or 0,
+            }
+
+    # ---------------------- Background loop ---------------------- #
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='medichain-events', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"Event stream poll failed: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def poll_once(self):
+        """Fetch logs of the blocks mined since the last poll and dispatch them."""
+        with self._poll_lock:
+            head = self.w3.eth.block_number
+            if self._last_block is None or head <= self._last_block:
+                self._last_block = max(head, self._last_block or 0)
+                return
+            with self._lock:
+                subscriptions = list(self._subscriptions)
+                patients = set().union(*(s.patients for s in subscriptions))
+                doctors = {s.doctor for s in subscriptions if s.doctor is not None}
+            events = self._events(self._fetch(self._last_block + 1, head, patients, doctors))
+            with self._lock:
+                for event in events:
+                    for subscription in self._subscriptions:
+                        if subscription.matches(event):
+                            subscription.deliver(event)
+            self._last_block = head
+
+    def _fetch(self, from_block, to_block, patients, doctors):
+        """Stream logs of ``patients`` and access changes of ``doctors`` in a block range."""
+        if len(patients) + len(doctors) > MAX_TOPIC_ADDRESSES:
+            return self._get_logs(from_block, to_block, [self._topics])
+        logs = []
+        # Every stream event has the patient as its first indexed argument,
+        # and the access events the doctor as their second
+        if patients:
+            logs += self._get_logs(from_block, to_block, [self._topics, sorted(_topic(p) for p in patients)])
+        if doctors:
+            logs += self._get_logs(from_block, to_block, [self._access_topics, None,
+                                                          sorted(_topic(d) for d in doctors)])
+        return logs
+
+    def _get_logs(self, from_block, to_block, topics):
+        return self.w3.eth.get_logs({
+            'address': self.contract.address,
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'topics': topics,
+        })
+
+    def _events(self, logs):
+        """Decoded events in chain order, without the duplicates of overlapping queries."""
+        events = {}
+        for log in logs:
+            events.setdefault((log['blockNumber'], log['logIndex']), log)
+        return [self._event(events[key]) for key in sorted(events)]
+
+    def _event(self, log):
+        name = self._names[bytes(log['topics'][0])]
+        args = getattr(self.contract.events, name)().process_log(log)['args']
+        event = {
+            'id': f"{log['blockNumber']}:{log['logIndex']}",
+            'event': name,
+            'blockNumber': log['blockNumber'],
+            'logIndex': log['logIndex'],
+            'transactionHash': Web3.to_hex(log['transactionHash']),
+            'patient': args['patient'],
+            'doctor': args.get('doctor'),
+        }
+        if name == 'MedicalRecordUpdated':
+            event.update(recordId=args.get('recordId'), ipfsHash=record_cid(args['ipfsHash']),
+                         timestamp=args['timestamp'])
+        elif name == 'MedicalRecordDeleted':
+            # Older deployments log the (shifting) index of the deleted record instead of its id
+            event.update(recordId=args.get('recordId', args.get('index')), timestamp=args['timestamp'])
+        elif name == 'MedicalRecordAnchored':
+            event.update(ipfsHash=record_cid(args['ipfsHash']), root=Web3.to_hex(args['root']),
+                         position=args['position'], timestamp=args['timestamp'])
+        return event
+
+
+def stream_events(broadcaster, subscription, last_event_id=None, heartbeat=15):
+    """SSE frames for a subscription until the client goes away.
+
+    A comment line every ``heartbeat`` seconds keeps proxies from closing
+    the idle connection. A ``reload`` event asks the page to reload when
+    events were lost (the client fell behind or was away too long).
+    """
+    try:
+        if not broadcaster.subscribe(subscription, after=parse_event_id(last_event_id)):
+            yield 'event: reload\ndata: {}\n\n'
+            return
+        yield 'retry: 5000\n\n'
+        while True:
+            event = subscription.get(heartbeat)
+            if subscription.overflowed:
+                yield 'event: reload\ndata: {}\n\n'
+                return
+            yield format_sse(event) if event is not None else ': keep-alive\n\n'
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+async def stream_events_async(broadcaster, subscription, last_event_id=None, heartbeat=15):
+    """``stream_events`` for an ``AsyncSubscription``."""
+    try:
+        # Subscribing waits for a running poll and may query the node (catch-up)
+        if not await asyncio.to_thread(broadcaster.subscribe, subscription, parse_event_id(last_event_id)):
+            yield 'event: reload\ndata: {}\n\n'
+            return
+        yield 'retry: 5000\n\n'
+        while True:
+            event = await subscription.get(heartbeat)
+            if subscription.overflowed:
+                yield 'event: reload\ndata: {}\n\n'
+                return
+            yield format_sse(event) if event is not None else ': keep-alive\n\n'
+    finally:
+        broadcaster.unsubscribe(subscription)
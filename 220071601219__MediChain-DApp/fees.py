@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+
+from web3 import Web3  # type: ignore
+
+
+class FeeOracle:
+    """Fee fields for new transactions, recomputed at most once per block.
+
+    Uses EIP-1559 (``maxFeePerGas``/``maxPriorityFeePerGas``) when the latest
+    block has a base fee and a legacy ``gasPrice`` otherwise. Callers within
+    ``max_age`` seconds of the last check share the cached fees without any
+    RPC; after that one ``eth_getBlockByNumber`` tells whether a new block
+    arrived and the fees need recomputing.
+    """
+
+    def __init__(self, w3, base_fee_multiplier=2, priority_fee=None, max_age=1.0):
+        self.w3 = w3
+        self.base_fee_multiplier = base_fee_multiplier
+        self.priority_fee = priority_fee
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._block = None
+        self._fees = None
+        self._checked_at = 0.0
+
+    def fees(self):
+        with self._lock:
+            if self._fees is None or time.time() - self._checked_at >= self.max_age:
+                latest = self.w3.eth.get_block('latest')
+                if latest['number'] != self._block or self._fees is None:
+                    self._fees = self._compute(latest)
+                    self._block = latest['number']
+                self._checked_at = time.time()
+            return dict(self._fees)
+
+    def _compute(self, latest):
+        base_fee = latest.get('baseFeePerGas')
+        if base_fee is None:
+            return {'gasPrice': self.w3.eth.gas_price}
+        priority_fee = self.priority_fee
+        if priority_fee is None:
+            try:
+                priority_fee = self.w3.eth.max_priority_fee
+            except Exception:
+                # Not every node implements eth_maxPriorityFeePerGas
+                priority_fee = Web3.to_wei(1, 'gwei')
+        return {
+            'maxPriorityFeePerGas': priority_fee,
+            'maxFeePerGas': base_fee * self.base_fee_multiplier + priority_fee,
+        }
+
+
+# Arguments that pick a code path although their type is a plain uint, keyed by value:
+# MediChain.register's _designation chooses between a patient and a doctor account
+BRANCH_ARGS = {'register': ('_designation',)}
+
+
+class GasEstimator:
+    """``estimate_gas`` plus a safety margin, cached per function and argument shape.
+
+    Calls whose arguments have the same shape (string lengths in 32-byte
+    words, array lengths, small enum/flag values and the ``branch_args``
+    values) cost about the same, so one estimate serves them all for ``ttl``
+    seconds. A cache hit still runs the call with ``eth_call`` first, so a
+    call that would revert fails here rather than on-chain. State-dependent
+    paths can still cost more than the cached estimate; callers ``forget()``
+    a shape whose transaction ran out of gas so the next send re-estimates.
+    """
+
+    def __init__(self, w3, margin=1.2, ttl=600, maxsize=512, branch_args=None):
+        self.w3 = w3
+        self.margin = margin
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.branch_args = BRANCH_ARGS if branch_args is None else branch_args
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _shape(abi_type, value):
+        if abi_type.endswith(']'):
+            inner = abi_type[:abi_type.rindex('[')]
+            return len(value), tuple(GasEstimator._shape(inner, v) for v in value[:8])
+        if abi_type in ('string', 'bytes'):
+            return (len(value) + 31) // 32
+        if abi_type in ('bool', 'uint8'):
+            return value
+        return None
+
+    def key(self, contract_fn):
+        inputs = contract_fn.abi.get('inputs', [])
+        branch_args = self.branch_args.get(contract_fn.fn_name, ())
+        shape = tuple(arg if i['name'] in branch_args else self._shape(i['type'], arg)
+                      for i, arg in zip(inputs, contract_fn.args))
+        return contract_fn.address, contract_fn.fn_name, shape
+
+    def estimate(self, contract_fn, tx_params):
+        """Gas limit for sending ``contract_fn`` with ``tx_params`` (needs ``from``).
+
+        Raises ``ContractLogicError`` when the call would revert, cached or not.
+        """
+        key = self.key(contract_fn)
+        params = {k: v for k, v in tx_params.items() if k in ('from', 'value')}
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.time() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                cached = entry[0]
+            else:
+                cached = None
+        if cached is not None:
+            # No estimate_gas run to surface a revert: a plain eth_call does that cheaply
+            contract_fn.call(params)
+            return cached
+        gas = int(contract_fn.estimate_gas(params) * self.margin)
+        with self._lock:
+            self._entries[key] = (gas, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return gas
+
+    def forget(self, contract_fn):
+        with self._lock:
+            self._entries.pop(self.key(contract_fn), None)
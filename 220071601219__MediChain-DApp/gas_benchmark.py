@@ -0,0 +1,145 @@
+"""Measure how MediChain write costs grow with a patient's doctor access list.
+
+Deploys the contract on an in-process eth-tester chain (no Ganache needed),
+grants access to an increasing number of doctors and records the gas used by
+the calls that check or edit the access list, always acting on the doctor at
+the end of the list (the worst case for a linear scan).
+
+With ``--deletion`` it instead records the gas of deleting the first, middle
+and last record of histories of increasing length, which shows whether
+deletion cost depends on the record's position or the number of records.
+
+    pip install -r requirements-dev.txt
+    python gas_benchmark.py                      # current MediChain.sol
+    python gas_benchmark.py --source old.sol     # e.g. git show HEAD~1:MediChain.sol > old.sol
+    python gas_benchmark.py --deletion --lengths 1 10 100 500
+"""
+import argparse
+import hashlib
+import json
+
+from eth_account import Account  # type: ignore
+from web3 import EthereumTesterProvider, Web3  # type: ignore
+
+from cid_codec import digest_to_cid, record_arg
+from deploy_contract import compile_contract, constructor_args
+
+DEFAULT_SIZES = [1, 10, 50, 100]
+DEFAULT_LENGTHS = [1, 10, 100, 250]
+
+
+def deploy(w3, abi, bytecode, store_audit_history=True):
+    factory = w3.eth.contract(abi=abi, bytecode=bytecode)
+    tx_hash = factory.constructor(*constructor_args(abi, store_audit_history)).transact({"from": w3.eth.accounts[0]})
+    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    return w3.eth.contract(address=receipt.contractAddress, abi=abi)
+
+
+def new_account(w3):
+    """Create, unlock and fund a fresh account on the tester chain."""
+    account = Account.create()
+    w3.provider.ethereum_tester.add_account(account.key.hex())
+    w3.eth.send_transaction({"from": w3.eth.accounts[0], "to": account.address, "value": w3.to_wei(1, "ether")})
+    return account.address
+
+
+def sample_record(contract, label):
+    """Record argument for a realistic (46-character CIDv0) record, in the deployment's format."""
+    return record_arg(contract, digest_to_cid(hashlib.sha256(label.encode()).digest()))
+
+
+def gas_used(w3, contract_fn, sender):
+    tx_hash = contract_fn.transact({"from": sender})
+    return w3.eth.wait_for_transaction_receipt(tx_hash)["gasUsed"]
+
+
+def measure(abi, bytecode, size):
+    """Gas for access-list operations once a patient has granted ``size`` doctors."""
+    w3 = Web3(EthereumTesterProvider())
+    contract = deploy(w3, abi, bytecode)
+
+    patient = new_account(w3)
+    gas_used(w3, contract.functions.register("Patient", 30, 1, "patient@example.com",
+                                                    sample_record(contract, "initial")), patient)
+
+    doctors = []
+    grant_gas = None
+    for i in range(size):
+        doctor = new_account(w3)
+        gas_used(w3, contract.functions.register(f"Doctor {i}", 0, 2, f"doctor{i}@example.com",
+                                                        record_arg(contract, "")), doctor)
+        grant_gas = gas_used(w3, contract.functions.grantAccessToDoctor(doctor), patient)
+        doctors.append(doctor)
+
+    last = doctors[-1]
+    return {
+        "access_list_size": size,
+        "grantAccessToDoctor": grant_gas,
+        "createOrUpdateMedicalRecord": gas_used(
+            w3, contract.functions.createOrUpdateMedicalRecord(patient, sample_record(contract, "update")), last),
+        "deleteMedicalRecord": gas_used(w3, contract.functions.deleteMedicalRecord(patient, 1), last),
+        "revokeAccessToDoctor": gas_used(w3, contract.functions.revokeAccessToDoctor(last), patient),
+    }
+
+
+def patient_with_records(abi, bytecode, length):
+    """A fresh chain with a patient holding ``length`` records (ids 0 .. length - 1)."""
+    w3 = Web3(EthereumTesterProvider())
+    contract = deploy(w3, abi, bytecode)
+    patient = new_account(w3)
+    doctor = new_account(w3)
+    gas_used(w3, contract.functions.register("Patient", 30, 1, "patient@example.com",
+                                             sample_record(contract, "initial")), patient)
+    gas_used(w3, contract.functions.register("Doctor", 0, 2, "doctor@example.com", record_arg(contract, "")), doctor)
+    gas_used(w3, contract.functions.grantAccessToDoctor(doctor), patient)
+    for r in range(length - 1):
+        gas_used(w3, contract.functions.createOrUpdateMedicalRecord(patient, sample_record(contract, f"record{r}")),
+                 doctor)
+    return w3, contract, patient
+
+
+def measure_deletion(abi, bytecode, length):
+    """Gas to delete the first, middle and last of ``length`` records, each from a fresh history."""
+    result = {"records": length}
+    for position, record_id in (("first", 0), ("middle", length // 2), ("last", length - 1)):
+        w3, contract, patient = patient_with_records(abi, bytecode, length)
+        result[f"delete_{position}"] = gas_used(w3, contract.functions.deleteMedicalRecord(patient, record_id), patient)
+    return result
+
+
+def print_table(results, key, label):
+    columns = [c for c in results[0] if c != key]
+    print(f"{label:>8} " + " ".join(f"{c:>28}" for c in columns))
+    for row in results:
+        print(f"{row[key]:>8} " + " ".join(f"{row[c]:>28}" for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="MediChain.sol", help="Solidity source to benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="access list sizes")
+    parser.add_argument("--deletion", action="store_true",
+                        help="measure record deletion by position and history length instead")
+    parser.add_argument("--lengths", type=int, nargs="+", default=DEFAULT_LENGTHS,
+                        help="records per patient for --deletion")
+    parser.add_argument("--json", action="store_true", help="emit machine-readable JSON")
+    args = parser.parse_args()
+
+    abi, bytecode = compile_contract(args.source)
+    if args.deletion:
+        results = [measure_deletion(abi, bytecode, length) for length in args.lengths]
+    else:
+        results = [measure(abi, bytecode, size) for size in args.sizes]
+
+    if args.json:
+        print(json.dumps({"source": args.source, "results": results}, indent=2))
+        return
+
+    if args.deletion:
+        print_table(results, "records", "records")
+    else:
+        print_table(results, "access_list_size", "doctors")
+
+
+if __name__ == "__main__":
+    main()
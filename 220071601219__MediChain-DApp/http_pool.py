@@ -0,0 +1,15 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def pooled_session(pool_size, hosts=4):
+    """``requests.Session`` keeping up to ``pool_size`` keep-alive connections per host.
+
+    The default adapter only keeps 10 connections per host and silently opens
+    and discards extra ones when more threads than that share the session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
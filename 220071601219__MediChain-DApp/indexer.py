@@ -0,0 +1,665 @@
+import logging
+import sqlite3
+import threading
+
+from web3 import Web3  # type: ignore
+
+from cid_codec import record_cid
+
+logger = logging.getLogger(__name__)
+
+# Events projected into the local read model
+INDEXED_EVENTS = (
+    'PatientRegistered',
+    'DoctorRegistered',
+    'MedicalRecordUpdated',
+    'MedicalRecordDeleted',
+    'AccessGranted',
+    'AccessRevoked',
+    'AuditLogged',
+    'TransactionCreated',
+    'TransactionSettled',
+    'MedicalRecordAnchored',
+)
+
+# Billing events: projected into the transactions table only (no audit entry or timestamp)
+TRANSACTION_EVENTS = ('TransactionCreated', 'TransactionSettled')
+
+# Registrations: projected into the patients / doctors tables from their arguments
+ACCOUNT_EVENTS = ('PatientRegistered', 'DoctorRegistered')
+
+# Events changing access lists, replayed per doctor to rebuild their list order
+ACCESS_EVENTS = ('AccessGranted', 'AccessRevoked')
+
+# Names of MediChain.AuditAction values, as returned by the audit getters
+AUDIT_ACTIONS = ('register', 'create/update record', 'delete record')
+
+# Audit actions implied by other events, for deployments without AuditLogged
+EVENT_ACTIONS = {
+    'PatientRegistered': 'register',
+    'MedicalRecordUpdated': 'create/update record',
+    'MedicalRecordDeleted': 'delete record',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    number INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS logs (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    event TEXT NOT NULL,
+    patient TEXT,
+    doctor TEXT,
+    actor TEXT,
+    action TEXT,
+    ipfs_hash TEXT,
+    record_index INTEGER,
+    timestamp INTEGER,
+    PRIMARY KEY (block_number, log_index)
+);
+CREATE INDEX IF NOT EXISTS logs_by_patient ON logs (patient, block_number, log_index);
+CREATE TABLE IF NOT EXISTS patients (
+    address TEXT PRIMARY KEY,
+    name TEXT,
+    email TEXT,
+    age INTEGER,
+    block_number INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS doctors (
+    address TEXT PRIMARY KEY,
+    name TEXT,
+    email TEXT,
+    block_number INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    patient TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    ipfs_hash TEXT NOT NULL,
+    PRIMARY KEY (patient, position)
+);
+CREATE TABLE IF NOT EXISTS access (
+    patient TEXT NOT NULL,
+    doctor TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (patient, doctor)
+);
+CREATE INDEX IF NOT EXISTS access_by_doctor ON access (doctor, position);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    sender TEXT NOT NULL,
+    receiver TEXT NOT NULL,
+    value TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    settled_block INTEGER
+);
+CREATE INDEX IF NOT EXISTS transactions_by_sender ON transactions (sender, id);
+CREATE INDEX IF NOT EXISTS transactions_by_receiver ON transactions (receiver, id);
+CREATE INDEX IF NOT EXISTS unsettled_by_sender ON transactions (sender, id) WHERE settled_block IS NULL;
+CREATE INDEX IF NOT EXISTS unsettled_by_receiver ON transactions (receiver, id) WHERE settled_block IS NULL;
+CREATE TABLE IF NOT EXISTS balances (
+    address TEXT PRIMARY KEY,
+    owed TEXT NOT NULL,
+    due TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS anchored_records (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    patient TEXT NOT NULL,
+    root TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    ipfs_hash TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+);
+CREATE INDEX IF NOT EXISTS anchored_by_patient ON anchored_records (patient, block_number, log_index);
+"""
+
+
+def _hex(value):
+    """Normalise HexBytes/bytes/str to a 0x-prefixed lowercase hex string."""
+    if isinstance(value, str):
+        return value.lower() if value.startswith('0x') else '0x' + value.lower()
+    return '0x' + bytes(value).hex()
+
+
+def _event_topic(contract, name):
+    item = next(i for i in contract.abi if i.get('type') == 'event' and i['name'] == name)
+    return Web3.keccak(text=f"{name}({','.join(i['type'] for i in item['inputs'])})")
+
+
+def _audit_row(args):
+    return {'actor': args['actor'], 'action': AUDIT_ACTIONS[args['action']], 'timestamp': args['timestamp']}
+
+
+def _anchored_row(args):
+    return {'ipfsHash': record_cid(args['ipfsHash']), 'root': _hex(args['root']), 'position': args['position'],
+            'timestamp': args['timestamp']}
+
+
+def audit_in_logs(contract):
+    """True for deployments made with ``storeAuditHistory`` off (audit getters stay empty)."""
+    has_flag = any(item.get('name') == 'storeAuditHistory' for item in contract.abi)
+    return has_flag and not contract.functions.storeAuditHistory().call()
+
+
+def audit_logs(contract, patient, from_block=0, to_block='latest'):
+    """A patient's audit history from ``AuditLogged`` logs, oldest first.
+
+    For deployments with ``storeAuditHistory`` off, whose audit getters are
+    empty; prefer the indexer when it is running.
+    """
+    logs = contract.w3.eth.get_logs({
+        'address': contract.address,
+        'fromBlock': from_block,
+        'toBlock': to_block,
+        'topics': [_event_topic(contract, 'AuditLogged'), '0x' + patient[2:].lower().rjust(64, '0')],
+    })
+    event = contract.events.AuditLogged()
+    return [_audit_row(event.process_log(log)['args']) for log in logs]
+
+
+def anchored_record_logs(contract, patients, from_block=0, to_block='latest'):
+    """Records anchored in Merkle batches for ``patients``, from ``MedicalRecordAnchored`` logs.
+
+    Returns ``{patient: [record, ...]}`` with each list oldest first, for
+    running without the indexer; deployments without the event have none.
+    """
+    anchored = {patient: [] for patient in patients}
+    if not patients or not any(item.get('type') == 'event' and item['name'] == 'MedicalRecordAnchored'
+                               for item in contract.abi):
+        return anchored
+    logs = contract.w3.eth.get_logs({
+        'address': contract.address,
+        'fromBlock': from_block,
+        'toBlock': to_block,
+        'topics': [_event_topic(contract, 'MedicalRecordAnchored'),
+                   ['0x' + patient[2:].lower().rjust(64, '0') for patient in patients]],
+    })
+    event = contract.events.MedicalRecordAnchored()
+    for log in sorted(logs, key=lambda log: (log['blockNumber'], log['logIndex'])):
+        args = event.process_log(log)['args']
+        anchored[args['patient']].append(_anchored_row(args))
+    return anchored
+
+
+class EventIndexer:
+    """Follows MediChain logs and projects them into an indexed SQLite store.
+
+    A background thread polls ``eth_getLogs`` in block ranges, keeps a
+    persisted checkpoint plus the hashes of recently indexed blocks, and rolls
+    the projection back to the last common ancestor when a reorg is detected.
+    """
+
+    def __init__(self, w3, contract, db_path, start_block=0, confirmations=0,
+                 poll_interval=2.0, batch_size=2000, reorg_depth=64):
+        self.w3 = w3
+        self.contract = contract
+        self.db_path = db_path
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.reorg_depth = reorg_depth
+
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._head = None
+
+        self._topics = {}
+        # Newer deployments address records by stable ids (deletion leaves a gap); older ones shift them down
+        self._stable_record_ids = False
+        self._registration_logged = False
+        for item in contract.abi:
+            if item.get('type') == 'event' and item['name'] in INDEXED_EVENTS:
+                signature = f"{item['name']}({','.join(i['type'] for i in item['inputs'])})"
+                self._topics[bytes(Web3.keccak(text=signature))] = item['name']
+                if item['name'] == 'MedicalRecordDeleted':
+                    self._stable_record_ids = any(i['name'] == 'recordId' for i in item['inputs'])
+                if item['name'] == 'PatientRegistered':
+                    # Newer deployments log the account details and the initial record; older
+                    # ones are read back from the contract at the registration block
+                    self._registration_logged = any(i['name'] == 'name' for i in item['inputs'])
+        # Newer deployments log every audit entry with its actor; older ones imply it from other events
+        self._audit_logged = 'AuditLogged' in self._topics.values()
+        # Older deployments don't log billing; their transactions are read from the contract
+        self.indexes_transactions = 'TransactionCreated' in self._topics.values()
+
+        conn = self._conn()
+        self._upgrade_schema(conn)
+        conn.executescript(SCHEMA)
+        self._reset_if_contract_changed(conn)
+        self._fill_balances(conn)
+
+    # ---------------------- Connection handling ---------------------- #
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _upgrade_schema(self, conn):
+        """Drop projections stored in an older layout; they are rebuilt from the retained logs."""
+        columns = [r['name'] for r in conn.execute('PRAGMA table_info(access)')]
+        if columns and 'position' not in columns:
+            with conn:
+                conn.execute('DROP TABLE access')
+                conn.executescript(SCHEMA)
+                self._replay_access(conn)
+
+    def _fill_balances(self, conn):
+        """Running unsettled totals for stores indexed before they were kept."""
+        if conn.execute('SELECT 1 FROM balances LIMIT 1').fetchone() is None:
+            with conn:
+                self._recompute_balances(conn, [r['address'] for r in conn.execute(
+                    'SELECT sender AS address FROM transactions UNION SELECT receiver FROM transactions')])
+
+    def _reset_if_contract_changed(self, conn):
+        address = self.contract.address.lower()
+        row = conn.execute("SELECT value FROM meta WHERE key = 'contract'").fetchone()
+        if row and row['value'] == address:
+            return
+        with conn:
+            for table in ('meta', 'blocks', 'logs', 'patients', 'doctors', 'records', 'access', 'transactions',
+                          'balances', 'anchored_records'):
+                conn.execute(f'DELETE FROM {table}')
+            conn.execute("INSERT INTO meta (key, value) VALUES ('contract', ?)", (address,))
+
+    # ---------------------- Checkpoint ---------------------- #
+    def checkpoint(self):
+        """Last fully indexed block number, or None before the first sync."""
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'last_block'").fetchone()
+        return int(row['value']) if row else None
+
+    def ready(self, max_lag=1):
+        """True once the projection is within ``max_lag`` blocks of the node head."""
+        last = self.checkpoint()
+        if last is None or self._head is None:
+            return False
+        return self._head - self.confirmations - last <= max_lag
+
+    # ---------------------- Background loop ---------------------- #
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='medichain-indexer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                # Keep going without sleeping while there is a backlog
+                if self.sync_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Indexer sync failed: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def sync_once(self):
+        """Index the next block range. Returns True if more blocks are pending."""
+        with self._write_lock:
+            head = self.w3.eth.block_number
+            self._head = head
+            target = head - self.confirmations
+
+            last = self.checkpoint()
+            if last is not None:
+                last = self._handle_reorg(last)
+            start = self.start_block if last is None else last + 1
+            if target < start:
+                return False
+            end = min(target, start + self.batch_size - 1)
+
+            logs = self.w3.eth.get_logs({
+                'address': self.contract.address,
+                'fromBlock': start,
+                'toBlock': end,
+            })
+            end_hash = self.w3.eth.get_block(end)['hash']
+            self._apply(logs, end, end_hash)
+            return end < target
+
+    # ---------------------- Reorg handling ---------------------- #
+    def _handle_reorg(self, last):
+        conn = self._conn()
+        rows = conn.execute('SELECT number, hash FROM blocks ORDER BY number DESC').fetchall()
+        if not rows or self._block_hash(rows[0]['number']) == rows[0]['hash']:
+            return last
+
+        ancestor = None
+        for row in rows[1:]:
+            if self._block_hash(row['number']) == row['hash']:
+                ancestor = row['number']
+                break
+        if ancestor is None:
+            # Reorg deeper than the tracked window: rebuild from scratch
+            ancestor = self.start_block - 1
+        logger.warning(f"Reorg detected at block {last}; rolling back to {ancestor}")
+        self._rollback(ancestor)
+        return ancestor if ancestor >= self.start_block else None
+
+    def _block_hash(self, number):
+        block = self.w3.eth.get_block(number)
+        return _hex(block['hash']) if block else None
+
+    def _rollback(self, ancestor):
+        conn = self._conn()
+        with conn:
+            touched = [r['patient'] for r in conn.execute(
+                'SELECT DISTINCT patient FROM logs WHERE block_number > ? AND patient IS NOT NULL',
+                (ancestor,))]
+            doctors = [r['doctor'] for r in conn.execute(
+                f"SELECT DISTINCT doctor FROM logs WHERE block_number > ? AND event IN {ACCESS_EVENTS}",
+                (ancestor,))]
+            parties = [r['address'] for r in conn.execute(
+                'SELECT sender AS address FROM transactions WHERE block_number > ? OR settled_block > ? '
+                'UNION SELECT receiver FROM transactions WHERE block_number > ? OR settled_block > ?',
+                (ancestor,) * 4)]
+            conn.execute('DELETE FROM logs WHERE block_number > ?', (ancestor,))
+            conn.execute('DELETE FROM blocks WHERE number > ?', (ancestor,))
+            conn.execute('DELETE FROM patients WHERE block_number > ?', (ancestor,))
+            conn.execute('DELETE FROM doctors WHERE block_number > ?', (ancestor,))
+            conn.execute('DELETE FROM transactions WHERE block_number > ?', (ancestor,))
+            conn.execute('DELETE FROM anchored_records WHERE block_number > ?', (ancestor,))
+            conn.execute('UPDATE transactions SET settled_block = NULL WHERE settled_block > ?', (ancestor,))
+            for patient in touched:
+                self._rebuild_patient(conn, patient)
+            self._replay_access(conn, doctors)
+            self._recompute_balances(conn, parties)
+            if ancestor >= self.start_block:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_block', ?)", (str(ancestor),))
+            else:
+                conn.execute("DELETE FROM meta WHERE key = 'last_block'")
+
+    def _rebuild_patient(self, conn, patient):
+        """Replay a patient's retained logs into the records table."""
+        conn.execute('DELETE FROM records WHERE patient = ?', (patient,))
+        rows = conn.execute(
+            f"SELECT * FROM logs WHERE patient = ? AND event NOT IN {ACCESS_EVENTS} ORDER BY block_number, log_index",
+            (patient,)).fetchall()
+        for row in rows:
+            self._project(conn, row['event'], row)
+
+    def _replay_access(self, conn, doctors=None):
+        """Rebuild the access lists of ``doctors`` (default: all) from their retained logs.
+
+        A revocation moves the doctor's last patient into the freed position,
+        so a list's order depends on its whole history.
+        """
+        query = f"SELECT * FROM logs WHERE event IN {ACCESS_EVENTS}"
+        params = ()
+        if doctors is not None:
+            if not doctors:
+                return
+            query += f" AND doctor IN ({','.join('?' * len(doctors))})"
+            params = tuple(doctors)
+            conn.execute(f"DELETE FROM access WHERE doctor IN ({','.join('?' * len(doctors))})", params)
+        else:
+            conn.execute('DELETE FROM access')
+        for row in conn.execute(query + ' ORDER BY block_number, log_index', params).fetchall():
+            self._project(conn, row['event'], row)
+
+    def _recompute_balances(self, conn, addresses):
+        """Recompute the running unsettled totals of ``addresses`` from their transactions (rollbacks only)."""
+        for address in addresses:
+            owed = sum(int(r['value']) for r in conn.execute(
+                'SELECT value FROM transactions WHERE sender = ? AND settled_block IS NULL', (address,)))
+            due = sum(int(r['value']) for r in conn.execute(
+                'SELECT value FROM transactions WHERE receiver = ? AND settled_block IS NULL', (address,)))
+            conn.execute('INSERT OR REPLACE INTO balances VALUES (?, ?, ?)', (address, str(owed), str(due)))
+
+    # ---------------------- Projection ---------------------- #
+    def _apply(self, logs, end, end_hash):
+        conn = self._conn()
+        tx_senders = {}
+        block_times = {}
+        with conn:
+            for log in logs:
+                name = self._topics.get(bytes(log['topics'][0])) if log['topics'] else None
+                if name is None:
+                    continue
+                args = getattr(self.contract.events, name)().process_log(log)['args']
+                block_number = log['blockNumber']
+                row = {
+                    'block_number': block_number,
+                    'log_index': log['logIndex'],
+                    'tx_hash': _hex(log['transactionHash']),
+                    'event': name,
+                    'patient': args.get('patient'),
+                    'doctor': args.get('doctor'),
+                    'actor': None,
+                    'action': None if self._audit_logged else EVENT_ACTIONS.get(name),
+                    'ipfs_hash': record_cid(args['ipfsHash']) if 'ipfsHash' in args else None,
+                    'record_index': args.get('recordId', args.get('index')),
+                    'timestamp': args.get('timestamp'),
+                }
+                if name in TRANSACTION_EVENTS:
+                    self._project_transaction(conn, name, args, block_number)
+                elif name == 'MedicalRecordAnchored':
+                    row['record_index'] = args['position']
+                    conn.execute('INSERT OR REPLACE INTO anchored_records VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                 (block_number, log['logIndex'], args['patient'], _hex(args['root']),
+                                  args['position'], row['ipfs_hash'], args['timestamp']))
+                elif name in ACCOUNT_EVENTS:
+                    self._project_account(conn, name, args, block_number)
+                elif name == 'AuditLogged':
+                    row.update(_audit_row(args))
+                elif row['action']:
+                    # The audit actor is the transaction sender, not part of the log
+                    tx_hash = row['tx_hash']
+                    if tx_hash not in tx_senders:
+                        tx_senders[tx_hash] = self.w3.eth.get_transaction(tx_hash)['from']
+                    row['actor'] = tx_senders[tx_hash]
+                if row['timestamp'] is None and name not in TRANSACTION_EVENTS:
+                    if block_number not in block_times:
+                        block_times[block_number] = self.w3.eth.get_block(block_number)['timestamp']
+                    row['timestamp'] = block_times[block_number]
+
+                conn.execute(
+                    'INSERT OR REPLACE INTO logs VALUES (:block_number, :log_index, :tx_hash, :event, :patient, '
+                    ':doctor, :actor, :action, :ipfs_hash, :record_index, :timestamp)', row)
+                conn.execute('INSERT OR REPLACE INTO blocks (number, hash) VALUES (?, ?)',
+                             (block_number, _hex(log['blockHash'])))
+                self._project(conn, name, row)
+
+            conn.execute('INSERT OR REPLACE INTO blocks (number, hash) VALUES (?, ?)', (end, _hex(end_hash)))
+            conn.execute('DELETE FROM blocks WHERE number < ?', (end - self.reorg_depth,))
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_block', ?)", (str(end),))
+
+    def _project(self, conn, name, row):
+        patient = row['patient']
+        doctor = row['doctor']
+        if name == 'PatientRegistered' and not self._registration_logged:
+            # Older deployments store the initial record without a MedicalRecordUpdated log
+            records = self.contract.functions.getMedicalRecords(patient).call(
+                block_identifier=row['block_number'])
+            if records:
+                conn.execute('INSERT INTO records VALUES (?, 0, ?)', (patient, record_cid(records[0])))
+        elif name == 'MedicalRecordUpdated':
+            position = row['record_index']
+            if position is None:
+                position = conn.execute('SELECT COUNT(*) FROM records WHERE patient = ?', (patient,)).fetchone()[0]
+            conn.execute('INSERT OR REPLACE INTO records VALUES (?, ?, ?)', (patient, position, row['ipfs_hash']))
+        elif name == 'MedicalRecordDeleted':
+            index = row['record_index']
+            conn.execute('DELETE FROM records WHERE patient = ? AND position = ?', (patient, index))
+            if not self._stable_record_ids:
+                # Mirror the contract's shift-down so positions stay aligned with on-chain indices
+                conn.execute('UPDATE records SET position = position - 1 WHERE patient = ? AND position > ?',
+                             (patient, index))
+        elif name == 'AccessGranted':
+            # Positions follow the doctor's on-chain patientAccessList
+            count = conn.execute('SELECT COUNT(*) FROM access WHERE doctor = ?', (doctor,)).fetchone()[0]
+            conn.execute('INSERT OR IGNORE INTO access VALUES (?, ?, ?)', (patient, doctor, count))
+        elif name == 'AccessRevoked':
+            row = conn.execute('SELECT position FROM access WHERE patient = ? AND doctor = ?',
+                               (patient, doctor)).fetchone()
+            if row is None:
+                return
+            conn.execute('DELETE FROM access WHERE patient = ? AND doctor = ?', (patient, doctor))
+            # Like removeFromList: the last patient takes the freed position
+            conn.execute('UPDATE access SET position = ? WHERE doctor = ? AND position = '
+                         '(SELECT COUNT(*) FROM access WHERE doctor = ?)', (row['position'], doctor, doctor))
+
+    def _project_account(self, conn, name, args, block_number):
+        if name == 'PatientRegistered':
+            patient = args['patient']
+            if self._registration_logged:
+                info = (args['name'], args['email'], args['age'])
+            else:
+                info = self.contract.functions.getPatientBasicInfo(patient).call(block_identifier=block_number)
+            conn.execute('INSERT OR REPLACE INTO patients VALUES (?, ?, ?, ?, ?)',
+                         (patient, info[0], info[1], info[2], block_number))
+        else:
+            doctor = args['doctor']
+            if self._registration_logged:
+                info = (args['name'], args['email'])
+            else:
+                info = self.contract.functions.getDoctorInfo(doctor).call(block_identifier=block_number)
+            conn.execute('INSERT OR REPLACE INTO doctors VALUES (?, ?, ?, ?)',
+                         (doctor, info[0], info[1], block_number))
+
+    def _project_transaction(self, conn, name, args, block_number):
+        if name == 'TransactionCreated':
+            if conn.execute('SELECT 1 FROM transactions WHERE id = ?', (args['id'],)).fetchone():
+                return
+            # Values are stored as decimal text: uint256 amounts overflow SQLite integers
+            conn.execute('INSERT INTO transactions VALUES (?, ?, ?, ?, ?, NULL)',
+                         (args['id'], args['sender'], args['receiver'], str(args['value']), block_number))
+            self._add_unsettled(conn, args['sender'], args['receiver'], args['value'])
+        else:
+            txn = conn.execute('SELECT * FROM transactions WHERE id = ? AND settled_block IS NULL',
+                               (args['id'],)).fetchone()
+            if txn is None:
+                return
+            conn.execute('UPDATE transactions SET settled_block = ? WHERE id = ?', (block_number, args['id']))
+            self._add_unsettled(conn, txn['sender'], txn['receiver'], -int(txn['value']))
+
+    def _add_unsettled(self, conn, sender, receiver, value):
+        """Move the running totals like the contract's unsettledOwed / unsettledDue."""
+        for address, column in ((sender, 'owed'), (receiver, 'due')):
+            row = conn.execute('SELECT owed, due FROM balances WHERE address = ?', (address,)).fetchone()
+            totals = {'owed': int(row['owed']), 'due': int(row['due'])} if row else {'owed': 0, 'due': 0}
+            totals[column] += value
+            conn.execute('INSERT OR REPLACE INTO balances VALUES (?, ?, ?)',
+                         (address, str(totals['owed']), str(totals['due'])))
+
+    # ---------------------- Read API ---------------------- #
+    def patient(self, address):
+        row = self._conn().execute('SELECT * FROM patients WHERE address = ?', (address,)).fetchone()
+        return dict(row) if row else None
+
+    def doctor(self, address):
+        row = self._conn().execute('SELECT * FROM doctors WHERE address = ?', (address,)).fetchone()
+        return dict(row) if row else None
+
+    def medical_records(self, patient, cursor=0, limit=-1):
+        """Records of ``patient`` from record id ``cursor`` on, and the id the next page starts at (or None)."""
+        rows = self._conn().execute(
+            'SELECT position, ipfs_hash FROM records WHERE patient = ? AND position >= ? ORDER BY position LIMIT ?',
+            (patient, cursor, limit + 1 if limit >= 0 else -1)).fetchall()
+        records = [{'id': r['position'], 'ipfsHash': r['ipfs_hash']} for r in rows]
+        if 0 <= limit < len(records):
+            return records[:limit], records[limit]['id']
+        return records, None
+
+    def medical_records_count(self, patient):
+        return self._conn().execute('SELECT COUNT(*) FROM records WHERE patient = ?', (patient,)).fetchone()[0]
+
+    def anchored_records(self, patient, offset=0, limit=-1):
+        """Records of ``patient`` anchored in Merkle batches, oldest first."""
+        rows = self._conn().execute(
+            'SELECT root, position, ipfs_hash, timestamp FROM anchored_records WHERE patient = ? '
+            'ORDER BY block_number, log_index LIMIT ? OFFSET ?', (patient, limit, offset))
+        return [{'ipfsHash': r['ipfs_hash'], 'root': r['root'], 'position': r['position'],
+                 'timestamp': r['timestamp']} for r in rows]
+
+    def anchored_records_count(self, patient):
+        return self._conn().execute(
+            'SELECT COUNT(*) FROM anchored_records WHERE patient = ?', (patient,)).fetchone()[0]
+
+    def audit_history(self, patient, offset=0, limit=-1):
+        rows = self._conn().execute(
+            'SELECT actor, action, timestamp FROM logs WHERE patient = ? AND action IS NOT NULL '
+            'ORDER BY block_number, log_index LIMIT ? OFFSET ?', (patient, limit, offset))
+        return [dict(r) for r in rows]
+
+    def audit_history_count(self, patient):
+        return self._conn().execute(
+            'SELECT COUNT(*) FROM logs WHERE patient = ? AND action IS NOT NULL', (patient,)).fetchone()[0]
+
+    def doctors(self):
+        rows = self._conn().execute('SELECT address, name FROM doctors ORDER BY block_number, address')
+        return [dict(r) for r in rows]
+
+    def doctor_patients(self, doctor, offset=0, limit=-1, records_limit=-1):
+        """Patients who granted ``doctor`` access, with the first page of their records."""
+        conn = self._conn()
+        rows = conn.execute(
+            'SELECT p.address, p.name FROM access a JOIN patients p ON p.address = a.patient '
+            'WHERE a.doctor = ? ORDER BY a.position LIMIT ? OFFSET ?', (doctor, limit, offset)).fetchall()
+        patients = []
+        for row in rows:
+            records, records_next = self.medical_records(row['address'], 0, records_limit)
+            patients.append({
+                'name': row['name'],
+                'address': row['address'],
+                'medicalRecords': records,
+                'recordsCount': self.medical_records_count(row['address']),
+                'recordsNext': records_next,
+                'anchoredRecords': self.anchored_records(row['address'], 0, records_limit),
+                'anchoredCount': self.anchored_records_count(row['address']),
+            })
+        return patients
+
+    def _transaction_party(self, address):
+        # Like the contract: a patient's transactions are those it sent, anyone else's those it received
+        return 'sender' if self.patient(address) else 'receiver'
+
+    def transactions(self, address, offset=0, limit=-1):
+        """A page of ``address``'s transactions, in the layout of ``app.format_transactions``."""
+        rows = self._conn().execute(
+            f'SELECT * FROM transactions WHERE {self._transaction_party(address)} = ? ORDER BY id LIMIT ? OFFSET ?',
+            (address, limit, offset))
+        return [{
+            'TransactionID': r['id'],
+            'Sender': r['sender'],
+            'Receiver': r['receiver'],
+            'Value': int(r['value']),
+            'Settled': r['settled_block'] is not None,
+        } for r in rows]
+
+    def transactions_count(self, address):
+        return self._conn().execute(
+            f'SELECT COUNT(*) FROM transactions WHERE {self._transaction_party(address)} = ?',
+            (address,)).fetchone()[0]
+
+    def unsettled_balance(self, address):
+        """Unsettled totals of ``address``, like ``getUnsettledBalance``: owed as sender, due as receiver.
+
+        Kept as running totals while indexing, so this is one lookup however long the history is.
+        """
+        row = self._conn().execute('SELECT owed, due FROM balances WHERE address = ?', (address,)).fetchone()
+        return {'owed': int(row['owed']), 'due': int(row['due'])} if row else {'owed': 0, 'due': 0}
+
+    def doctor_patients_count(self, doctor):
+        return self._conn().execute(
+            'SELECT COUNT(*) FROM access a JOIN patients p ON p.address = a.patient WHERE a.doctor = ?',
+            (doctor,)).fetchone()[0]
@@ -0,0 +1,369 @@
+"""Load and gas benchmark for MediChain on an in-process chain.
+
+Serves an eth-tester chain over a local JSON-RPC endpoint (no Ganache
+needed), deploys the contract, seeds patients, doctors, records, access
+grants and transactions, then imports app.py against it and reports:
+
+- latency percentiles for /dashboard (patient and doctor), /login and /get_patient_audit
+- RPC traffic per request (HTTP posts and JSON-RPC calls)
+- write throughput through the transaction queue
+- gas per contract function as a patient's history grows
+
+    pip install -r requirements-dev.txt
+    python load_benchmark.py --json > before.json
+    python load_benchmark.py --patients 50 --records 100 --iterations 200 --json
+    python load_benchmark.py --abi contract_abi.json --bytecode contract_bytecode.bin   # skip solc
+"""
+import argparse
+import importlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_account import Account  # type: ignore
+from web3 import EthereumTesterProvider, Web3  # type: ignore
+
+from cid_codec import record_arg
+from deploy_contract import compile_contract
+from gas_benchmark import deploy, gas_used, new_account, sample_record
+
+DEFAULT_HISTORY = [0, 10, 100]
+
+
+# ---------------------- Local node ---------------------- #
+def _jsonable(value):
+    if isinstance(value, (bytes, bytearray)):
+        return Web3.to_hex(value)
+    if hasattr(value, 'items'):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+class RpcNode:
+    """JSON-RPC over HTTP in front of an eth-tester chain, counting the traffic it serves."""
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self.posts = 0
+        self.calls = Counter()
+        self._request = w3.provider.request_func(w3, w3.middleware_onion)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; without this each
+            # keep-alive response waits ~40ms on the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                node.posts += 1
+                if isinstance(body, list):
+                    payload = [node.handle(item) for item in body]
+                else:
+                    payload = node.handle(body)
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def handle(self, request):
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        # eth-tester is not thread-safe
+        with self._lock:
+            self.calls[request['method']] += 1
+            try:
+                result = self._request(request['method'], request.get('params', []))
+            except Exception as e:
+                result = {'error': {'code': -32000, 'message': str(e)}}
+        if 'error' in result:
+            error = result['error']
+            response['error'] = error if isinstance(error, dict) else {'code': -32000, 'message': str(error)}
+        else:
+            response['result'] = _jsonable(result['result'])
+        return response
+
+    def snapshot(self):
+        with self._lock:
+            return self.posts, sum(self.calls.values())
+
+
+# ---------------------- Seeding ---------------------- #
+def new_keyed_account(w3):
+    """Funded tester account whose private key the app can sign with."""
+    account = Account.create()
+    w3.provider.ethereum_tester.add_account(account.key.hex())
+    w3.eth.send_transaction({"from": w3.eth.accounts[0], "to": account.address, "value": w3.to_wei(10, "ether")})
+    return account
+
+
+def seed(w3, contract, patients, doctors, doctors_per_patient, records, transactions):
+    """Register accounts and build up history; returns the patient and doctor accounts."""
+    fns = contract.functions
+    doctor_accounts = []
+    for i in range(doctors):
+        account = new_keyed_account(w3)
+        gas_used(w3, fns.register(f"Doctor {i}", 0, 2, f"doctor{i}@example.com", record_arg(contract, "")),
+                 account.address)
+        doctor_accounts.append(account)
+
+    patient_accounts = []
+    for i in range(patients):
+        account = new_keyed_account(w3)
+        gas_used(w3, fns.register(f"Patient {i}", 30, 1, f"patient{i}@example.com",
+                                  sample_record(contract, f"initial{i}")), account.address)
+        treating = [doctor_accounts[(i + j) % doctors] for j in range(min(doctors_per_patient, doctors))]
+        for doctor in treating:
+            gas_used(w3, fns.grantAccessToDoctor(doctor.address), account.address)
+        for r in range(records):
+            gas_used(w3, fns.createOrUpdateMedicalRecord(account.address, sample_record(contract, f"record{i}x{r}")),
+                     treating[r % len(treating)].address)
+        for t in range(transactions):
+            gas_used(w3, fns.createTransaction(treating[t % len(treating)].address, 100 + t), account.address)
+        patient_accounts.append(account)
+    return patient_accounts, doctor_accounts
+
+
+# ---------------------- Route latency ---------------------- #
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def measure_route(node, iterations, request, ok_status=(200,)):
+    """Time ``request()`` (returning a response) and count the RPC traffic it causes."""
+    request()  # warm-up: first-call costs (template compilation, cold caches) are excluded
+    latencies, errors = [], 0
+    posts_before, calls_before = node.snapshot()
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = request()
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code not in ok_status:
+            errors += 1
+    posts_after, calls_after = node.snapshot()
+    return {
+        'iterations': iterations,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p90_ms': round(percentile(latencies, 90), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'rpc_posts_per_request': round((posts_after - posts_before) / iterations, 2),
+        'rpc_calls_per_request': round((calls_after - calls_before) / iterations, 2),
+    }
+
+
+def logged_in_client(app_module, account, role, name):
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session.update(address=account.address, role=role, name=name, private_key=account.key.hex())
+    return client
+
+
+def measure_routes(app_module, node, patients, doctors, iterations):
+    patient, doctor = patients[0], doctors[0]
+    patient_client = logged_in_client(app_module, patient, 'patient', 'Patient 0')
+    doctor_client = logged_in_client(app_module, doctor, 'doctor', 'Doctor 0')
+    login_client = app_module.app.test_client()
+    login_form = {'email': 'patient0@example.com', 'address': patient.address, 'private_key': patient.key.hex()}
+    return {
+        'dashboard_patient': measure_route(node, iterations, lambda: patient_client.get('/dashboard')),
+        'dashboard_doctor': measure_route(node, iterations, lambda: doctor_client.get('/dashboard')),
+        'login': measure_route(node, iterations, lambda: login_client.post('/login', data=login_form),
+                               ok_status=(302,)),
+        'get_patient_audit': measure_route(
+            node, iterations,
+            lambda: patient_client.get('/get_patient_audit', query_string={'patient_address': patient.address})),
+    }
+
+
+# ---------------------- Write throughput ---------------------- #
+def measure_writes(app_module, node, patients, doctors, writes, doctors_per_patient):
+    """Queue record updates from every doctor and time them until mined."""
+    contract = app_module.contract
+    posts_before, calls_before = node.snapshot()
+    started = time.perf_counter()
+    job_ids = []
+    for i in range(writes):
+        patient_index = i % len(patients)
+        doctor = doctors[(patient_index + i % max(doctors_per_patient, 1)) % len(doctors)]
+        job_ids.append(app_module.tx_queue.submit(
+            contract.functions.createOrUpdateMedicalRecord(patients[patient_index].address,
+                                                           sample_record(contract, f"write{i}")),
+            {'from': doctor.address}, doctor.key, 'benchmark write'))
+
+    while True:
+        statuses = [app_module.tx_queue.status(job_id) for job_id in job_ids]
+        if all(s['status'] in app_module.FINAL_STATES for s in statuses):
+            break
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    posts_after, calls_after = node.snapshot()
+    mined = sum(1 for s in statuses if s['status'] == 'mined')
+    return {
+        'writes': writes,
+        'mined': mined,
+        'failed': writes - mined,
+        'seconds': round(elapsed, 3),
+        'writes_per_second': round(mined / elapsed, 2) if elapsed else None,
+        'rpc_calls_per_write': round((calls_after - calls_before) / writes, 2),
+        'rpc_posts_per_write': round((posts_after - posts_before) / writes, 2),
+    }
+
+
+# ---------------------- Gas vs history ---------------------- #
+def measure_gas(abi, bytecode, history, store_audit_history=True):
+    """Gas per write once a patient has ``history`` records (and as many audit events)."""
+    w3 = Web3(EthereumTesterProvider())
+    contract = deploy(w3, abi, bytecode, store_audit_history)
+    fns = contract.functions
+    functions = {item['name'] for item in abi if item.get('type') == 'function'}
+
+    patient = new_account(w3)
+    doctor = new_account(w3)
+    other_doctor = new_account(w3)
+    gas_used(w3, fns.register("Patient", 30, 1, "patient@example.com", sample_record(contract, "initial")), patient)
+    gas_used(w3, fns.register("Doctor", 0, 2, "doctor@example.com", record_arg(contract, "")), doctor)
+    gas_used(w3, fns.register("Other", 0, 2, "other@example.com", record_arg(contract, "")), other_doctor)
+    gas_used(w3, fns.grantAccessToDoctor(doctor), patient)
+    for r in range(history):
+        gas_used(w3, fns.createOrUpdateMedicalRecord(patient, sample_record(contract, f"history{r}")), doctor)
+        gas_used(w3, fns.createTransaction(doctor, r), patient)
+
+    result = {'history': history}
+    result['createOrUpdateMedicalRecord'] = gas_used(
+        w3, fns.createOrUpdateMedicalRecord(patient, sample_record(contract, "new")), doctor)
+    if 'createOrUpdateMedicalRecords' in functions:
+        result['createOrUpdateMedicalRecords_x10'] = gas_used(
+            w3, fns.createOrUpdateMedicalRecords([patient] * 10,
+                                                 [sample_record(contract, f"batch{i}") for i in range(10)]), doctor)
+    # Oldest record: the worst case where deletion shifts the later records down
+    result['deleteMedicalRecord'] = gas_used(w3, fns.deleteMedicalRecord(patient, 0), patient)
+    result['grantAccessToDoctor'] = gas_used(w3, fns.grantAccessToDoctor(other_doctor), patient)
+    result['revokeAccessToDoctor'] = gas_used(w3, fns.revokeAccessToDoctor(other_doctor), patient)
+    result['createTransaction'] = gas_used(w3, fns.createTransaction(doctor, 1), patient)
+    result['settleTransaction'] = gas_used(w3, fns.settleTransaction(1), patient)
+    if 'settleTransactions' in functions:
+        # Ten new transactions (IDs history + 2 ...) settled in one call
+        for i in range(10):
+            gas_used(w3, fns.createTransaction(doctor, i + 1), patient)
+        result['settleTransactions_x10'] = gas_used(
+            w3, fns.settleTransactions(list(range(history + 2, history + 12))), patient)
+    return result
+
+
+# ---------------------- Runner ---------------------- #
+def load_app(rpc_url, contract_address, abi, workdir, indexer):
+    """Import app.py against the local node with isolated state under ``workdir``."""
+    abi_path = os.path.join(workdir, 'contract_abi.json')
+    with open(abi_path, 'w') as f:
+        json.dump(abi, f)
+    os.environ.update({
+        'WEB3_PROVIDER_URLS': rpc_url,
+        'CONTRACT_ADDRESS': contract_address,
+        'CONTRACT_ABI_PATH': abi_path,
+        'INDEXER_DB': os.path.join(workdir, 'index.db') if indexer else '',
+        # The benchmark syncs the indexer itself; keep background pollers out of the RPC counts
+        'INDEXER_POLL_INTERVAL': '3600',
+        'RPC_PROBE_INTERVAL': '3600',
+        'BLOB_STORE_DIR': os.path.join(workdir, 'blobs'),
+        'STORAGE_BACKEND': 'local',
+        'PINATA_API_KEY': '',
+        'PINATA_SECRET_API_KEY': '',
+        'SECRET_KEY': 'benchmark',
+    })
+    app_module = importlib.import_module('app')
+    if app_module.indexer is not None:
+        app_module.indexer.sync_once()
+    return app_module
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="MediChain.sol", help="Solidity source to deploy")
+    parser.add_argument("--abi", help="use a compiled ABI file instead of compiling --source")
+    parser.add_argument("--bytecode", help="bytecode hex file to deploy with --abi")
+    parser.add_argument("--patients", type=int, default=10)
+    parser.add_argument("--doctors", type=int, default=3)
+    parser.add_argument("--doctors-per-patient", type=int, default=2)
+    parser.add_argument("--records", type=int, default=20, help="records (and audit events) per patient")
+    parser.add_argument("--transactions", type=int, default=5, help="billing transactions per patient")
+    parser.add_argument("--iterations", type=int, default=50, help="requests per measured route")
+    parser.add_argument("--writes", type=int, default=50, help="queued writes for the throughput run")
+    parser.add_argument("--history", type=int, nargs="+", default=DEFAULT_HISTORY,
+                        help="history sizes for the gas measurements")
+    parser.add_argument("--no-indexer", action="store_true", help="serve reads from the chain only")
+    parser.add_argument("--no-audit-storage", action="store_true",
+                        help="deploy with the audit history in logs only (STORE_AUDIT_HISTORY=0)")
+    parser.add_argument("--json", action="store_true", help="emit machine-readable JSON")
+    args = parser.parse_args()
+
+    if args.abi:
+        with open(args.abi, "r") as f:
+            abi = json.load(f)
+        with open(args.bytecode, "r") as f:
+            bytecode = f.read().strip()
+    else:
+        abi, bytecode = compile_contract(args.source)
+
+    w3 = Web3(EthereumTesterProvider())
+    contract = deploy(w3, abi, bytecode, not args.no_audit_storage)
+    started = time.perf_counter()
+    patients, doctors = seed(w3, contract, args.patients, args.doctors, args.doctors_per_patient,
+                             args.records, args.transactions)
+    seed_seconds = time.perf_counter() - started
+
+    node = RpcNode(w3)
+    rpc_url = node.start()
+    workdir = tempfile.mkdtemp(prefix='medichain-bench-')
+    app_module = load_app(rpc_url, contract.address, abi, workdir, indexer=not args.no_indexer)
+
+    results = {
+        'config': {k: v for k, v in vars(args).items() if k != 'json'},
+        'seed_seconds': round(seed_seconds, 3),
+        'routes': measure_routes(app_module, node, patients, doctors, args.iterations),
+        'writes': measure_writes(app_module, node, patients, doctors, args.writes, args.doctors_per_patient),
+        'gas': [measure_gas(abi, bytecode, size, not args.no_audit_storage) for size in args.history],
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Seeded {args.patients} patients / {args.doctors} doctors in {results['seed_seconds']}s")
+    print(f"{'route':<20} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'rpc/req':>8} {'errors':>7}")
+    for name, row in results['routes'].items():
+        print(f"{name:<20} {row['p50_ms']:>9} {row['p90_ms']:>9} {row['p99_ms']:>9} "
+              f"{row['rpc_calls_per_request']:>8} {row['errors']:>7}")
+    writes = results['writes']
+    print(f"\nwrites: {writes['mined']}/{writes['writes']} mined, {writes['writes_per_second']} tx/s, "
+          f"{writes['rpc_calls_per_write']} rpc calls/write")
+    columns = [c for c in results['gas'][0] if c != 'history']
+    print(f"\n{'history':>8} " + " ".join(f"{c:>32}" for c in columns))
+    for row in results['gas']:
+        print(f"{row['history']:>8} " + " ".join(f"{row.get(c, '-'):>32}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
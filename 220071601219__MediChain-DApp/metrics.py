@@ -0,0 +1,292 @@
+"""In-process request metrics rendered in the Prometheus text format.
+
+HTTP clients are instrumented through ``requests`` response hooks, so every
+POST to the node (single JSON-RPC calls from web3 and ``BatchReader``
+batches alike) and to Pinata is timed and sized without touching the
+callers. Calls are labelled with the Flask route that made them (or
+``background`` for worker threads) and, for ``eth_call``/``eth_estimateGas``,
+with the contract function decoded from the 4-byte selector.
+"""
+import contextvars
+import json
+import threading
+import time
+
+from web3 import Web3  # type: ignore
+
+from batch_reads import _collapse
+
+BACKGROUND = 'background'
+
+# Seconds; node round trips are usually a few ms, uploads can take seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+_route = contextvars.ContextVar('metrics_route', default=BACKGROUND)
+_request_stats = contextvars.ContextVar('metrics_request_stats', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.label_names, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", "+Inf")])} {count}')
+                lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {total}')
+                lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {count}')
+        return lines
+
+
+def function_selectors(abi):
+    """``{'0x12345678': 'functionName'}`` for every function in a contract ABI."""
+    selectors = {}
+    for item in abi:
+        if item.get('type') != 'function':
+            continue
+        signature = f"{item['name']}({','.join(_collapse(i) for i in item.get('inputs', []))})"
+        selectors[Web3.to_hex(Web3.keccak(text=signature)[:4])] = item['name']
+    return selectors
+
+
+class Metrics:
+    """Registry of the app's counters and histograms.
+
+    ``gauges`` maps a metric name prefix to a callable returning a dict of
+    numbers (e.g. ``CallCache.stats``); they are sampled at scrape time.
+    """
+
+    def __init__(self, selectors=None, trace=False, logger=None):
+        self.selectors = selectors or {}
+        self.trace = trace
+        self.logger = logger
+        self.gauges = {}
+
+        self.route_seconds = Histogram(
+            'medichain_route_seconds', 'Flask request latency', ('route', 'status'))
+        self.route_rpc_seconds = Histogram(
+            'medichain_route_rpc_seconds', 'Time a request spent waiting on the node', ('route',))
+        self.route_rpc_calls = Histogram(
+            'medichain_route_rpc_calls', 'JSON-RPC calls made per request', ('route',),
+            buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128, 256))
+        self.rpc_calls = Counter(
+            'medichain_rpc_calls_total', 'JSON-RPC calls', ('route', 'method', 'function'))
+        self.rpc_seconds = Histogram(
+            'medichain_rpc_seconds', 'Node round trip per HTTP POST (method "batch" for batches)',
+            ('route', 'method', 'function'))
+        self.rpc_request_bytes = Histogram(
+            'medichain_rpc_request_bytes', 'JSON-RPC request body size', ('route', 'method'), SIZE_BUCKETS)
+        self.rpc_response_bytes = Histogram(
+            'medichain_rpc_response_bytes', 'JSON-RPC response body size', ('route', 'method'), SIZE_BUCKETS)
+        self.http_seconds = Histogram(
+            'medichain_http_client_seconds', 'Outgoing HTTP request latency', ('target', 'status'))
+        self.http_request_bytes = Histogram(
+            'medichain_http_client_request_bytes', 'Outgoing HTTP request body size', ('target',), SIZE_BUCKETS)
+        self.upload_seconds = Histogram(
+            'medichain_upload_seconds', 'Blob store put latency', ('backend', 'outcome'))
+        self.upload_bytes = Histogram(
+            'medichain_upload_bytes', 'Uploaded file size', ('backend',), SIZE_BUCKETS)
+
+    # ---------------------- Request scope ---------------------- #
+    def begin_request(self, route):
+        """Label the calls made from this thread with ``route`` until ``end_request``."""
+        _route.set(route or 'unknown')
+        _request_stats.set({'started': time.perf_counter(), 'rpc_seconds': 0.0, 'rpc_calls': 0, 'trace': []})
+
+    def end_request(self, status):
+        route = _route.get()
+        stats = _request_stats.get()
+        _route.set(BACKGROUND)
+        _request_stats.set(None)
+        if stats is None:
+            return
+        self.route_seconds.observe(time.perf_counter() - stats['started'], route, status)
+        self.route_rpc_seconds.observe(stats['rpc_seconds'], route)
+        self.route_rpc_calls.observe(stats['rpc_calls'], route)
+        if self.trace and self.logger and stats['trace']:
+            lines = '\n'.join(
+                f"  {method} {function or ''} {seconds * 1000:.1f}ms {sent}B/{received}B"
+                for method, function, seconds, sent, received in stats['trace'])
+            self.logger.info(f"RPC trace for {route} ({stats['rpc_calls']} calls, "
+                             f"{stats['rpc_seconds'] * 1000:.1f}ms):\n{lines}")
+
+    # ---------------------- HTTP clients ---------------------- #
+    def instrument_rpc_session(self, session):
+        session.hooks['response'].append(self._on_rpc_response)
+        return session
+
+    def instrument_http_session(self, session, target):
+        def on_response(response, *args, **kwargs):
+            seconds = self._elapsed(response)
+            self.http_seconds.observe(seconds, target, response.status_code)
+            self.http_request_bytes.observe(self._request_size(response.request), target)
+        session.hooks['response'].append(on_response)
+        return session
+
+    @staticmethod
+    def _elapsed(response):
+        # Hooks run before requests reads the body; read it here so it is timed too
+        started = time.perf_counter()
+        response.content
+        return response.elapsed.total_seconds() + time.perf_counter() - started
+
+    @staticmethod
+    def _request_size(request):
+        length = request.headers.get('Content-Length')
+        return int(length) if length else 0
+
+    def _describe(self, call):
+        method = call.get('method', 'unknown')
+        function = ''
+        if method in ('eth_call', 'eth_estimateGas') and call.get('params'):
+            data = call['params'][0].get('data') or call['params'][0].get('input') or ''
+            function = self.selectors.get(data[:10], data[:10])
+        return method, function
+
+    def _on_rpc_response(self, response, *args, **kwargs):
+        seconds = self._elapsed(response)
+        sent = self._request_size(response.request)
+        received = len(response.content)
+        try:
+            body = json.loads(response.request.body or b'null')
+        except ValueError:
+            body = None
+        calls = body if isinstance(body, list) else [body] if isinstance(body, dict) else []
+
+        route = _route.get()
+        described = [self._describe(call) for call in calls]
+        for method, function in described:
+            self.rpc_calls.inc(route, method, function)
+        if len(described) == 1:
+            method, function = described[0]
+        else:
+            method, function = 'batch', ''
+        self.rpc_seconds.observe(seconds, route, method, function)
+        self.rpc_request_bytes.observe(sent, route, method)
+        self.rpc_response_bytes.observe(received, route, method)
+
+        stats = _request_stats.get()
+        if stats is not None:
+            stats['rpc_seconds'] += seconds
+            stats['rpc_calls'] += len(described)
+            if self.trace:
+                if method == 'batch':
+                    function = ','.join(sorted({f for _, f in described if f}))
+                stats['trace'].append((method, function, seconds, sent, received))
+
+    def observe_rpc(self, method, function, seconds):
+        """Count a node call made outside the instrumented sessions (the async client in asgi.py)."""
+        route = _route.get()
+        self.rpc_calls.inc(route, method, function)
+        self.rpc_seconds.observe(seconds, route, method, function)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats['rpc_seconds'] += seconds
+            stats['rpc_calls'] += 1
+            if self.trace:
+                stats['trace'].append((method, function, seconds, 0, 0))
+
+    # ---------------------- Uploads ---------------------- #
+    def instrument_blob_store(self, blob_store):
+        """Time ``blob_store.put`` and count the bytes it reads from each stream."""
+        backend = type(blob_store).__name__
+        put = blob_store.put
+
+        def timed_put(stream, filename=None, content_type=None):
+            counted = _CountingReader(stream)
+            started = time.perf_counter()
+            outcome = 'error'
+            try:
+                cid = put(counted, filename, content_type)
+                outcome = 'ok'
+                return cid
+            finally:
+                self.upload_seconds.observe(time.perf_counter() - started, backend, outcome)
+                self.upload_bytes.observe(counted.bytes_read, backend)
+
+        blob_store.put = timed_put
+        return blob_store
+
+    # ---------------------- Exposition ---------------------- #
+    def render(self):
+        lines = []
+        for metric in (self.route_seconds, self.route_rpc_seconds, self.route_rpc_calls,
+                       self.rpc_calls, self.rpc_seconds, self.rpc_request_bytes, self.rpc_response_bytes,
+                       self.http_seconds, self.http_request_bytes, self.upload_seconds, self.upload_bytes):
+            lines.extend(metric.render())
+        for prefix, sample in self.gauges.items():
+            for key, value in sample().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'# TYPE {prefix}_{key} gauge')
+                    lines.append(f'{prefix}_{key} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class _CountingReader:
+    """File-like wrapper counting the bytes read through it."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
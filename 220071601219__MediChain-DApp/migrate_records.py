@@ -0,0 +1,170 @@
+"""Copy accounts, records and access lists from an earlier MediChain deployment.
+
+Deployments made before records were stored as ``bytes32`` digests keep
+them as CID strings. Their state cannot be upgraded in place, so a new
+contract is deployed with ``deploy_contract.py --migrate`` and this script
+imports every doctor, patient, record (converted with ``cid_codec``) and
+access grant into it through the migrator functions, signed with the
+deployer's key (``PRIVATE_KEY``).
+
+    python migrate_records.py --old-address 0xOLD... --old-abi old_contract_abi.json
+    python migrate_records.py --old-address 0xOLD... --old-abi old_contract_abi.json --finish
+
+Run it before the app is pointed at the new contract: re-running it only
+sends what the new contract is still missing (records are resumed from
+the next record id), so an interrupted migration can simply be started again.
+``--finish`` closes the migration for good. Audit history and billing
+transactions are not copied; they stay readable on the old contract.
+Record ids carry over: a record deleted on the old contract (or whose CID
+cannot be converted) is imported as a deleted one.
+"""
+import argparse
+import os
+import time
+
+from dotenv import load_dotenv  # type: ignore
+from web3 import Web3  # type: ignore
+
+from batch_reads import BatchReader
+from cid_codec import EMPTY_DIGEST, cid_to_digest, digest_to_cid
+from contract_abi import ABI_PATH, load_abi
+from deploy_contract import deployer_key
+from rpc_endpoints import provider_from_env
+from tx_queue import FINAL_STATES, TransactionQueue
+
+# Records / access grants imported per transaction
+MIGRATE_CHUNK = int(os.getenv('MIGRATE_CHUNK', '100'))
+
+
+def record_digest(value):
+    """Digest of a record read from the old contract (a CID string, or already a digest)."""
+    if not isinstance(value, str):
+        return bytes(value)
+    digest = cid_to_digest(value, allow_v1=True)
+    if not value.strip().startswith('Qm'):
+        print(f"⚠️ Record {value} is a CIDv1; it will read back as {digest_to_cid(digest)} (same content)")
+    return digest
+
+
+def read_old_state(contract):
+    """``(doctors, patients)`` of a deployment: ``{address: info}`` with records and access lists."""
+    reader = BatchReader(contract.w3, contract)
+    reader.pin()
+    doctor_addresses = contract.functions.getAllDoctors().call(block_identifier=reader.block)
+    doctors = {
+        address: {'name': info[0], 'email': info[1]}
+        for address, info in zip(doctor_addresses,
+                                 reader.call_many([('getDoctorInfo', d) for d in doctor_addresses]))
+    }
+
+    count = contract.functions.getPatientListLength().call(block_identifier=reader.block)
+    patient_addresses = reader.call_many([('patientList', i) for i in range(count)])
+    patients = {}
+    for address in patient_addresses:
+        (name, email, age, _, _), records, access = reader.call_many([
+            ('getPatientBasicInfo', address),
+            ('getMedicalRecords', address),
+            ('getPatientAccessList', address),
+        ])
+        digests = []
+        for record in records:
+            try:
+                digests.append(record_digest(record))
+            except ValueError as e:
+                print(f"⚠️ Importing record {record!r} of {address} as deleted: {e}")
+                digests.append(EMPTY_DIGEST)
+        patients[address] = {'name': name, 'email': email, 'age': age, 'records': digests, 'access': access}
+    return doctors, patients
+
+
+def wait(tx_queue, job_ids):
+    while True:
+        statuses = [tx_queue.status(job_id) for job_id in job_ids]
+        if all(status['status'] in FINAL_STATES for status in statuses):
+            break
+        time.sleep(1)
+    failed = [status for status in statuses if status['status'] != 'mined']
+    for status in failed:
+        print(f"❌ {status['description']}: {status['error']}")
+    return not failed
+
+
+def migrate(contract, tx_queue, sender, private_key, doctors, patients):
+    """Queue whatever ``contract`` is missing; returns False if a transaction failed."""
+    fns = contract.functions
+    reader = BatchReader(contract.w3, contract)
+
+    def submit(contract_fn, description):
+        return tx_queue.submit(contract_fn, {'from': sender}, private_key, description)
+
+    # Accounts first, mined in earlier blocks than their records: the indexer
+    # reads a new patient's records at its registration block
+    doctor_list = list(doctors)
+    patient_list = list(patients)
+    known = reader.call_many([('getDoctorInfo', d) for d in doctor_list] +
+                             [('getPatientBasicInfo', p) for p in patient_list])
+    jobs = [submit(fns.migrateDoctor(d, doctors[d]['name'], doctors[d]['email']), f"Doctor {d}")
+            for d, info in zip(doctor_list, known) if not info[2]]
+    jobs += [submit(fns.migratePatient(p, patients[p]['name'], patients[p]['email'], patients[p]['age']),
+                    f"Patient {p}")
+             for p, info in zip(patient_list, known[len(doctor_list):]) if not info[3]]
+    print(f"⏳ Importing {len(jobs)} accounts")
+    if not wait(tx_queue, jobs):
+        return False
+
+    counts = reader.call_many([('getNextRecordId', p) for p in patient_list])
+    authorized = reader.call_many([('isDoctorAuthorized', p, d)
+                                   for p in patient_list for d in patients[p]['access']])
+    jobs = []
+    for patient, count in zip(patient_list, counts):
+        missing = patients[patient]['records'][count:]
+        for start in range(0, len(missing), MIGRATE_CHUNK):
+            chunk = missing[start:start + MIGRATE_CHUNK]
+            jobs.append(submit(fns.migrateRecords(patient, chunk), f"{len(chunk)} records of {patient}"))
+        access = patients[patient]['access']
+        grants, authorized = [d for d, ok in zip(access, authorized) if not ok], authorized[len(access):]
+        for start in range(0, len(grants), MIGRATE_CHUNK):
+            chunk = grants[start:start + MIGRATE_CHUNK]
+            jobs.append(submit(fns.migrateAccess(patient, chunk), f"{len(chunk)} access grants of {patient}"))
+    print(f"⏳ Importing records and access lists in {len(jobs)} transactions")
+    return wait(tx_queue, jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--old-address", required=True, help="address of the earlier deployment")
+    parser.add_argument("--old-abi", required=True, help="ABI file of the earlier deployment")
+    parser.add_argument("--finish", action="store_true", help="close the migration after importing")
+    args = parser.parse_args()
+
+    load_dotenv()
+    w3 = Web3(provider_from_env())
+    old = w3.eth.contract(address=Web3.to_checksum_address(args.old_address), abi=load_abi(args.old_abi))
+    new = w3.eth.contract(address=Web3.to_checksum_address(os.getenv('CONTRACT_ADDRESS')),
+                          abi=load_abi(os.getenv('CONTRACT_ABI_PATH', ABI_PATH)))
+    private_key = deployer_key()
+    sender = w3.eth.account.from_key(private_key).address
+    if new.functions.migrator().call() != sender:
+        raise SystemExit(f"❌ {sender} is not the migrator of {new.address} "
+                         "(deployed without --migrate, or the migration is finished)")
+
+    doctors, patients = read_old_state(old)
+    print(f"📂 {len(doctors)} doctors, {len(patients)} patients, "
+          f"{sum(len(p['records']) for p in patients.values())} records in {old.address}")
+
+    # One worker keeps a patient's record chunks in order
+    tx_queue = TransactionQueue(w3, workers=1)
+    tx_queue.start()
+    if not migrate(new, tx_queue, sender, private_key, doctors, patients):
+        raise SystemExit("❌ Some imports failed; run the migration again")
+    print(f"✅ {new.address} holds every account, record and access grant of {old.address}")
+
+    if args.finish:
+        job_id = tx_queue.submit(new.functions.finishMigration(), {'from': sender}, private_key, "Finish migration")
+        if not wait(tx_queue, [job_id]):
+            raise SystemExit(1)
+        print("✅ Migration closed")
+
+
+if __name__ == "__main__":
+    main()
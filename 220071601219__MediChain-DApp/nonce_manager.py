@@ -0,0 +1,79 @@
+import threading
+import time
+
+
+class NonceManager:
+    """Thread-safe per-account nonce allocator.
+
+    Nonces are seeded from the node's pending transaction count and then handed
+    out locally, so several transactions from one account can be in flight at
+    once. Nonces whose send failed are reused before new ones are issued, and an
+    account is re-seeded from the node when it reports a nonce error or when it
+    has been idle for ``resync_after`` seconds (another wallet may have used it).
+    """
+
+    def __init__(self, w3, resync_after=30.0):
+        self.w3 = w3
+        self.resync_after = resync_after
+        self._lock = threading.Lock()
+        self._accounts = {}
+
+    def _account(self, address):
+        with self._lock:
+            return self._accounts.setdefault(address, {
+                'lock': threading.Lock(),
+                'next': None,
+                'released': set(),
+                'in_flight': 0,
+                'seeded_at': 0.0,
+            })
+
+    def _seed(self, state, address):
+        state['next'] = self.w3.eth.get_transaction_count(address, 'pending')
+        state['released'] = {n for n in state['released'] if n < state['next']}
+        state['seeded_at'] = time.time()
+
+    def allocate(self, address):
+        """Reserve the next nonce for ``address``; pair with ``release`` or ``done``."""
+        state = self._account(address)
+        with state['lock']:
+            idle = state['in_flight'] == 0 and time.time() - state['seeded_at'] > self.resync_after
+            if state['next'] is None or idle:
+                self._seed(state, address)
+            state['in_flight'] += 1
+            if state['released']:
+                # Fill gaps left by failed sends first so later nonces are not stuck
+                nonce = min(state['released'])
+                state['released'].discard(nonce)
+                return nonce
+            nonce = state['next']
+            state['next'] += 1
+            return nonce
+
+    def release(self, address, nonce):
+        """Return a nonce whose transaction was never broadcast."""
+        state = self._account(address)
+        with state['lock']:
+            state['in_flight'] = max(state['in_flight'] - 1, 0)
+            if state['next'] is not None and nonce == state['next'] - 1:
+                state['next'] = nonce
+            elif state['next'] is not None and nonce < state['next']:
+                state['released'].add(nonce)
+
+    def done(self, address):
+        """Mark a transaction that used an allocated nonce as finished."""
+        state = self._account(address)
+        with state['lock']:
+            state['in_flight'] = max(state['in_flight'] - 1, 0)
+
+    def resync(self, address):
+        """Discard local state and re-read the pending count from the node."""
+        state = self._account(address)
+        with state['lock']:
+            state['released'] = set()
+            self._seed(state, address)
+
+    @staticmethod
+    def is_nonce_error(error):
+        message = str(error).lower()
+        return 'nonce' in message or 'replacement transaction underpriced' in message
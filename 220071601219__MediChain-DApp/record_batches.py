@@ -0,0 +1,292 @@
+"""Merkle-anchored record batches for high-volume record sources.
+
+Instead of one ``medicalRecords`` push (plus audit entry) per record, a
+``RecordBatcher`` sends up to ``max_batch`` ``(patient, cid)`` pairs in one
+``anchorRecordBatch`` call: the contract checks the doctor's access to every
+patient, computes the Merkle root over the records, stores only the root and
+logs each record (``MedicalRecordAnchored``) for the indexer and the live
+dashboards. Every leaf's proof is kept in a local SQLite store; anyone holding
+a proof can check it locally (``verify_proof``) or against the chain
+(``MediChain.verifyRecordInclusion``).
+
+Leaves and inner nodes are hashed exactly like the contract: a leaf is
+``keccak256(keccak256(abi.encode(patient, digest)))`` over the record's
+``bytes32`` CID digest (``cid_codec.py``) and pairs are hashed in sorted
+order, so a proof is just the list of sibling hashes.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from eth_abi import encode  # type: ignore
+from web3 import Web3  # type: ignore
+
+from cid_codec import cid_to_digest
+from tx_queue import FINAL_STATES
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    root TEXT PRIMARY KEY,
+    submitter TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    job_id TEXT,
+    status TEXT NOT NULL,
+    tx_hash TEXT,
+    block_number INTEGER
+);
+CREATE TABLE IF NOT EXISTS leaves (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    submitter TEXT NOT NULL,
+    patient TEXT NOT NULL,
+    cid TEXT NOT NULL,
+    added_at REAL NOT NULL,
+    root TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    proof TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS leaves_by_record ON leaves (patient, cid);
+CREATE INDEX IF NOT EXISTS leaves_by_root ON leaves (root, position);
+"""
+
+
+def record_leaf(patient, cid):
+    """Merkle leaf of a record, as computed by ``MediChain.recordLeaf`` from the CID's digest."""
+    inner = Web3.keccak(encode(['address', 'bytes32'], [Web3.to_checksum_address(patient), cid_to_digest(cid)]))
+    return bytes(Web3.keccak(inner))
+
+
+def hash_pair(a, b):
+    return bytes(Web3.keccak(min(a, b) + max(a, b)))
+
+
+def merkle_levels(leaves):
+    """Every level of the tree, leaves first; an odd node is carried up unchanged."""
+    if not leaves:
+        raise ValueError("Cannot build a Merkle tree without leaves")
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        levels.append([hash_pair(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                       for i in range(0, len(level), 2)])
+    return levels
+
+
+def merkle_root(leaves):
+    return merkle_levels(leaves)[-1][0]
+
+
+def merkle_proof(levels, index):
+    """Sibling hashes from leaf ``index`` up to the root."""
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(level[sibling])
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf, proof, root):
+    node = leaf
+    for sibling in proof:
+        node = hash_pair(node, sibling)
+    return node == root
+
+
+def _hex(value):
+    return '0x' + bytes(value).hex()
+
+
+class RecordBatcher:
+    """Anchors a doctor's records as Merkle roots through the transaction queue and keeps their proofs.
+
+    ``add`` splits the records into batches of up to ``max_batch`` and
+    submits each one right away, signed with the key the caller passes in
+    (it is handed to the queue and never kept here). A batch whose
+    transaction fails is marked failed and its records have to be submitted
+    again.
+    """
+
+    def __init__(self, w3, contract, tx_queue, db_path, max_batch=256, poll_interval=1.0, lost_after=600):
+        self.w3 = w3
+        self.contract = contract
+        self.tx_queue = tx_queue
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.poll_interval = poll_interval
+        self.lost_after = lost_after
+
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._anchored = 0
+        self._failed = 0
+
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    # ---------------------- Submission ---------------------- #
+    def add(self, submitter, private_key, records):
+        """Anchor ``(patient, cid)`` pairs from ``submitter``; returns ``(root, job id)`` per submitted batch.
+
+        Raises ``ValueError`` for a CID that does not fit a ``bytes32`` digest.
+        A batch identical to one already anchored or in flight is skipped.
+        """
+        records = [(Web3.to_checksum_address(patient), cid) for patient, cid in records]
+        leaves = [record_leaf(patient, cid) for patient, cid in records]
+        submitted = []
+        with self._write_lock:
+            for start in range(0, len(records), self.max_batch):
+                batch = self._submit(submitter, private_key, records[start:start + self.max_batch],
+                                     leaves[start:start + self.max_batch])
+                if batch is not None:
+                    submitted.append(batch)
+        return submitted
+
+    def _submit(self, submitter, private_key, records, leaves):
+        conn = self._conn()
+        levels = merkle_levels(leaves)
+        root = _hex(levels[-1][0])
+        existing = conn.execute("SELECT status FROM batches WHERE root = ?", (root,)).fetchone()
+        if existing is not None and existing['status'] != 'failed':
+            # The same records in the same order were anchored before: nothing new to prove
+            return None
+
+        job_id = self.tx_queue.submit(
+            self.contract.functions.anchorRecordBatch([patient for patient, _ in records],
+                                                      [cid_to_digest(cid) for _, cid in records]),
+            {'from': submitter}, private_key, f"Anchor record batch ({len(records)} records)")
+        now = time.time()
+        with conn:
+            conn.execute("DELETE FROM leaves WHERE root = ?", (root,))
+            conn.execute(
+                "INSERT OR REPLACE INTO batches (root, submitter, count, created_at, job_id, status) "
+                "VALUES (?, ?, ?, ?, ?, 'submitted')",
+                (root, submitter, len(records), now, job_id))
+            conn.executemany(
+                "INSERT INTO leaves (submitter, patient, cid, added_at, root, position, proof) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(submitter, patient, cid, now, root, i, json.dumps([_hex(h) for h in merkle_proof(levels, i)]))
+                 for i, (patient, cid) in enumerate(records)])
+        return root, job_id
+
+    def refresh(self, roots=None):
+        """Settle submitted batches (or just ``roots``) from their transaction status.
+
+        Batches whose job this process does not know (sent before a restart, or
+        by another process sharing the store) are looked up on chain once
+        they are ``lost_after`` seconds old.
+        """
+        with self._write_lock:
+            conn = self._conn()
+            for batch in conn.execute("SELECT * FROM batches WHERE status = 'submitted'").fetchall():
+                if roots is not None and batch['root'] not in roots:
+                    continue
+                status = self.tx_queue.status(batch['job_id']) if batch['job_id'] else None
+                if status is not None and status['status'] not in FINAL_STATES:
+                    continue
+                if status is None and time.time() - batch['created_at'] < self.lost_after:
+                    continue
+                mined = status if status is not None and status['status'] == 'mined' else None
+                # A lost or failed transaction may still have been beaten to it by an identical batch
+                anchored = mined is not None or self.contract.functions.recordBatches(batch['root']).call()[1] != 0
+                with conn:
+                    if anchored:
+                        conn.execute(
+                            "UPDATE batches SET status = 'anchored', tx_hash = ?, block_number = ? WHERE root = ?",
+                            (mined and mined['tx_hash'], mined and mined['block_number'], batch['root']))
+                        self._anchored += 1
+                    else:
+                        logger.error(f"Record batch {batch['root']} was not anchored: "
+                                     f"{status['error'] if status else 'transaction lost'}")
+                        conn.execute("UPDATE batches SET status = 'failed' WHERE root = ?", (batch['root'],))
+                        self._failed += 1
+
+    # ---------------------- Proofs ---------------------- #
+    def proofs(self, patient, cid=None):
+        """Batched records of ``patient`` (optionally one ``cid``) with their roots, proofs and batch status."""
+        query = ("SELECT l.patient, l.cid, l.root, l.position, l.proof, b.submitter, b.count, b.status, "
+                 "b.created_at, b.tx_hash, b.block_number "
+                 "FROM leaves l JOIN batches b ON b.root = l.root WHERE l.patient = ?")
+        params = [patient]
+        if cid is not None:
+            query += " AND l.cid = ?"
+            params.append(cid)
+        rows = self._conn().execute(query + " ORDER BY l.id", params).fetchall()
+        return [{
+            'patient': row['patient'],
+            'cid': row['cid'],
+            'root': row['root'],
+            'position': row['position'],
+            'proof': json.loads(row['proof']),
+            'submitter': row['submitter'],
+            'count': row['count'],
+            'status': row['status'],
+            'created_at': row['created_at'],
+            'tx_hash': row['tx_hash'],
+            'block_number': row['block_number'],
+        } for row in rows]
+
+    def anchored_records(self, patient, offset=0, limit=-1):
+        """A page of ``patient``'s records in anchored batches, shaped like ``EventIndexer.anchored_records``.
+
+        The timestamp is when the batch was queued; the chain's block time is only in the logs.
+        """
+        rows = self._conn().execute(
+            "SELECT l.cid, l.root, l.position, b.created_at FROM leaves l JOIN batches b ON b.root = l.root "
+            "WHERE l.patient = ? AND b.status = 'anchored' ORDER BY l.id LIMIT ? OFFSET ?",
+            (patient, limit, offset)).fetchall()
+        return [{'ipfsHash': row['cid'], 'root': row['root'], 'position': row['position'],
+                 'timestamp': int(row['created_at'])} for row in rows]
+
+    def anchored_records_count(self, patient):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM leaves l JOIN batches b ON b.root = l.root "
+            "WHERE l.patient = ? AND b.status = 'anchored'", (patient,)).fetchone()[0]
+
+    def batch(self, root):
+        row = self._conn().execute("SELECT * FROM batches WHERE root = ?", (root,)).fetchone()
+        return dict(row) if row else None
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            'submitted': conn.execute("SELECT COUNT(*) FROM batches WHERE status = 'submitted'").fetchone()[0],
+            'anchored': self._anchored,
+            'failed': self._failed,
+        }
+
+    # ---------------------- Background loop ---------------------- #
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='medichain-record-batches', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Record batch refresh failed: {e}")
+            self._stop.wait(self.poll_interval)
@@ -0,0 +1,334 @@
+"""JSON-RPC provider spreading requests over several Ethereum nodes.
+
+    WEB3_PROVIDER_URLS=http://node-a:8545,http://node-b:8545,http://node-c:8545
+
+Reads go to the healthy node with the lowest probe latency. Writes, and the
+calls that must see them (nonces, transaction and receipt lookups), stay
+pinned to one node until it fails. A background thread probes every node's
+head with ``eth_blockNumber``: nodes more than ``max_lag`` blocks behind the
+best head stop serving reads, and a node failing ``failure_threshold``
+requests in a row is skipped (circuit open) for ``cooldown`` seconds. Probes
+ignore open circuits, so a recovered node is taken back by the next probe.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from web3.providers.base import JSONBaseProvider  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Answered by the node the transaction went to: its pending pool hands out
+# nonces and it knows the transaction before the others do.
+PINNED_METHODS = frozenset({
+    'eth_sendRawTransaction',
+    'eth_sendTransaction',
+    'eth_getTransactionCount',
+    'eth_getTransactionByHash',
+    'eth_getTransactionReceipt',
+})
+
+# Position of the block parameter of methods reading state at a block
+_BLOCK_PARAMS = {
+    'eth_call': 1,
+    'eth_estimateGas': 1,
+    'eth_getBalance': 1,
+    'eth_getCode': 1,
+    'eth_getStorageAt': 2,
+    'eth_getBlockByNumber': 0,
+}
+
+_HEADERS = {'Content-Type': 'application/json'}
+
+# Weight of the newest probe in the smoothed latency
+LATENCY_ALPHA = 0.3
+
+
+class NoHealthyEndpoint(ConnectionError):
+    """Raised when no endpoint could serve a request."""
+
+
+def _block_number(value):
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.startswith('0x'):
+        return int(value, 16)
+    return None  # 'latest', 'pending', block hashes...
+
+
+def _min_block(method, params):
+    """Block a read needs the node to have reached, when it names one."""
+    if method == 'eth_getLogs' and params:
+        return _block_number(params[0].get('toBlock'))
+    position = _BLOCK_PARAMS.get(method)
+    if position is None or len(params) <= position:
+        return None
+    return _block_number(params[position])
+
+
+class Endpoint:
+    """Routing state of one node."""
+
+    def __init__(self, uri):
+        self.uri = uri
+        self.latency = None  # smoothed probe round trip, seconds
+        self.head = None
+        self.lagging = False
+        self.failures = 0  # consecutive
+        self.open_until = 0.0
+        self.last_error = None
+
+    def closed(self, now):
+        """True while the circuit breaker lets requests through."""
+        return now >= self.open_until
+
+    def to_dict(self):
+        return {
+            'uri': self.uri,
+            'latency': self.latency,
+            'head': self.head,
+            'lagging': self.lagging,
+            'failures': self.failures,
+            'circuit_open': not self.closed(time.monotonic()),
+            'last_error': self.last_error,
+        }
+
+
+class MultiEndpointProvider(JSONBaseProvider):
+    """web3 provider routing each request to one of several HTTP endpoints.
+
+    A request failing on one endpoint (connection error, timeout, HTTP error
+    or unparsable body) is retried on the next; JSON-RPC errors such as
+    reverts are the node's answer and are returned as is. ``post_batch``
+    sends a raw JSON-RPC batch the same way (used by ``BatchReader``).
+    Reads naming a block go to nodes already known to have it.
+    """
+
+    def __init__(self, endpoint_uris, session=None, timeout=10, max_lag=2, failure_threshold=3,
+                 cooldown=30, probe_interval=5, probe_timeout=2):
+        super().__init__()
+        if not endpoint_uris:
+            raise ValueError("At least one RPC endpoint is required")
+        self.endpoints = [Endpoint(uri) for uri in endpoint_uris]
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.max_lag = max_lag
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.errors = 0
+        self.write_failovers = 0
+        self._writer = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __str__(self):
+        return f"MultiEndpointProvider<{', '.join(e.uri for e in self.endpoints)}>"
+
+    # ---------------------- Routing ---------------------- #
+    def read_order(self, min_block=None):
+        """Endpoints to try for a read, best first; open circuits are left out.
+
+        Nodes within ``max_lag`` of the best head come first, those known to
+        have reached ``min_block`` ahead of the rest, each group by latency.
+        """
+        now = time.monotonic()
+        with self._lock:
+            available = [e for e in self.endpoints if e.closed(now)]
+
+        def rank(endpoint):
+            behind = min_block is not None and (endpoint.head is None or endpoint.head < min_block)
+            latency = endpoint.latency if endpoint.latency is not None else float('inf')
+            return endpoint.lagging, behind, latency
+
+        return sorted(available, key=rank)
+
+    def read_endpoint(self, min_block=None):
+        """URI of the endpoint reads currently go to."""
+        order = self.read_order(min_block)
+        if not order:
+            raise NoHealthyEndpoint("Every RPC endpoint is failing")
+        return order[0].uri
+
+    def write_order(self):
+        """The pinned write endpoint first, then the others in read order."""
+        order = self.read_order()
+        with self._lock:
+            writer = self._writer
+        if writer in order:
+            order.remove(writer)
+            order.insert(0, writer)
+        return order
+
+    # ---------------------- Requests ---------------------- #
+    def make_request(self, method, params):
+        pinned = method in PINNED_METHODS
+        order = self.write_order() if pinned else self.read_order(_min_block(method, params))
+        endpoint, response = self._post(order, self.encode_rpc_request(method, params), pinned)
+        if method == 'eth_blockNumber' and _block_number(response.get('result')) is not None:
+            self._observe_head(endpoint, _block_number(response['result']))
+        return response
+
+    def post_batch(self, batch, min_block=None):
+        """Send a JSON-RPC batch (list of request dicts) to the best read endpoint.
+
+        A batch of pinned methods only (the transaction queue's receipt polls)
+        goes to the write endpoint, like each of its requests would alone.
+        """
+        pinned = bool(batch) and all(request['method'] in PINNED_METHODS for request in batch)
+        order = self.write_order() if pinned else self.read_order(min_block)
+        _, response = self._post(order, json.dumps(batch).encode(), pinned)
+        return response
+
+    def _post(self, order, data, pinned=False):
+        if not order:
+            raise NoHealthyEndpoint("Every RPC endpoint is failing (circuits open)")
+        error = None
+        for endpoint in order:
+            try:
+                response = self.session.post(endpoint.uri, data=data, headers=_HEADERS, timeout=self.timeout)
+                response.raise_for_status()
+                decoded = self.decode_rpc_response(response.content)
+            except (requests.RequestException, ValueError) as e:
+                error = e
+                self._failed(endpoint, e)
+                continue
+            self._succeeded(endpoint, pinned)
+            return endpoint, decoded
+        raise NoHealthyEndpoint(f"All RPC endpoints failed, last error: {error}") from error
+
+    def report_failure(self, uri, error):
+        """Count a failure another client (e.g. an async one) had talking to ``uri``."""
+        self._failed(next(e for e in self.endpoints if e.uri == uri), error)
+
+    def _failed(self, endpoint, error):
+        with self._lock:
+            self.errors += 1
+            endpoint.failures += 1
+            endpoint.last_error = str(error)
+            if endpoint.failures >= self.failure_threshold:
+                now = time.monotonic()
+                if endpoint.closed(now):
+                    logger.warning(f"RPC endpoint {endpoint.uri} failed {endpoint.failures} times, "
+                                   f"skipping it for {self.cooldown}s: {error}")
+                endpoint.open_until = now + self.cooldown
+
+    def _succeeded(self, endpoint, pinned=False):
+        with self._lock:
+            if endpoint.failures >= self.failure_threshold:
+                logger.info(f"RPC endpoint {endpoint.uri} recovered")
+            endpoint.failures = 0
+            endpoint.open_until = 0.0
+            if pinned and endpoint is not self._writer:
+                if self._writer is not None:
+                    self.write_failovers += 1
+                    logger.warning(f"Writes moved from {self._writer.uri} to {endpoint.uri}")
+                self._writer = endpoint
+
+    # ---------------------- Health ---------------------- #
+    def probe(self):
+        """Measure every endpoint's latency and head, then flag the ones lagging behind."""
+        for endpoint in self.endpoints:
+            data = self.encode_rpc_request('eth_blockNumber', [])
+            started = time.perf_counter()
+            try:
+                response = self.session.post(endpoint.uri, data=data, headers=_HEADERS, timeout=self.probe_timeout)
+                response.raise_for_status()
+                head = _block_number(self.decode_rpc_response(response.content).get('result'))
+                if head is None:
+                    raise ValueError("eth_blockNumber returned no block number")
+            except (requests.RequestException, ValueError) as e:
+                self._failed(endpoint, e)
+                continue
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                endpoint.head = head
+                if endpoint.latency is None:
+                    endpoint.latency = elapsed
+                else:
+                    endpoint.latency += LATENCY_ALPHA * (elapsed - endpoint.latency)
+            self._succeeded(endpoint)
+        with self._lock:
+            self._update_lag()
+        return [e.to_dict() for e in self.endpoints]
+
+    def _observe_head(self, endpoint, head):
+        with self._lock:
+            endpoint.head = head
+            self._update_lag()
+
+    def _update_lag(self):
+        """Flag endpoints more than ``max_lag`` blocks behind the best head (lock held)."""
+        best = max((e.head for e in self.endpoints if e.head is not None), default=None)
+        if best is None:
+            return
+        for e in self.endpoints:
+            lagging = e.head is None or best - e.head > self.max_lag
+            if lagging and not e.lagging and e.head is not None:
+                logger.warning(f"RPC endpoint {e.uri} is {best - e.head} blocks behind, not routing reads to it")
+            e.lagging = lagging
+
+    def start(self):
+        """Probe now and then every ``probe_interval`` seconds on a background thread."""
+        self.probe()
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='medichain-rpc-probe', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.probe_interval):
+            try:
+                self.probe()
+            except Exception as e:
+                logger.error(f"RPC endpoint probe failed: {e}")
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            heads = [e.head for e in self.endpoints if e.head is not None]
+            return {
+                'endpoints': len(self.endpoints),
+                'healthy': sum(1 for e in self.endpoints if e.closed(now) and not e.lagging),
+                'lagging': sum(1 for e in self.endpoints if e.lagging),
+                'open_circuits': sum(1 for e in self.endpoints if not e.closed(now)),
+                'head': max(heads, default=0),
+                'errors': self.errors,
+                'write_failovers': self.write_failovers,
+            }
+
+
+def provider_urls():
+    """Endpoints from ``WEB3_PROVIDER_URLS`` (comma-separated), else ``WEB3_PROVIDER_URL``."""
+    urls = os.getenv('WEB3_PROVIDER_URLS') or os.getenv('WEB3_PROVIDER_URL', 'http://127.0.0.1:7545')
+    return [url.strip() for url in urls.split(',') if url.strip()]
+
+
+def provider_from_env(session=None):
+    """``MultiEndpointProvider`` configured from the environment, probed once.
+
+    Call ``start()`` on it to keep probing in the background.
+    """
+    provider = MultiEndpointProvider(
+        provider_urls(),
+        session=session,
+        timeout=float(os.getenv('RPC_TIMEOUT', '10')),
+        max_lag=int(os.getenv('RPC_MAX_BLOCK_LAG', '2')),
+        failure_threshold=int(os.getenv('RPC_BREAKER_FAILURES', '3')),
+        cooldown=float(os.getenv('RPC_BREAKER_COOLDOWN', '30')),
+        probe_interval=float(os.getenv('RPC_PROBE_INTERVAL', '5')),
+    )
+    provider.probe()
+    return provider
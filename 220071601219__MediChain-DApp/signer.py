@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from eth_account import Account  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Forked workers inherit the loaded modules, so they start instantly and never
+# re-run the importing script; other platforms sign on the calling thread.
+FORK_AVAILABLE = 'fork' in multiprocessing.get_all_start_methods()
+
+
+class _AccountCache:
+    """LRU of ``LocalAccount`` objects keyed by a digest of the private key."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._accounts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, private_key):
+        key = hashlib.sha256(str(private_key).encode()).digest()
+        with self._lock:
+            account = self._accounts.get(key)
+            if account is not None:
+                self._accounts.move_to_end(key)
+                return account
+        # Key derivation is the expensive part; do it outside the lock
+        account = Account.from_key(private_key)
+        with self._lock:
+            self._accounts[key] = account
+            while len(self._accounts) > self.maxsize:
+                self._accounts.popitem(last=False)
+        return account
+
+
+# Per-process cache used inside pool workers
+_worker_accounts = None
+
+
+def _init_worker(cache_size):
+    global _worker_accounts
+    _worker_accounts = _AccountCache(cache_size)
+
+
+def _sign(tx, private_key):
+    return bytes(_worker_accounts.get(private_key).sign_transaction(tx).raw_transaction)
+
+
+def _ready():
+    return True
+
+
+class Signer:
+    """Signs and broadcasts transactions, optionally on a pool of worker processes.
+
+    secp256k1 key derivation and signing are CPU-bound and hold the GIL, so
+    with ``processes`` > 0 signing runs in forked worker processes and scales
+    across cores. Derived accounts are cached (per process) for the keys in
+    use, so a logged-in user's key is only derived once. Call ``start()``
+    before the importing program starts other threads: workers are forked
+    then, and forking a multi-threaded process can deadlock the children.
+    """
+
+    def __init__(self, w3, processes=0, cache_size=1024):
+        self.w3 = w3
+        self.processes = processes if FORK_AVAILABLE else 0
+        self.cache_size = cache_size
+        self.accounts = _AccountCache(cache_size)
+        self._pool = None
+
+    def start(self):
+        if self.processes and self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_worker,
+                initargs=(self.cache_size,),
+            )
+            # The first task forks every worker at once
+            self._pool.submit(_ready).result()
+        return self
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def account(self, private_key):
+        return self.accounts.get(private_key)
+
+    def address_of(self, private_key):
+        return self.account(private_key).address
+
+    def sign(self, tx, private_key):
+        """Raw signed transaction bytes."""
+        pool = self._pool
+        if pool is not None:
+            try:
+                return pool.submit(_sign, tx, private_key).result()
+            except BrokenProcessPool as e:
+                logger.error(f"Signing pool failed, signing in-process from now on: {e}")
+                self._pool = None
+        return bytes(self.account(private_key).sign_transaction(tx).raw_transaction)
+
+    def send(self, tx, private_key):
+        """Sign ``tx`` and broadcast it; returns the transaction hash."""
+        return self.w3.eth.send_raw_transaction(self.sign(tx, private_key))
@@ -4,7 +4,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     if (prefersDark) {
         document.body.classList.add('dark-mode');
-        toggleInput.checked = true;
+        if (toggleInput) toggleInput.checked = true;
     }
 
     if (toggleInput) {
@@ -14,4 +14,320 @@ document.addEventListener('DOMContentLoaded', function() {
             localStorage.setItem('dark-mode', isDark);
         });
     }
+
+    // Poll queued transactions and refresh the page once they are final
+    const jobs = document.querySelectorAll('[data-tx-job]');
+    jobs.forEach(function(el) {
+        pollJob(el);
+    });
+
+    // "Load more" buttons fetch the next page of a paged list and append it
+    document.querySelectorAll('[data-load-more]').forEach(function(button) {
+        button.addEventListener('click', function() {
+            loadMore(button);
+        });
+    });
+
+    // Contract activity pushed by the server patches the dashboard in place
+    const stream = document.querySelector('[data-event-stream]');
+    if (stream && window.EventSource) {
+        followEvents(stream);
+    }
 });
+
+function cell(row, text) {
+    const td = document.createElement('td');
+    td.textContent = text;
+    row.appendChild(td);
+    return td;
+}
+
+function ipfsLink(hash, className) {
+    const link = document.createElement('a');
+    link.href = '/ipfs/' + encodeURIComponent(hash);
+    link.target = '_blank';
+    link.textContent = hash;
+    if (className) link.className = className;
+    return link;
+}
+
+const pageRenderers = {
+    'records': function(button, tbody, record) {
+        const row = tbody.insertRow();
+        row.dataset.recordId = record.id;
+        cell(row, record.id);
+        cell(row, record.ipfsHash).className = 'record-hash';
+        const actions = cell(row, '');
+        const view = ipfsLink(record.ipfsHash, 'btn btn-sm btn-primary me-2');
+        view.textContent = 'View';
+        actions.appendChild(view);
+
+        const form = document.createElement('form');
+        form.action = button.dataset.deleteUrl;
+        form.method = 'post';
+        form.className = 'd-inline';
+        form.onsubmit = function() { return confirm('Are you sure you want to delete this medical record?'); };
+        [['patient_address', button.dataset.patientAddress], ['record_id', record.id]].forEach(function(field) {
+            const input = document.createElement('input');
+            input.type = 'hidden';
+            input.name = field[0];
+            input.value = field[1];
+            form.appendChild(input);
+        });
+        const submit = document.createElement('button');
+        submit.type = 'submit';
+        submit.className = 'btn btn-sm btn-danger';
+        submit.textContent = 'Delete';
+        form.appendChild(submit);
+        actions.appendChild(form);
+    },
+    'anchored': function(button, tbody, record) {
+        const row = tbody.insertRow();
+        cell(row, record.ipfsHash);
+        cell(row, record.root).className = 'text-break';
+        cell(row, record.timestamp);
+        const actions = cell(row, '');
+        const view = ipfsLink(record.ipfsHash, 'btn btn-sm btn-primary me-2');
+        view.textContent = 'View';
+        actions.appendChild(view);
+        const proof = document.createElement('a');
+        proof.href = button.dataset.verifyUrl + '&cid=' + encodeURIComponent(record.ipfsHash);
+        proof.target = '_blank';
+        proof.className = 'btn btn-sm btn-outline-secondary';
+        proof.textContent = 'Proof';
+        actions.appendChild(proof);
+    },
+    'events': function(button, tbody, event, id) {
+        const row = tbody.insertRow();
+        [id, event.actor, event.action, event.timestamp].forEach(function(value) { cell(row, value); });
+    },
+    'transactions': function(button, tbody, txn) {
+        const row = tbody.insertRow();
+        [txn.TransactionID, txn.Sender, txn.Receiver, txn.Value, txn.Settled ? 'Yes' : 'No'].forEach(function(value) {
+            cell(row, value);
+        });
+        const settle = cell(row, '');
+        if (!txn.Settled) {
+            const checkbox = document.createElement('input');
+            checkbox.type = 'checkbox';
+            checkbox.className = 'form-check-input';
+            checkbox.name = 'transaction_id';
+            checkbox.value = txn.TransactionID;
+            checkbox.setAttribute('form', 'settleForm');
+            settle.appendChild(checkbox);
+        }
+    },
+    'record-links': function(button, list, record) {
+        const item = document.createElement('li');
+        item.className = 'list-group-item';
+        item.dataset.recordId = record.id;
+        item.appendChild(ipfsLink(record.ipfsHash));
+        list.appendChild(item);
+    },
+    'anchored-links': function(button, list, record) {
+        const item = document.createElement('li');
+        item.className = 'list-group-item';
+        item.appendChild(ipfsLink(record.ipfsHash));
+        list.appendChild(item);
+    }
+};
+
+function loadMore(button) {
+    const cursor = parseInt(button.dataset.cursor, 10);
+    const url = button.dataset.url + (button.dataset.url.indexOf('?') === -1 ? '?' : '&') + 'cursor=' + cursor;
+    button.disabled = true;
+    fetch(url, { credentials: 'same-origin' })
+        .then(function(response) {
+            return response.json().then(function(items) {
+                return { items: items, next: response.headers.get('X-Next-Cursor') };
+            });
+        })
+        .then(function(page) {
+            const target = document.getElementById(button.dataset.target);
+            const container = target.tBodies ? target.tBodies[0] : target;
+            const render = pageRenderers[button.dataset.loadMore];
+            page.items.forEach(function(item, i) {
+                render(button, container, item, cursor + i + 1);
+            });
+            if (page.next === null) {
+                button.remove();
+            } else {
+                button.dataset.cursor = page.next;
+                button.disabled = false;
+            }
+        })
+        .catch(function() {
+            button.disabled = false;
+        });
+}
+
+function pollJob(el) {
+    fetch(el.dataset.statusUrl, { credentials: 'same-origin' })
+        .then(function(response) { return response.json(); })
+        .then(function(job) {
+            const statusEl = el.querySelector('.tx-status');
+            if (job.error && !job.status) {
+                el.remove();
+                return;
+            }
+            el.querySelector('.tx-description').textContent = job.description || job.id.slice(0, 8);
+            statusEl.textContent = job.status + (job.error ? ' (' + job.error + ')' : '');
+            if (job.status === 'mined') {
+                el.classList.replace('alert-info', 'alert-success');
+                if (job.indexed || job.index_timeout) {
+                    setTimeout(function() { window.location.reload(); }, 1000);
+                } else {
+                    // Mined but not indexed yet: reloading now would show the old dashboard
+                    setTimeout(function() { pollJob(el); }, 1000);
+                }
+            } else if (job.status === 'failed') {
+                el.classList.replace('alert-info', 'alert-danger');
+            } else {
+                setTimeout(function() { pollJob(el); }, 2000);
+            }
+        })
+        .catch(function() {
+            setTimeout(function() { pollJob(el); }, 5000);
+        });
+}
+
+function notify(el, text) {
+    const alert = document.createElement('div');
+    alert.className = 'alert alert-info py-2';
+    alert.textContent = text;
+    el.prepend(alert);
+    while (el.children.length > 5) {
+        el.lastElementChild.remove();
+    }
+}
+
+function recordList(row) {
+    let list = row.querySelector('ul.list-group:not([data-anchored])');
+    if (!list) {
+        list = document.createElement('ul');
+        list.className = 'list-group';
+        const empty = row.cells[2].querySelector('p');
+        if (empty) empty.remove();
+        row.cells[2].prepend(list);
+    }
+    return list;
+}
+
+function anchoredList(row) {
+    let list = row.querySelector('ul[data-anchored]');
+    if (!list) {
+        list = document.createElement('ul');
+        list.className = 'list-group mt-2';
+        list.dataset.anchored = '';
+        row.cells[2].appendChild(list);
+    }
+    return list;
+}
+
+const liveHandlers = {
+    'patient': {
+        'MedicalRecordUpdated': function(el, event) {
+            const table = document.getElementById('medicalRecordsTable');
+            if (!table) {
+                window.location.reload();
+                return;
+            }
+            notify(el, 'New medical record ' + event.ipfsHash);
+            // Records further down are fetched by "Load more" once the user gets there
+            if (document.querySelector('[data-load-more="records"]')) return;
+            pageRenderers.records(el, table.tBodies[0], { id: event.recordId, ipfsHash: event.ipfsHash });
+        },
+        'MedicalRecordDeleted': function(el, event) {
+            // Record ids are stable: only the deleted record's row goes
+            const row = document.querySelector('#medicalRecordsTable tr[data-record-id="' + event.recordId + '"]');
+            if (row) row.remove();
+            notify(el, 'Medical record ' + event.recordId + ' was deleted');
+        },
+        'MedicalRecordAnchored': function(el, event) {
+            const table = document.getElementById('anchoredRecordsTable');
+            if (!table) {
+                window.location.reload();
+                return;
+            }
+            notify(el, 'New anchored record ' + event.ipfsHash);
+            if (document.querySelector('[data-load-more="anchored"]')) return;
+            pageRenderers.anchored(el, table.tBodies[0], event);
+        },
+        'AccessGranted': function(el, event) {
+            notify(el, 'Access granted to doctor ' + event.doctor);
+        },
+        'AccessRevoked': function(el, event) {
+            notify(el, 'Access revoked from doctor ' + event.doctor);
+        }
+    },
+    'doctor': {
+        'MedicalRecordUpdated': function(el, event) {
+            const row = document.querySelector('tr[data-patient="' + event.patient + '"]');
+            if (!row) return;
+            notify(el, 'New medical record for ' + event.patient);
+            if (row.querySelector('[data-load-more]')) return;
+            pageRenderers['record-links'](el, recordList(row), { id: event.recordId, ipfsHash: event.ipfsHash });
+        },
+        'MedicalRecordDeleted': function(el, event) {
+            const row = document.querySelector('tr[data-patient="' + event.patient + '"]');
+            if (!row) return;
+            const item = row.querySelector('li[data-record-id="' + event.recordId + '"]');
+            if (item) item.remove();
+            notify(el, 'A medical record of ' + event.patient + ' was deleted');
+        },
+        'MedicalRecordAnchored': function(el, event) {
+            const row = document.querySelector('tr[data-patient="' + event.patient + '"]');
+            if (!row) return;
+            notify(el, 'New anchored record for ' + event.patient);
+            if (row.querySelector('[data-load-more="anchored-links"]')) return;
+            pageRenderers['anchored-links'](el, anchoredList(row), event);
+        },
+        'AccessGranted': function(el, event) {
+            notify(el, 'Patient ' + event.patient + ' granted you access');
+            const table = document.getElementById('patientsTable');
+            if (!table) {
+                window.location.reload();
+                return;
+            }
+            // New patients are listed last; other pages pick them up when opened
+            if (table.dataset.lastPage !== 'true' || document.querySelector('tr[data-patient="' + event.patient + '"]')) return;
+            const row = table.tBodies[0].insertRow();
+            row.dataset.patient = event.patient;
+            cell(row, '');
+            cell(row, event.patient);
+            cell(row, '');
+            const update = document.createElement('a');
+            update.href = el.dataset.updateUrl + '?patient_address=' + encodeURIComponent(event.patient);
+            update.className = 'btn btn-primary btn-sm';
+            update.textContent = 'Update Record';
+            cell(row, '').appendChild(update);
+            fetch(el.dataset.recordsUrl + '&patient_address=' + encodeURIComponent(event.patient), { credentials: 'same-origin' })
+                .then(function(response) { return response.json(); })
+                .then(function(records) {
+                    if (!Array.isArray(records) || !records.length) return;
+                    const list = recordList(row);
+                    records.forEach(function(record) { pageRenderers['record-links'](el, list, record); });
+                });
+        },
+        'AccessRevoked': function(el, event) {
+            const row = document.querySelector('tr[data-patient="' + event.patient + '"]');
+            if (row) row.remove();
+            notify(el, 'Patient ' + event.patient + ' revoked your access');
+        }
+    }
+};
+
+function followEvents(el) {
+    const handlers = liveHandlers[el.dataset.role] || {};
+    const source = new EventSource(el.dataset.eventStream);
+    Object.keys(handlers).forEach(function(name) {
+        source.addEventListener(name, function(message) {
+            handlers[name](el, JSON.parse(message.data));
+        });
+    });
+    // Events were missed (the page fell behind or was away too long)
+    source.addEventListener('reload', function() {
+        source.close();
+        window.location.reload();
+    });
+}
@@ -0,0 +1,77 @@
+import os
+import sys
+
+import pytest
+from eth_account import Account  # type: ignore
+from web3 import EthereumTesterProvider, Web3  # type: ignore
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from cid_codec import digest_to_cid  # noqa: E402
+
+
+def make_cid(seed):
+    """A CIDv0 that round-trips through the contract's ``bytes32`` digests."""
+    return digest_to_cid(Web3.keccak(text=f"record-{seed}"))
+
+
+@pytest.fixture
+def w3():
+    return Web3(EthereumTesterProvider())
+
+
+@pytest.fixture
+def funded_account(w3):
+    """Factory for fresh accounts with a known private key, funded and unlocked on the tester chain."""
+    def create(ether=100):
+        account = Account.create()
+        w3.provider.ethereum_tester.add_account(Web3.to_hex(account.key))
+        w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
+            {'from': w3.eth.accounts[0], 'to': account.address, 'value': Web3.to_wei(ether, 'ether')}))
+        return account
+    return create
+
+
+@pytest.fixture(scope='session')
+def compiled():
+    """ABI and bytecode of MediChain.sol; tests using it are skipped where solc cannot be installed."""
+    try:
+        from deploy_contract import SOLC_VERSION, compile_contract
+    except ImportError as e:
+        pytest.skip(f"py-solc-x unavailable: {e}")
+    try:
+        return compile_contract(os.path.join(APP_DIR, 'MediChain.sol'))
+    except Exception as e:
+        pytest.skip(f"solc {SOLC_VERSION} unavailable: {e}")
+
+
+@pytest.fixture
+def deploy(w3, compiled):
+    """Deploy MediChain from ``deployer`` (the migrator when ``migrating``); returns the contract."""
+    from deploy_contract import constructor_args
+
+    abi, bytecode = compiled
+
+    def deploy_from(deployer=None, store_audit_history=True, migrating=False):
+        factory = w3.eth.contract(abi=abi, bytecode=bytecode)
+        tx_hash = factory.constructor(*constructor_args(abi, store_audit_history, migrating)).transact(
+            {'from': deployer or w3.eth.accounts[0]})
+        address = w3.eth.wait_for_transaction_receipt(tx_hash)['contractAddress']
+        return w3.eth.contract(address=address, abi=abi)
+    return deploy_from
+
+
+@pytest.fixture
+def contract(deploy):
+    return deploy()
+
+
+@pytest.fixture
+def send(w3):
+    """Transact ``contract_fn`` from an unlocked account and return the receipt."""
+    def transact(contract_fn, sender):
+        receipt = w3.eth.wait_for_transaction_receipt(contract_fn.transact({'from': sender}))
+        assert receipt['status'] == 1
+        return receipt
+    return transact
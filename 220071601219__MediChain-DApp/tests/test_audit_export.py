@@ -0,0 +1,137 @@
+import csv
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+from web3 import Web3  # type: ignore
+
+import audit_export
+from audit_export import AuditExporter, block_time_range, encode_rows, parse_export_cursor
+
+DOCTOR = Web3.to_checksum_address('0x' + 'd0' * 20)
+ALICE = Web3.to_checksum_address('0x' + 'a1' * 20)
+BOB = Web3.to_checksum_address('0x' + 'b0' * 20)
+CAROL = Web3.to_checksum_address('0x' + 'c0' * 20)
+
+# On-chain audit histories: (actor, action, timestamp), appended in time order
+HISTORIES = {
+    ALICE: [(ALICE, 0, 100), (DOCTOR, 1, 110), (DOCTOR, 1, 120), (DOCTOR, 2, 130), (DOCTOR, 1, 140)],
+    BOB: [],
+    CAROL: [(CAROL, 0, 105), (DOCTOR, 1, 125)],
+}
+
+
+class FakeReader:
+    """Answers the exporter's ``BatchReader`` calls from ``HISTORIES``, recording them."""
+
+    calls = []
+
+    def __init__(self, w3, contract, session=None):
+        self.block = None
+
+    def pin(self):
+        self.block = 10
+        return self.block
+
+    def call_many(self, calls):
+        FakeReader.calls.extend(calls)
+        results = []
+        for fn_name, *args in calls:
+            if fn_name == 'getPatientListLength':
+                results.append(len(HISTORIES))
+            elif fn_name == 'patientList':
+                results.append(list(HISTORIES)[args[0]])
+            elif fn_name == 'getPatientEventsCount':
+                results.append(len(HISTORIES[args[0]]))
+            elif fn_name == 'getPatientEvent':
+                results.append(HISTORIES[args[0]][args[1]])
+            else:
+                patient, offset, limit = args
+                results.append(HISTORIES[patient][offset:offset + limit])
+        return results
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    monkeypatch.setattr(audit_export, 'BatchReader', FakeReader)
+    FakeReader.calls = []
+    return AuditExporter(None, None, page_size=2)
+
+
+def test_cursors_parse_per_mode():
+    assert parse_export_cursor('', True) == (0, 0)
+    assert parse_export_cursor('3:7', True) == (3, 7)
+    assert parse_export_cursor('7', False) == (0, 7)
+    for value, all_patients in (('7', True), ('x', False), ('-1', False)):
+        with pytest.raises(ValueError):
+            parse_export_cursor(value, all_patients)
+
+
+def test_every_patient_is_exported_in_pages(exporter):
+    rows = list(exporter.rows())
+    assert [(row['patient'], row['index'], row['cursor']) for row in rows] == \
+        [(ALICE, i, f"0:{i + 1}") for i in range(5)] + [(CAROL, 0, '2:1'), (CAROL, 1, '2:2')]
+    assert rows[3] == {'actor': DOCTOR, 'action': 2, 'timestamp': 130, 'patient': ALICE, 'index': 3,
+                       'cursor': '0:4'}
+    # Histories are read a page at a time
+    pages = [call for call in FakeReader.calls if call[0] == 'getPatientAuditHistoryRange']
+    assert [call[2] for call in pages if call[1] == ALICE] == [0, 2, 4]
+
+
+def test_an_export_resumes_after_its_cursor(exporter):
+    rows = list(exporter.rows())
+    resumed = list(exporter.rows(cursor=parse_export_cursor(rows[2]['cursor'], True)))
+    assert resumed == rows[3:]
+    single = list(exporter.rows(ALICE, cursor=parse_export_cursor('4', False)))
+    assert [(row['index'], row['cursor']) for row in single] == [(4, '5')]
+
+
+def test_time_ranges_skip_to_the_first_event(exporter):
+    rows = list(exporter.rows(ALICE, since=120, until=130))
+    assert [row['timestamp'] for row in rows] == [120, 130]
+    # Found by bisection, not by reading every event
+    probes = [call for call in FakeReader.calls if call[0] == 'getPatientEvent']
+    assert 0 < len(probes) <= 3
+    # and the export stops at the first page reaching past ``until``
+    assert [call[2] for call in FakeReader.calls if call[0] == 'getPatientAuditHistoryRange'] == [2, 4]
+
+
+def test_indexed_patients_are_read_from_the_indexer(exporter):
+    events = [{'actor': DOCTOR, 'action': 'create/update record', 'timestamp': t} for t in (1, 2, 3)]
+    exporter.indexer = SimpleNamespace(
+        ready=lambda: True, patient=lambda address: address == CAROL or None,
+        audit_history_count=lambda patient: len(events),
+        audit_history=lambda patient, offset, limit: events[offset:offset + limit])
+    rows = list(exporter.rows(CAROL))
+    assert [row['timestamp'] for row in rows] == [1, 2, 3]
+    assert not any(call[0] == 'getPatientAuditHistoryRange' for call in FakeReader.calls)
+
+
+def test_block_ranges_narrow_the_time_range():
+    timestamps = {5: 1000, 9: 2000}
+    w3 = SimpleNamespace(eth=SimpleNamespace(get_block=lambda number: {'timestamp': timestamps[number]}))
+    assert block_time_range(w3, 5, 9) == (1000, 2000)
+    assert block_time_range(w3, 5, 9, since=1500, until=2500) == (1500, 2000)
+    assert block_time_range(w3, since=1) == (1, None)
+
+
+def test_rows_encode_as_csv_and_ndjson(exporter):
+    rows = list(exporter.rows(CAROL))
+    table = list(csv.DictReader(io.StringIO(''.join(encode_rows(iter(rows), 'csv')))))
+    assert [(r['patient'], r['index'], r['timestamp'], r['cursor']) for r in table] == \
+        [(CAROL, '0', '105', '1'), (CAROL, '1', '125', '2')]
+    lines = [json.loads(line) for line in ''.join(encode_rows(iter(rows), 'ndjson')).splitlines()]
+    assert lines[1] == {'patient': CAROL, 'index': 1, 'actor': DOCTOR, 'action': 1, 'timestamp': 125,
+                        'cursor': '2'}
+
+
+def test_failures_mid_stream_end_the_ndjson_output():
+    def failing():
+        yield {'patient': ALICE, 'index': 0, 'actor': ALICE, 'action': 0, 'timestamp': 1, 'cursor': '1'}
+        raise ConnectionError('node went away')
+
+    errors = []
+    lines = ''.join(encode_rows(failing(), 'ndjson', on_error=errors.append)).splitlines()
+    assert json.loads(lines[-1]) == {'error': 'node went away'}
+    assert len(lines) == 2 and [str(e) for e in errors] == ['node went away']
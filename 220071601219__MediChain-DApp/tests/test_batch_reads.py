@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+import pytest
+from eth_abi import encode  # type: ignore
+from web3 import Web3  # type: ignore
+
+from batch_reads import BatchCallError, BatchReader, can_batch, post_batch, run_plan
+
+ADDRESS = Web3.to_checksum_address('0x' + 'cc' * 20)
+DOCTOR = Web3.to_checksum_address('0x' + 'd0' * 20)
+
+VIEW_ABI = [
+    {'type': 'function', 'name': 'getAllDoctors', 'stateMutability': 'view', 'inputs': [],
+     'outputs': [{'name': '', 'type': 'address[]'}]},
+    {'type': 'function', 'name': 'getPatientBasicInfo', 'stateMutability': 'view',
+     'inputs': [{'name': 'patient', 'type': 'address'}],
+     'outputs': [{'name': 'name', 'type': 'string'}, {'name': 'age', 'type': 'uint256'},
+                 {'name': 'exists', 'type': 'bool'}]},
+    {'type': 'function', 'name': 'getTransaction', 'stateMutability': 'view',
+     'inputs': [{'name': 'id', 'type': 'uint256'}],
+     'outputs': [{'name': '', 'type': 'tuple', 'components': [
+         {'name': 'sender', 'type': 'address'}, {'name': 'value', 'type': 'uint256'}]}]},
+]
+
+# What the fake node answers, by function name
+RESULTS = {
+    'getAllDoctors': (['address[]'], [[DOCTOR.lower()]]),
+    'getPatientBasicInfo': (['string', 'uint256', 'bool'], ['Alice', 30, True]),
+    'getTransaction': (['(address,uint256)'], [(DOCTOR.lower(), 7)]),
+}
+
+
+class Node:
+    """A provider answering ``eth_call`` batches from ``RESULTS``, in reverse order like some nodes do."""
+
+    def __init__(self, contract, fail=()):
+        self.selectors = {Web3.keccak(text=contract.get_function_by_name(name).signature)[:4].hex(): name
+                          for name in RESULTS}
+        self.fail = fail
+        self.batches = []
+
+    def post_batch(self, batch, min_block=None):
+        self.batches.append((batch, min_block))
+        responses = []
+        for request in reversed(batch):
+            name = self.selectors[request['params'][0]['data'][2:10]]
+            if name in self.fail:
+                responses.append({'jsonrpc': '2.0', 'id': request['id'], 'error': {'message': 'execution reverted'}})
+            else:
+                types, values = RESULTS[name]
+                responses.append({'jsonrpc': '2.0', 'id': request['id'], 'result': Web3.to_hex(encode(types, values))})
+        return responses
+
+
+@pytest.fixture
+def contract():
+    return Web3().eth.contract(address=ADDRESS, abi=VIEW_ABI)
+
+
+def reader_for(node, contract):
+    return BatchReader(SimpleNamespace(provider=node, codec=Web3().codec), contract)
+
+
+def test_calls_go_out_as_one_batch_pinned_to_a_block(contract):
+    node = Node(contract)
+    reader = reader_for(node, contract)
+    reader.pin(12)
+    doctors, info, txn = reader.call_many(
+        [('getAllDoctors',), ('getPatientBasicInfo', DOCTOR), ('getTransaction', 3)])
+    # Decoded in request order, with addresses checksummed like ContractFunction.call()
+    assert doctors == [DOCTOR]
+    assert info == ['Alice', 30, True]
+    assert txn == (DOCTOR, 7)
+    [(batch, min_block)] = node.batches
+    assert min_block == 12
+    assert {(r['method'], r['params'][1]) for r in batch} == {('eth_call', hex(12))}
+
+
+def test_a_failing_call_fails_the_batch(contract):
+    reader = reader_for(Node(contract, fail=('getAllDoctors',)), contract)
+    reader.pin(1)
+    with pytest.raises(BatchCallError, match='getAllDoctors'):
+        reader.call_many([('getPatientBasicInfo', DOCTOR), ('getAllDoctors',)])
+
+
+def test_plans_run_each_step_as_one_batch_at_the_first_block(contract):
+    node = Node(contract)
+    reader = reader_for(node, contract)
+    reader.pin(5)
+
+    def plan():
+        doctors = yield [('getAllDoctors',)]
+        assert doctors.block == 5
+        infos = yield [('getPatientBasicInfo', doctor) for doctor in doctors[0]] + [('getTransaction', 1)]
+        return [info[0] for info in infos[:-1]]
+
+    assert run_plan(plan(), reader) == ['Alice']
+    assert [min_block for _, min_block in node.batches] == [5, 5]
+
+
+def test_http_providers_post_batches_on_the_session():
+    class Session:
+        def post(self, url, json, timeout):
+            self.url = url
+            return SimpleNamespace(raise_for_status=lambda: None,
+                                   json=lambda: [{'id': r['id'], 'result': r['method']} for r in reversed(json)])
+
+    session = Session()
+    w3 = SimpleNamespace(provider=SimpleNamespace(endpoint_uri='http://node:8545'))
+    assert can_batch(w3)
+    responses = post_batch(w3, [('eth_blockNumber', []), ('eth_chainId', [])], session)
+    assert [r['result'] for r in responses] == ['eth_blockNumber', 'eth_chainId']
+    assert session.url == 'http://node:8545'
+    assert not can_batch(SimpleNamespace(provider=SimpleNamespace()))
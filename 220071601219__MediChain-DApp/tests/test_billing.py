@@ -0,0 +1,98 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from web3 import Web3  # type: ignore
+
+import billing
+from billing import (BILLING_CHUNK, chunked, format_balance, read_charges, submit_charges, submit_settlements,
+                     unsettled_transaction_ids)
+from cid_codec import EMPTY_DIGEST, cid_to_digest
+from conftest import make_cid
+from tx_queue import TransactionQueue
+
+ALICE = Web3.to_checksum_address('0x' + 'a1' * 20)
+BOB = Web3.to_checksum_address('0x' + 'b0' * 20)
+
+
+class Calls:
+    """``contract.functions`` stand-in: each function returns its name and arguments when built."""
+
+    def __getattr__(self, name):
+        return lambda *args: (name, *args)
+
+
+class Queue:
+    """``TransactionQueue`` stand-in keeping the submitted jobs."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, contract_fn, params, private_key, description):
+        self.jobs.append((contract_fn, params, description))
+        return f"job-{len(self.jobs)}"
+
+
+def test_charges_are_read_from_csv_and_json(tmp_path):
+    csv_path = tmp_path / 'charges.csv'
+    csv_path.write_text(f"patient_address,value\n {ALICE.lower()} ,100\n{BOB},2\n")
+    json_path = tmp_path / 'charges.json'
+    json_path.write_text(json.dumps([{'patient_address': ALICE, 'value': '100'}, {'patient_address': BOB, 'value': 2}]))
+    assert read_charges(str(csv_path)) == read_charges(str(json_path)) == [(ALICE, 100), (BOB, 2)]
+
+
+def test_charges_are_submitted_in_chunks():
+    tx_queue = Queue()
+    charges = [(ALICE, i + 1) for i in range(BILLING_CHUNK * 2 + 1)]
+    job_ids = submit_charges(tx_queue, SimpleNamespace(functions=Calls()), BOB, '0xkey', charges)
+    assert job_ids == ['job-1', 'job-2', 'job-3']
+    assert [description for _, _, description in tx_queue.jobs] == \
+        [f"Create charges ({BILLING_CHUNK})"] * 2 + ['Create charges (1)']
+    name, patients, values = tx_queue.jobs[2][0]
+    assert (name, patients, values) == ('createCharges', [ALICE], [len(charges)])
+    assert {params['from'] for _, params, _ in tx_queue.jobs} == {BOB}
+
+
+def test_settlements_are_submitted_in_id_order():
+    tx_queue = Queue()
+    ids = set(range(BILLING_CHUNK + 5, 0, -1))
+    submit_settlements(tx_queue, SimpleNamespace(functions=Calls()), ALICE, '0xkey', ids)
+    # Adjacent IDs share bitmap slots on chain
+    assert [call for call, _, _ in tx_queue.jobs] == \
+        [('settleTransactions', ids) for ids in chunked(sorted(ids))]
+
+
+def test_unsettled_ids_are_paged_through():
+    # Transactions layout: (id, sender, receiver, value, settled)
+    transactions = [(i, ALICE, BOB, 10, i % 3 == 0) for i in range(7)]
+    pages = []
+
+    def page(address, offset, limit):
+        pages.append(offset)
+        return SimpleNamespace(call=lambda: transactions[offset:offset + limit])
+    functions = SimpleNamespace(getTransactionsCount=lambda address: SimpleNamespace(call=lambda: len(transactions)),
+                                getTransactionsForAddressRange=page)
+    assert unsettled_transaction_ids(SimpleNamespace(functions=functions), ALICE, page_size=3) == [1, 2, 4, 5]
+    assert pages == [0, 3, 6]
+
+
+def test_charges_settle_on_chain(w3, contract, send, funded_account, capsys):
+    doctor, patient = funded_account(), funded_account()
+    send(contract.functions.register('Dr. House', 0, 2, 'house@example.com', EMPTY_DIGEST), doctor.address)
+    send(contract.functions.register('Alice', 30, 1, 'alice@example.com', cid_to_digest(make_cid(0))),
+         patient.address)
+    send(contract.functions.grantAccessToDoctor(doctor.address), patient.address)
+    tx_queue = TransactionQueue(w3, workers=1, poll_interval=0.05)
+    tx_queue.start()
+
+    charged = submit_charges(tx_queue, contract, doctor.address, doctor.key, [(patient.address, 5)] * 3)
+    assert billing.wait(tx_queue, charged)
+    assert format_balance(*contract.functions.getUnsettledBalance(patient.address).call()) == {'owed': 15, 'due': 0}
+    ids = unsettled_transaction_ids(contract, patient.address, page_size=2)
+    assert len(ids) == 3
+
+    settled = submit_settlements(tx_queue, contract, patient.address, patient.key, set(ids[:2]))
+    assert billing.wait(tx_queue, settled)
+    assert unsettled_transaction_ids(contract, doctor.address) == ids[2:]
+    assert format_balance(*contract.functions.getUnsettledBalance(doctor.address).call()) == {'owed': 0, 'due': 5}
+    assert capsys.readouterr().out.count('✅') == 2
@@ -0,0 +1,106 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+import blob_store
+from blob_store import CHUNK_SIZE, CidBuilder, LocalBlobStore, b58encode
+
+# CIDs `ipfs add` (CIDv0, default chunker) assigns to these files
+IPFS_ADD_CIDS = {
+    b'': 'QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH',
+    b'hello world': 'Qmf412jQZiuVUtdgnB36FXFX7xg5V6KEbSJ4dpQuhkLyfD',
+    b'hello world\n': 'QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o',
+}
+
+
+# Hand-assembled protobuf, field by field, as go-ipfs writes dag-pb / UnixFS nodes
+def varint(n):
+    out = b''
+    while n >= 0x80:
+        out += bytes([n & 0x7F | 0x80])
+        n >>= 7
+    return out + bytes([n])
+
+
+def leaf(chunk):
+    """A file chunk: PBNode{Data: Data{Type: File, Data: chunk, filesize}}; returns (bytes, filesize)."""
+    unixfs = b'\x08\x02' + b'\x12' + varint(len(chunk)) + chunk + b'\x18' + varint(len(chunk))
+    return b'\x0a' + varint(len(unixfs)) + unixfs, len(chunk)
+
+
+def parent(children):
+    """A node linking ``children`` (``(bytes, filesize, tsize)``), links first, each with an empty name."""
+    filesize = sum(c[1] for c in children)
+    node = b''
+    for data, _, tsize in children:
+        link = b'\x0a\x22' + multihash(data) + b'\x12\x00' + b'\x18' + varint(tsize)
+        node += b'\x12' + varint(len(link)) + link
+    unixfs = b'\x08\x02' + b'\x18' + varint(filesize) + b''.join(b'\x20' + varint(c[1]) for c in children)
+    node += b'\x0a' + varint(len(unixfs)) + unixfs
+    return node, filesize, len(node) + sum(c[2] for c in children)
+
+
+def multihash(data):
+    return b'\x12\x20' + hashlib.sha256(data).digest()
+
+
+def with_tsize(node):
+    data, filesize = node
+    return data, filesize, len(data)
+
+
+def put(store, data):
+    # Short reads, like a request stream, still make CHUNK_SIZE chunks
+    stream = io.BufferedReader(io.BytesIO(data), buffer_size=4096)
+    return store.put(stream)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalBlobStore(str(tmp_path))
+
+
+@pytest.mark.parametrize('data', list(IPFS_ADD_CIDS))
+def test_cids_match_ipfs_add(store, data):
+    assert put(store, data) == IPFS_ADD_CIDS[data]
+
+
+def test_multi_chunk_files_get_a_balanced_root(store):
+    first, second = b'a' * CHUNK_SIZE, b'b' * 10
+    root, _, _ = parent([with_tsize(leaf(first)), with_tsize(leaf(second))])
+    assert put(store, first + second) == b58encode(multihash(root))
+    # A full chunk is 262158 bytes as a node, the Tsize `ipfs add` links it with
+    assert len(leaf(first)[0]) == 262158
+
+
+def test_wide_files_get_another_level(monkeypatch):
+    monkeypatch.setattr(blob_store, 'MAX_LINKS', 2)
+    chunks = [b'x', b'y', b'z']
+    leaves = [with_tsize(leaf(chunk)) for chunk in chunks]
+    root, _, _ = parent([parent(leaves[:2]), parent(leaves[2:])])
+    builder = CidBuilder()
+    for chunk in chunks:
+        builder.add_chunk(chunk)
+    assert builder.finish() == b58encode(multihash(root))
+
+
+def test_blobs_are_stored_once(tmp_path):
+    class Replicator:
+        def __init__(self):
+            self.replicated = []
+
+        def replicate(self, cid, path, filename=None, content_type=None):
+            self.replicated.append((cid, filename))
+
+    replicator = Replicator()
+    store = LocalBlobStore(str(tmp_path), replicator=replicator)
+    data = os.urandom(CHUNK_SIZE + 1)
+    cid = put(store, data)
+    assert put(store, data) == cid
+    assert store.exists(cid)
+    with open(store.path(cid), 'rb') as f:
+        assert f.read() == data
+    assert [c for c, _ in replicator.replicated] == [cid]
+    assert os.listdir(store._tmp) == []
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import pytest
+from web3 import Web3  # type: ignore
+from web3.exceptions import ContractLogicError  # type: ignore
+
+from bulk_records import gas_bounded_chunks
+from conftest import make_cid
+
+SENDER = Web3.to_checksum_address('0x' + 'd0' * 20)
+PATIENTS = [Web3.to_checksum_address(f"0x{i:040x}") for i in range(1, 101)]
+
+
+class FakeContract:
+    """``createOrUpdateMedicalRecords`` costing ``base + per_record`` gas per record, like a linear batch."""
+
+    abi = []
+
+    def __init__(self, base=20000, per_record=30000, node_limit=None, gas_limit=30000000, reverts_for=()):
+        self.base = base
+        self.per_record = per_record
+        self.node_limit = node_limit
+        self.reverts_for = reverts_for
+        self.estimated = []
+        self.w3 = SimpleNamespace(eth=SimpleNamespace(get_block=lambda identifier: {'gasLimit': gas_limit}))
+        self.functions = SimpleNamespace(createOrUpdateMedicalRecords=self.batch)
+
+    def batch(self, patients, cids):
+        def estimate_gas(params):
+            self.estimated.append(len(patients))
+            if set(patients) & set(self.reverts_for):
+                raise ContractLogicError('execution reverted: Doctor not authorized')
+            if self.node_limit is not None and len(patients) > self.node_limit:
+                raise ValueError('exceeds block gas limit')
+            return self.base + self.per_record * len(patients)
+        return SimpleNamespace(estimate_gas=estimate_gas)
+
+
+def records(count):
+    return [(PATIENTS[i], make_cid(i)) for i in range(count)]
+
+
+def test_chunks_are_sized_to_the_gas_budget():
+    chunks = gas_bounded_chunks(FakeContract(), SENDER, records(50), max_gas=1000000)
+    # (20000 + 30000 * 27) * 1.2 = 996000 is the most that fits
+    assert [len(chunk) for chunk, _ in chunks] == [27, 23]
+    assert [gas for _, gas in chunks] == [996000, int((20000 + 30000 * 23) * 1.2)]
+    assert [record for chunk, _ in chunks for record in chunk] == records(50)
+
+
+def test_the_budget_defaults_to_a_share_of_the_block_gas_limit():
+    chunks = gas_bounded_chunks(FakeContract(per_record=100000, gas_limit=5000000), SENDER, records(100))
+    assert all(gas <= 4000000 for _, gas in chunks)
+    assert sum(len(chunk) for chunk, _ in chunks) == 100
+
+
+def test_failed_estimates_halve_the_batch():
+    contract = FakeContract(node_limit=40)
+    chunks = gas_bounded_chunks(contract, SENDER, records(100), max_gas=10 ** 9, max_items=100)
+    assert contract.estimated[:3] == [100, 50, 25]
+    assert [len(chunk) for chunk, _ in chunks] == [25] * 4
+
+
+def test_an_oversized_record_gets_a_batch_of_its_own():
+    chunks = gas_bounded_chunks(FakeContract(base=2000000), SENDER, records(2), max_gas=1000000)
+    assert [len(chunk) for chunk, _ in chunks] == [1, 1]
+
+
+def test_unauthorized_records_raise():
+    with pytest.raises(ContractLogicError):
+        gas_bounded_chunks(FakeContract(reverts_for=[PATIENTS[3]]), SENDER, records(10), max_gas=10 ** 9)
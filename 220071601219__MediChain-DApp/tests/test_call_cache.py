@@ -0,0 +1,134 @@
+from types import SimpleNamespace
+
+import pytest
+from web3 import Web3  # type: ignore
+
+from call_cache import MISS, CallCache
+from conftest import make_cid
+from cid_codec import cid_to_digest
+
+ACCESS_GRANTED = {
+    'type': 'event', 'name': 'AccessGranted', 'anonymous': False,
+    'inputs': [{'name': 'patient', 'type': 'address', 'indexed': True},
+               {'name': 'doctor', 'type': 'address', 'indexed': True}],
+}
+PATIENT = Web3.to_checksum_address('0x' + '11' * 20)
+OTHER = Web3.to_checksum_address('0x' + '22' * 20)
+DOCTOR = Web3.to_checksum_address('0x' + '33' * 20)
+
+
+def access_granted_log(patient, doctor):
+    topic = Web3.keccak(text='AccessGranted(address,address)')
+    return {'topics': [topic, bytes(12) + bytes.fromhex(patient[2:]), bytes(12) + bytes.fromhex(doctor[2:])]}
+
+
+@pytest.fixture
+def cache(w3):
+    contract = SimpleNamespace(abi=[ACCESS_GRANTED], address=Web3.to_checksum_address('0x' + 'cc' * 20))
+    cache = CallCache(w3, contract, refresh_interval=0)
+    cache.refresh()
+    return cache
+
+
+def head(w3):
+    return w3.eth.block_number
+
+
+def transfer(w3, value=1):
+    w3.eth.wait_for_transaction_receipt(
+        w3.eth.send_transaction({'from': w3.eth.accounts[0], 'to': w3.eth.accounts[1], 'value': value}))
+
+
+def test_lookups_count_hits_and_misses(w3, cache):
+    assert cache.lookup('getPatientAccessList', PATIENT) is MISS
+    cache.store('getPatientAccessList', (PATIENT,), [DOCTOR], head(w3))
+    # Addresses are checksummed in the key, so any spelling hits
+    assert cache.lookup('getPatientAccessList', PATIENT.lower()) == [DOCTOR]
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(w3):
+    contract = SimpleNamespace(abi=[], address=Web3.to_checksum_address('0x' + 'cc' * 20))
+    cache = CallCache(w3, contract, maxsize=2, refresh_interval=60)
+    cache.refresh()
+    for i in range(3):
+        cache.store('patientList', (i,), i, head(w3))
+    assert cache.lookup('patientList', 0) is MISS
+    assert cache.lookup('patientList', 2) == 2
+
+
+def test_logs_invalidate_entries_of_the_addresses_they_index(w3, cache):
+    block = head(w3)
+    cache.store('getPatientAccessList', (PATIENT,), [], block)
+    cache.store('getPatientAccessList', (OTHER,), [], block)
+    cache.store('isDoctorAuthorized', (OTHER, DOCTOR), False, block)
+    cache.store('getAllDoctors', (), [DOCTOR], block)
+    cache._invalidate([access_granted_log(PATIENT, DOCTOR)])
+    assert cache.lookup('getPatientAccessList', PATIENT) is MISS
+    # The doctor is indexed too, so every entry mentioning it goes
+    assert cache.lookup('isDoctorAuthorized', OTHER, DOCTOR) is MISS
+    # Global lookups can't be matched to addresses and are always dropped
+    assert cache.lookup('getAllDoctors') is MISS
+    assert cache.lookup('getPatientAccessList', OTHER) == []
+
+
+def test_unknown_events_invalidate_everything(w3, cache):
+    cache.store('getPatientAccessList', (OTHER,), [], head(w3))
+    cache._invalidate([{'topics': [Web3.keccak(text='Unknown(address)'), bytes(32)]}])
+    assert cache.stats()['size'] == 0
+
+
+def test_stale_reads_are_not_stored(w3, cache):
+    transfer(w3)
+    cache.refresh()
+    cache.store('getPatientAccessList', (PATIENT,), [], head(w3) - 1)
+    assert cache.lookup('getPatientAccessList', PATIENT) is MISS
+
+
+def test_reorg_drops_entries_read_on_orphaned_blocks(w3, cache):
+    ancestor = head(w3)
+    cache.store('getPatientAccessList', (OTHER,), [], ancestor)
+    snapshot = w3.testing.snapshot()
+    transfer(w3, value=1)
+    cache.refresh()
+    cache.store('getPatientAccessList', (PATIENT,), [DOCTOR], head(w3))
+
+    # Replace the block the second entry was read at
+    w3.testing.revert(snapshot)
+    transfer(w3, value=2)
+    cache.refresh()
+    assert cache.stats()['reorgs'] == 1
+    assert cache.lookup('getPatientAccessList', PATIENT) is MISS
+    assert cache.lookup('getPatientAccessList', OTHER) == []
+    assert cache.stats()['block'] == head(w3)
+
+
+def test_reads_racing_a_rollback_are_not_stored(w3, cache):
+    epoch = cache._epoch
+    snapshot = w3.testing.snapshot()
+    transfer(w3, value=1)
+    cache.refresh()
+    w3.testing.revert(snapshot)
+    transfer(w3, value=2)
+    cache.refresh()
+    cache.store('getPatientAccessList', (PATIENT,), [DOCTOR], head(w3), epoch)
+    assert cache.lookup('getPatientAccessList', PATIENT) is MISS
+
+
+def test_contract_logs_invalidate_cached_calls(w3, contract, send):
+    doctor, patient, other = w3.eth.accounts[1:4]
+    send(contract.functions.register('Dr. House', 50, 2, 'house@example.com', bytes(32)), doctor)
+    send(contract.functions.register('Alice', 30, 1, 'alice@example.com', cid_to_digest(make_cid(0))), patient)
+    send(contract.functions.register('Bob', 40, 1, 'bob@example.com', cid_to_digest(make_cid(1))), other)
+    cache = CallCache(w3, contract, refresh_interval=0)
+
+    assert cache.call('isDoctorAuthorized', patient, doctor) is False
+    assert cache.call('getPatientAccessList', other) == []
+    assert cache.call('isDoctorAuthorized', patient, doctor) is False
+    assert cache.stats()['hits'] == 1
+
+    send(contract.functions.grantAccessToDoctor(doctor), patient)
+    assert cache.call('isDoctorAuthorized', patient, doctor) is True
+    assert cache.call('getPatientAccessList', other) == []
+    stats = cache.stats()
+    assert (stats['hits'], stats['invalidations']) == (2, 1)
@@ -0,0 +1,82 @@
+import base64
+from types import SimpleNamespace
+
+import pytest
+from web3 import Web3  # type: ignore
+
+from cid_codec import (DAG_PB, EMPTY_DIGEST, SHA2_256, cid_to_digest, digest_to_cid, record_arg, record_cid,
+                       stores_digests)
+
+# The "hello world" example directory of the IPFS docs
+KNOWN_CID = 'QmYwAPJzv5CZsnA625s3Xf2nemtYgPpHdWEz79ojWnPbdG'
+
+
+def cid_v1(digest, codec=DAG_PB):
+    data = bytes([1, codec, SHA2_256, 32]) + digest
+    return 'b' + base64.b32encode(data).decode().lower().rstrip('=')
+
+
+def record_abi(record_type):
+    return [{'type': 'function', 'name': 'createOrUpdateMedicalRecord',
+             'inputs': [{'name': '_patient', 'type': 'address'}, {'name': '_ipfsHash', 'type': record_type}]}]
+
+
+def test_cid_v0_round_trip():
+    digest = cid_to_digest(KNOWN_CID)
+    assert len(digest) == 32
+    assert digest_to_cid(digest) == KNOWN_CID
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_digest_round_trip(seed):
+    digest = bytes(Web3.keccak(text=str(seed)))
+    cid = digest_to_cid(digest)
+    assert cid.startswith('Qm')
+    assert cid_to_digest(cid) == digest
+
+
+def test_surrounding_whitespace_is_ignored():
+    assert cid_to_digest(f"  {KNOWN_CID}\n") == cid_to_digest(KNOWN_CID)
+
+
+def test_cid_v1_is_rejected_for_writes():
+    with pytest.raises(ValueError, match='Only CIDv0'):
+        cid_to_digest(cid_v1(cid_to_digest(KNOWN_CID)))
+
+
+def test_cid_v1_reads_back_as_the_v0_of_the_same_content():
+    digest = cid_to_digest(KNOWN_CID)
+    assert cid_to_digest(cid_v1(digest), allow_v1=True) == digest
+
+
+def test_raw_codec_cid_v1_is_rejected_even_for_migrations():
+    with pytest.raises(ValueError, match='dag-pb'):
+        cid_to_digest(cid_v1(cid_to_digest(KNOWN_CID), codec=0x55), allow_v1=True)
+
+
+@pytest.mark.parametrize('cid', ['', 'Qm0OIl', 'QmYwAPJzv5CZsnA625s3Xf2nemtYgPpHdWEz79ojWnPb'])
+def test_invalid_cids_are_rejected(cid):
+    with pytest.raises(ValueError):
+        cid_to_digest(cid)
+
+
+def test_digest_must_be_32_bytes():
+    with pytest.raises(ValueError):
+        digest_to_cid(bytes(31))
+
+
+def test_record_cid():
+    assert record_cid(EMPTY_DIGEST) == ''
+    assert record_cid(cid_to_digest(KNOWN_CID)) == KNOWN_CID
+    # Deployments from before the switch return the CID string itself
+    assert record_cid(KNOWN_CID) == KNOWN_CID
+
+
+def test_record_arg_follows_the_deployment():
+    digests = SimpleNamespace(abi=record_abi('bytes32'))
+    strings = SimpleNamespace(abi=record_abi('string'))
+    assert stores_digests(digests)
+    assert not stores_digests(strings)
+    assert record_arg(digests, KNOWN_CID) == cid_to_digest(KNOWN_CID)
+    assert record_arg(digests, '') == EMPTY_DIGEST
+    assert record_arg(strings, KNOWN_CID) == KNOWN_CID
@@ -0,0 +1,264 @@
+"""MediChain.sol on eth-tester (skipped where solc cannot be installed)."""
+from types import SimpleNamespace
+
+import pytest
+from web3.exceptions import ContractLogicError  # type: ignore
+
+from cid_codec import EMPTY_DIGEST, cid_to_digest, record_cid
+from conftest import make_cid
+from record_batches import merkle_levels, merkle_proof, merkle_root, record_leaf
+
+# getTransaction / Transactions fields
+ID, SENDER, RECEIVER, VALUE, SETTLED = range(5)
+
+
+@pytest.fixture
+def users(w3):
+    accounts = w3.eth.accounts
+    return SimpleNamespace(doctor=accounts[1], other_doctor=accounts[2], patients=accounts[3:6],
+                           stranger=accounts[6])
+
+
+@pytest.fixture
+def registered(contract, send, users):
+    """Two doctors and three patients; every patient has granted the first doctor access."""
+    send(contract.functions.register('Dr. House', 0, 2, 'house@example.com', EMPTY_DIGEST), users.doctor)
+    send(contract.functions.register('Dr. Wilson', 0, 2, 'wilson@example.com', EMPTY_DIGEST), users.other_doctor)
+    for i, patient in enumerate(users.patients):
+        send(contract.functions.register(f'Patient {i}', 30 + i, 1, f'patient{i}@example.com',
+                                         cid_to_digest(make_cid(f'initial-{i}'))), patient)
+        send(contract.functions.grantAccessToDoctor(users.doctor), patient)
+    return contract
+
+
+def digests(*seeds):
+    return [cid_to_digest(make_cid(seed)) for seed in seeds]
+
+
+# ---------------------- Accounts and access ---------------------- #
+def test_registration(registered, users):
+    patient = users.patients[0]
+    assert registered.functions.getPatientBasicInfo(patient).call() == ['Patient 0', 'patient0@example.com', 30,
+                                                                        True, False]
+    assert registered.functions.lookupEmail(registered.functions.emailKey(' Patient0@Example.com ').call()).call() \
+        == [patient, 1, 'Patient 0']
+    assert registered.functions.getAllDoctors().call() == [users.doctor, users.other_doctor]
+    assert [record_cid(r) for r in registered.functions.getMedicalRecords(patient).call()] == [make_cid('initial-0')]
+
+
+def test_duplicate_email_is_rejected(registered, users):
+    with pytest.raises(ContractLogicError, match='Email already registered'):
+        registered.functions.register('Copy', 40, 1, 'HOUSE@example.com', digests(0)[0]).transact(
+            {'from': users.stranger})
+
+
+def test_access_grant_and_revoke(registered, send, users):
+    patient = users.patients[0]
+    assert registered.functions.isDoctorAuthorized(patient, users.doctor).call()
+    send(registered.functions.grantAccessToDoctor(users.other_doctor), patient)
+    assert registered.functions.getPatientAccessList(patient).call() == [users.doctor, users.other_doctor]
+    send(registered.functions.revokeAccessToDoctor(users.doctor), patient)
+    assert not registered.functions.isDoctorAuthorized(patient, users.doctor).call()
+    assert registered.functions.getPatientAccessList(patient).call() == [users.other_doctor]
+    assert patient not in registered.functions.getDoctorAccessList(users.doctor).call()
+
+
+# ---------------------- Records ---------------------- #
+def test_record_ids_survive_deletes(registered, send, users):
+    patient = users.patients[0]
+    send(registered.functions.createOrUpdateMedicalRecords([patient] * 4, digests(1, 2, 3, 4)), users.doctor)
+    send(registered.functions.deleteMedicalRecord(patient, 2), users.doctor)
+    assert registered.functions.getMedicalRecordsCount(patient).call() == 4
+    assert registered.functions.getNextRecordId(patient).call() == 5
+    assert registered.functions.getMedicalRecords(patient).call()[2] == EMPTY_DIGEST
+
+    ids, records, next_id = registered.functions.getMedicalRecordsRange(patient, 0, 2).call()
+    assert (ids, next_id) == ([0, 1], 2)
+    ids, records, next_id = registered.functions.getMedicalRecordsRange(patient, next_id, 2).call()
+    assert (ids, records, next_id) == ([3, 4], digests(3, 4), 0)
+
+    with pytest.raises(ContractLogicError, match='Record already deleted'):
+        registered.functions.deleteMedicalRecord(patient, 2).transact({'from': patient})
+
+
+def test_records_need_an_authorized_doctor(registered, users):
+    with pytest.raises(ContractLogicError, match='Doctor not authorized'):
+        registered.functions.createOrUpdateMedicalRecord(users.patients[0], digests(1)[0]).transact(
+            {'from': users.other_doctor})
+
+
+def test_records_read_back_as_the_stored_cid(registered, send, users):
+    patient = users.patients[1]
+    cid = make_cid('round-trip')
+    receipt = send(registered.functions.createOrUpdateMedicalRecord(patient, cid_to_digest(cid)), users.doctor)
+    [event] = registered.events.MedicalRecordUpdated().process_receipt(receipt)
+    assert record_cid(event['args']['ipfsHash']) == cid
+    assert record_cid(registered.functions.getMedicalRecords(patient).call()[-1]) == cid
+
+
+# ---------------------- Anchored batches ---------------------- #
+def anchor(registered, send, doctor, records):
+    patients, cids = zip(*records)
+    return send(registered.functions.anchorRecordBatch(list(patients), [cid_to_digest(c) for c in cids]), doctor)
+
+
+@pytest.mark.parametrize('count', [1, 2, 5, 8])
+def test_anchored_root_matches_the_offchain_tree(registered, send, users, count):
+    records = [(users.patients[i % 3], make_cid(f'batch-{i}')) for i in range(count)]
+    leaves = [record_leaf(patient, cid) for patient, cid in records]
+    for (patient, cid), leaf in zip(records, leaves):
+        assert registered.functions.recordLeaf(patient, cid_to_digest(cid)).call() == leaf
+
+    receipt = anchor(registered, send, users.doctor, records)
+    root = merkle_root(leaves)
+    [batch] = registered.events.RecordBatchAnchored().process_receipt(receipt)
+    assert (batch['args']['root'], batch['args']['submitter'], batch['args']['count']) == (root, users.doctor, count)
+    submitter, timestamp, stored_count = registered.functions.recordBatches(root).call()
+    assert (submitter, stored_count) == (users.doctor, count) and timestamp > 0
+
+    anchored = registered.events.MedicalRecordAnchored().process_receipt(receipt)
+    assert [(e['args']['patient'], record_cid(e['args']['ipfsHash']), e['args']['position']) for e in anchored] == \
+        [(patient, cid, i) for i, (patient, cid) in enumerate(records)]
+    assert {e['args']['root'] for e in anchored} == {root}
+
+    levels = merkle_levels(leaves)
+    for i, (patient, cid) in enumerate(records):
+        ok, by, _ = registered.functions.verifyRecordInclusion(root, patient, cid_to_digest(cid),
+                                                               merkle_proof(levels, i)).call()
+        assert (ok, by) == (True, users.doctor)
+
+
+def test_inclusion_rejects_other_records_and_unknown_roots(registered, send, users):
+    records = [(users.patients[0], make_cid('a')), (users.patients[1], make_cid('b'))]
+    leaves = [record_leaf(patient, cid) for patient, cid in records]
+    anchor(registered, send, users.doctor, records)
+    root, proof = merkle_root(leaves), merkle_proof(merkle_levels(leaves), 0)
+    verify = registered.functions.verifyRecordInclusion
+    assert not verify(root, users.patients[1], cid_to_digest(make_cid('a')), proof).call()[0]
+    assert not verify(root, users.patients[0], cid_to_digest(make_cid('c')), proof).call()[0]
+    assert not verify(b'\x01' * 32, users.patients[0], cid_to_digest(make_cid('a')), proof).call()[0]
+
+
+def test_anchoring_checks_access_and_duplicates(registered, send, users):
+    unauthorized = [users.patients[0]], digests('x')
+    with pytest.raises(ContractLogicError, match='Doctor not authorized'):
+        registered.functions.anchorRecordBatch(*unauthorized).transact({'from': users.other_doctor})
+    with pytest.raises(ContractLogicError, match='Only registered doctors'):
+        registered.functions.anchorRecordBatch(*unauthorized).transact({'from': users.stranger})
+    with pytest.raises(ContractLogicError, match='Batch is empty'):
+        registered.functions.anchorRecordBatch([], []).transact({'from': users.doctor})
+    with pytest.raises(ContractLogicError, match='IPFS hash is required'):
+        registered.functions.anchorRecordBatch([users.patients[0]], [EMPTY_DIGEST]).transact({'from': users.doctor})
+
+    records = [(users.patients[0], make_cid('dup'))]
+    anchor(registered, send, users.doctor, records)
+    with pytest.raises(ContractLogicError, match='Batch already anchored'):
+        registered.functions.anchorRecordBatch([users.patients[0]], digests('dup')).transact({'from': users.doctor})
+
+
+# ---------------------- Billing ---------------------- #
+def test_unsettled_balance_tracks_charges_and_settlements(registered, send, users):
+    first, second, _ = users.patients
+    send(registered.functions.createCharges([first, second, first], [100, 200, 300]), users.doctor)
+    balance = registered.functions.getUnsettledBalance
+    assert balance(first).call() == [400, 0]
+    assert balance(users.doctor).call() == [0, 600]
+
+    send(registered.functions.settleTransactions([1, 3]), first)
+    assert balance(first).call() == [0, 0]
+    assert balance(users.doctor).call() == [0, 200]
+    assert [t[SETTLED] for t in registered.functions.getTransactionsForAddress(users.doctor).call()] == \
+        [True, False, True]
+
+    # Settling again changes nothing
+    send(registered.functions.settleTransaction(1), users.doctor)
+    assert balance(users.doctor).call() == [0, 200]
+
+
+def test_get_transaction_reads_the_settled_flag(registered, send, users):
+    patient = users.patients[0]
+    send(registered.functions.createCharges([patient], [50]), users.doctor)
+    assert registered.functions.getTransaction(1).call() == (1, patient, users.doctor, 50, False)
+    assert registered.functions.isTransactionSettled(1).call() is False
+    send(registered.functions.settleTransaction(1), patient)
+    assert registered.functions.getTransaction(1).call()[SETTLED] is True
+    assert registered.functions.getTransaction(99).call()[ID] == 0
+
+
+def test_only_parties_settle_and_doctors_charge_their_patients(registered, send, users):
+    send(registered.functions.createCharges([users.patients[0]], [50]), users.doctor)
+    with pytest.raises(ContractLogicError, match='Not authorized to settle'):
+        registered.functions.settleTransaction(1).transact({'from': users.patients[1]})
+    with pytest.raises(ContractLogicError, match='Doctor not authorized'):
+        registered.functions.createCharges([users.patients[0]], [50]).transact({'from': users.other_doctor})
+    with pytest.raises(ContractLogicError, match='Charge must be greater than 0'):
+        registered.functions.createCharges([users.patients[0]], [0]).transact({'from': users.doctor})
+
+
+# ---------------------- Dashboards ---------------------- #
+def test_patient_overview(registered, send, users):
+    patient = users.patients[0]
+    send(registered.functions.createOrUpdateMedicalRecords([patient] * 3, digests(1, 2, 3)), users.doctor)
+    send(registered.functions.createCharges([patient], [10]), users.doctor)
+    (name, email, age, exists, _, records_total, record_ids, records, records_next, events_total, events,
+     transactions_total, transactions, doctors) = registered.functions.getPatientOverview(patient, 0, 0, 0, 2).call()
+    assert (name, email, age, exists) == ('Patient 0', 'patient0@example.com', 30, True)
+    assert (records_total, record_ids, records_next) == (4, [0, 1], 2)
+    assert records == [cid_to_digest(make_cid('initial-0'))] + digests(1)
+    assert (events_total, [e[1] for e in events]) == (4, ['register', 'create/update record'])
+    assert (transactions_total, transactions[0][VALUE]) == (1, 10)
+    assert doctors == [(users.doctor, 'Dr. House'), (users.other_doctor, 'Dr. Wilson')]
+
+
+def test_doctor_overview(registered, send, users):
+    send(registered.functions.createOrUpdateMedicalRecords([users.patients[1]] * 2, digests(1, 2)), users.doctor)
+    (name, _, exists, patients_total, patients, transactions_total, transactions) = \
+        registered.functions.getDoctorOverview(users.doctor, 1, 2, 0, 5).call()
+    assert (name, exists, patients_total, transactions_total, transactions) == ('Dr. House', True, 3, 0, [])
+    assert [p[0] for p in patients] == users.patients[1:]
+    patient, patient_name, records_count, record_ids, records, records_next = patients[0]
+    assert (patient_name, records_count, record_ids, records_next) == ('Patient 1', 3, [0, 1], 2)
+
+
+# ---------------------- Migration ---------------------- #
+@pytest.fixture
+def migrating(deploy):
+    """A contract deployed for a migration, with ``accounts[0]`` as migrator."""
+    return deploy(migrating=True)
+
+
+def test_plain_deploys_have_no_migrator(contract, send, users, w3):
+    assert int(contract.functions.migrator().call(), 16) == 0
+    send(contract.functions.register('Dr. House', 0, 2, 'house@example.com', EMPTY_DIGEST), users.doctor)
+    send(contract.functions.register('Patient 0', 30, 1, 'patient0@example.com', digests(0)[0]), users.patients[0])
+    with pytest.raises(ContractLogicError, match='Only the migrator'):
+        contract.functions.migrateAccess(users.patients[0], [users.doctor]).transact({'from': w3.eth.accounts[0]})
+
+
+def test_migrator_imports_accounts_records_and_access(migrating, send, users, w3):
+    contract = migrating
+    migrator = w3.eth.accounts[0]
+    patient = users.patients[0]
+    send(contract.functions.migrateDoctor(users.doctor, 'Dr. House', 'house@example.com'), migrator)
+    send(contract.functions.migratePatient(patient, 'Patient 0', 'patient0@example.com', 30), migrator)
+    receipt = send(contract.functions.migrateRecords(patient, digests(1) + [EMPTY_DIGEST] + digests(3)), migrator)
+    send(contract.functions.migrateAccess(patient, [users.doctor]), migrator)
+
+    # A zero digest imports a deleted record, so the ids carry over
+    assert contract.functions.getNextRecordId(patient).call() == 3
+    assert contract.functions.getMedicalRecordsCount(patient).call() == 2
+    assert [e['args']['recordId'] for e in contract.events.MedicalRecordUpdated().process_receipt(receipt)] == [0, 2]
+    assert contract.functions.isDoctorAuthorized(patient, users.doctor).call()
+
+
+def test_migration_is_closed_to_others_and_after_finishing(migrating, send, users, w3):
+    contract = migrating
+    migrator = w3.eth.accounts[0]
+    assert contract.functions.migrator().call() == migrator
+    with pytest.raises(ContractLogicError, match='Only the migrator'):
+        contract.functions.migratePatient(users.stranger, 'Eve', 'eve@example.com', 30).transact(
+            {'from': users.stranger})
+    send(contract.functions.finishMigration(), migrator)
+    assert int(contract.functions.migrator().call(), 16) == 0
+    with pytest.raises(ContractLogicError, match='Only the migrator'):
+        contract.functions.migratePatient(users.stranger, 'Eve', 'eve@example.com', 30).transact({'from': migrator})
@@ -0,0 +1,41 @@
+import pytest
+from web3 import Web3  # type: ignore
+
+from email_index import email_key, normalize_email
+
+EMAILS = [
+    'alice@example.com',
+    '  Alice@Example.COM\t\r\n',
+    'ÉLODIE@Example.com',        # non-ASCII letters keep their case
+    '\x0balice@example.com\xa0',  # vertical tab and no-break space are not trimmed
+    ' \t ',
+    '',
+]
+
+
+def contract_email_key(email):
+    """``MediChain.emailKey`` transliterated loop by loop."""
+    raw = email.encode()
+    start, end = 0, len(raw)
+    while start < end and raw[start] in (0x20, 0x09, 0x0a, 0x0d):
+        start += 1
+    while end > start and raw[end - 1] in (0x20, 0x09, 0x0a, 0x0d):
+        end -= 1
+    normalized = bytes(c + 32 if 0x41 <= c <= 0x5A else c for c in raw[start:end])
+    return bytes(Web3.keccak(normalized))
+
+
+@pytest.mark.parametrize('email', EMAILS)
+def test_keys_follow_the_contract_normalization(email):
+    assert email_key(email) == contract_email_key(email)
+
+
+def test_spellings_of_one_address_share_a_key():
+    assert email_key('  Alice@Example.COM\n') == email_key('alice@example.com')
+    assert normalize_email(' Bob@Example.com ') == b'bob@example.com'
+    assert email_key('élodie@example.com') != email_key('Élodie@example.com')
+
+
+@pytest.mark.parametrize('email', EMAILS)
+def test_keys_match_the_deployed_contract(contract, email):
+    assert contract.functions.emailKey(email).call() == email_key(email)
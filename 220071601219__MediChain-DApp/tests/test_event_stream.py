@@ -0,0 +1,171 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from eth_abi import encode  # type: ignore
+from web3 import Web3  # type: ignore
+
+from cid_codec import cid_to_digest
+from conftest import make_cid
+from event_stream import EventBroadcaster, Subscription, format_sse, parse_event_id, stream_events
+
+ADDRESS = Web3.to_checksum_address('0x' + 'cc' * 20)
+ALICE = Web3.to_checksum_address('0x' + 'a1' * 20)
+BOB = Web3.to_checksum_address('0x' + 'b0' * 20)
+DOCTOR = Web3.to_checksum_address('0x' + 'd0' * 20)
+
+EVENTS = {
+    'MedicalRecordUpdated': [('patient', 'address', True), ('recordId', 'uint256', False),
+                             ('ipfsHash', 'bytes32', False), ('timestamp', 'uint256', False)],
+    'MedicalRecordDeleted': [('patient', 'address', True), ('recordId', 'uint256', False),
+                             ('timestamp', 'uint256', False)],
+    'AccessGranted': [('patient', 'address', True), ('doctor', 'address', True)],
+    'AccessRevoked': [('patient', 'address', True), ('doctor', 'address', True)],
+}
+ABI = [{'type': 'event', 'name': name, 'anonymous': False,
+        'inputs': [{'name': n, 'type': t, 'indexed': indexed} for n, t, indexed in inputs]}
+       for name, inputs in EVENTS.items()]
+
+
+class Node:
+    """``w3`` stand-in: a block number and MediChain logs served through topic-filtered ``get_logs``."""
+
+    def __init__(self):
+        self.logs = []
+        self.queries = []
+        self.eth = SimpleNamespace(block_number=0, get_logs=self.get_logs)
+
+    def emit(self, name, **args):
+        inputs = EVENTS[name]
+        signature = f"{name}({','.join(t for _, t, _ in inputs)})"
+        block = self.eth.block_number = self.eth.block_number + 1
+        self.logs.append({
+            'address': ADDRESS, 'blockNumber': block, 'logIndex': 0, 'transactionIndex': 0,
+            'blockHash': Web3.keccak(block), 'transactionHash': Web3.keccak(text=f"tx-{block}"), 'removed': False,
+            'topics': [Web3.keccak(text=signature)] + [encode([t], [args[n]]) for n, t, indexed in inputs if indexed],
+            'data': encode([t for _, t, indexed in inputs if not indexed],
+                           [args[n] for n, _, indexed in inputs if not indexed]),
+        })
+        return f"{block}:0"
+
+    def record(self, patient, record_id):
+        return self.emit('MedicalRecordUpdated', patient=patient, recordId=record_id,
+                         ipfsHash=cid_to_digest(make_cid(record_id)), timestamp=1000 + record_id)
+
+    def get_logs(self, params):
+        self.queries.append(params)
+
+        def selected(log):
+            return all(allowed is None or '0x' + log['topics'][i].hex() in allowed
+                       for i, allowed in enumerate(params['topics']))
+        return [log for log in self.logs
+                if params['fromBlock'] <= log['blockNumber'] <= params['toBlock'] and selected(log)]
+
+
+@pytest.fixture
+def node():
+    return Node()
+
+
+@pytest.fixture
+def broadcaster(node, monkeypatch):
+    broadcaster = EventBroadcaster(node, Web3().eth.contract(address=ADDRESS, abi=ABI), max_catch_up=3)
+    # Polled by hand instead of from the background thread
+    monkeypatch.setattr(broadcaster, 'start', lambda: None)
+    return broadcaster
+
+
+def drain(subscription):
+    events = []
+    while (event := subscription.get(0)) is not None:
+        events.append(event)
+    return events
+
+
+def test_event_ids_parse_back():
+    assert parse_event_id('12:3') == (12, 3)
+    assert parse_event_id(None) is None
+    assert parse_event_id('12') is None and parse_event_id('a:b') is None
+    frame = format_sse({'id': '12:3', 'event': 'AccessGranted', 'patient': ALICE})
+    assert frame.startswith('id: 12:3\nevent: AccessGranted\ndata: ') and frame.endswith('\n\n')
+    assert json.loads(frame.split('data: ')[1])['patient'] == ALICE
+
+
+def test_doctors_follow_patients_granting_access():
+    subscription = Subscription(doctor=DOCTOR)
+    granted = {'event': 'AccessGranted', 'patient': ALICE, 'doctor': DOCTOR}
+    record = {'event': 'MedicalRecordUpdated', 'patient': ALICE, 'doctor': None}
+    assert not subscription.matches(record)
+    assert subscription.matches(granted)
+    subscription.deliver(granted)
+    assert subscription.matches(record)
+    subscription.deliver({**granted, 'event': 'AccessRevoked'})
+    assert not subscription.matches(record)
+    assert not subscription.matches({**granted, 'doctor': BOB})
+
+
+def test_slow_clients_are_flagged_instead_of_blocking():
+    subscription = Subscription(patients=[ALICE], max_pending=2)
+    for i in range(3):
+        subscription.deliver({'event': 'MedicalRecordUpdated', 'patient': ALICE, 'id': i})
+    assert subscription.overflowed
+    assert [event['id'] for event in drain(subscription)] == [0, 1]
+
+
+def test_one_poll_serves_every_subscription(node, broadcaster):
+    alice, doctor = Subscription(patients=[ALICE]), Subscription(doctor=DOCTOR)
+    broadcaster.subscribe(alice)
+    broadcaster.subscribe(doctor)
+    node.record(ALICE, 1)
+    node.emit('AccessGranted', patient=BOB, doctor=DOCTOR)
+    node.record(BOB, 2)
+    broadcaster.poll_once()
+    # One query for the patients' logs and one for the doctors' access changes
+    assert len(node.queries) == 2
+    assert [(e['event'], e['recordId'], e['ipfsHash']) for e in drain(alice)] == \
+        [('MedicalRecordUpdated', 1, make_cid(1))]
+    assert [(e['event'], e['patient']) for e in drain(doctor)] == [('AccessGranted', BOB)]
+
+    # Bob's records reach the doctor from the next poll on
+    node.record(BOB, 3)
+    node.emit('AccessRevoked', patient=BOB, doctor=DOCTOR)
+    node.record(BOB, 4)
+    broadcaster.poll_once()
+    assert [(e['event'], e.get('recordId')) for e in drain(doctor)] == \
+        [('MedicalRecordUpdated', 3), ('AccessRevoked', None)]
+    assert drain(alice) == []
+    assert broadcaster.stats() == {'subscribers': 2, 'block': 6}
+
+
+def test_overlapping_queries_deliver_an_event_once(node, broadcaster):
+    both = Subscription(patients=[ALICE], doctor=DOCTOR)
+    broadcaster.subscribe(both)
+    node.emit('AccessGranted', patient=ALICE, doctor=DOCTOR)
+    broadcaster.poll_once()
+    assert [e['id'] for e in drain(both)] == ['1:0']
+
+
+def test_reconnects_catch_up_from_their_last_event(node, broadcaster):
+    ids = [node.record(ALICE, i) for i in range(3)]
+    subscription = Subscription(patients=[ALICE])
+    assert broadcaster.subscribe(subscription, after=parse_event_id(ids[0]))
+    assert [e['id'] for e in drain(subscription)] == ids[1:]
+    assert len(node.queries) == 1
+
+
+def test_streams_ask_for_a_reload_when_events_were_lost(node, broadcaster):
+    ids = [node.record(ALICE, i) for i in range(5)]
+    stale = stream_events(broadcaster, Subscription(patients=[ALICE]), ids[0], heartbeat=0)
+    assert list(stale) == ['event: reload\ndata: {}\n\n']
+
+    subscription = Subscription(patients=[ALICE], max_pending=1)
+    frames = stream_events(broadcaster, subscription, ids[3], heartbeat=0)
+    assert next(frames) == 'retry: 5000\n\n'
+    assert next(frames).startswith(f"id: {ids[4]}\nevent: MedicalRecordUpdated\n")
+    assert next(frames) == ': keep-alive\n\n'
+    # Two events for a client with room for one
+    node.record(ALICE, 5)
+    node.record(ALICE, 6)
+    broadcaster.poll_once()
+    assert list(frames) == ['event: reload\ndata: {}\n\n']
+    assert broadcaster.stats()['subscribers'] == 0
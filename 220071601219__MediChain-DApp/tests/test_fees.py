@@ -0,0 +1,123 @@
+from types import SimpleNamespace
+
+import pytest
+from web3 import Web3  # type: ignore
+from web3.exceptions import ContractLogicError  # type: ignore
+
+from fees import FeeOracle, GasEstimator
+
+ADDRESS = Web3.to_checksum_address('0x' + 'cc' * 20)
+REGISTER_INPUTS = [{'name': '_name', 'type': 'string'}, {'name': '_age', 'type': 'uint256'},
+                   {'name': '_designation', 'type': 'uint256'}, {'name': '_email', 'type': 'string'},
+                   {'name': '_ipfsHash', 'type': 'bytes32'}]
+
+
+class Register:
+    """Stands in for ``contract.functions.register(...)``, counting estimates and calls."""
+
+    fn_name = 'register'
+    abi = {'inputs': REGISTER_INPUTS}
+    address = ADDRESS
+
+    def __init__(self, *args, gas=100000, revert=False):
+        self.args = args
+        self.gas = gas
+        self.revert = revert
+        self.estimates = self.calls = 0
+
+    def estimate_gas(self, params):
+        self.estimates += 1
+        self._check()
+        return self.gas
+
+    def call(self, params):
+        self.calls += 1
+        self._check()
+
+    def _check(self):
+        if self.revert:
+            raise ContractLogicError('execution reverted: Email already registered')
+
+
+def register(name='Alice', age=30, designation=1, email='alice@example.com', **kwargs):
+    return Register(name, age, designation, email, bytes(32), **kwargs)
+
+
+PARAMS = {'from': ADDRESS, 'nonce': 3}
+
+
+def test_calls_of_the_same_shape_share_an_estimate():
+    estimator = GasEstimator(None, margin=1.5)
+    first = register()
+    assert estimator.estimate(first, PARAMS) == 150000
+    # Same string lengths in words, different age: served from the cache after an eth_call
+    second = register(name='Bob', age=41, email='bob@example.com', gas=1)
+    assert estimator.estimate(second, PARAMS) == 150000
+    assert (second.estimates, second.calls) == (0, 1)
+    longer = register(name='A' * 40, gas=200000)
+    assert estimator.estimate(longer, PARAMS) == 300000
+
+
+def test_designations_are_estimated_separately():
+    estimator = GasEstimator(None, margin=1)
+    estimator.estimate(register(designation=1, gas=100000), PARAMS)
+    doctor = register(designation=2, gas=180000)
+    assert estimator.estimate(doctor, PARAMS) == 180000
+    assert doctor.estimates == 1
+
+
+def test_cache_hits_still_surface_reverts():
+    estimator = GasEstimator(None)
+    estimator.estimate(register(), PARAMS)
+    reverting = register(revert=True)
+    with pytest.raises(ContractLogicError):
+        estimator.estimate(reverting, PARAMS)
+    assert reverting.estimates == 0
+
+
+def test_forgotten_shapes_are_estimated_again():
+    estimator = GasEstimator(None, margin=1)
+    estimator.estimate(register(gas=100000), PARAMS)
+    estimator.forget(register())
+    assert estimator.estimate(register(gas=120000), PARAMS) == 120000
+
+
+def test_entries_expire():
+    estimator = GasEstimator(None, margin=1, ttl=0)
+    estimator.estimate(register(gas=100000), PARAMS)
+    assert estimator.estimate(register(gas=120000), PARAMS) == 120000
+
+
+def test_eip1559_fees_follow_the_base_fee(w3):
+    oracle = FeeOracle(w3, priority_fee=Web3.to_wei(2, 'gwei'), max_age=60)
+    base_fee = w3.eth.get_block('latest')['baseFeePerGas']
+    fees = oracle.fees()
+    assert fees == {'maxPriorityFeePerGas': Web3.to_wei(2, 'gwei'),
+                    'maxFeePerGas': base_fee * 2 + Web3.to_wei(2, 'gwei')}
+    # Copies: callers may add to them
+    fees['nonce'] = 1
+    assert 'nonce' not in oracle.fees()
+
+
+def test_fees_are_checked_once_per_max_age():
+    blocks = []
+    block = {'number': 1, 'baseFeePerGas': 10}
+
+    def get_block(identifier):
+        blocks.append(identifier)
+        return block
+
+    w3 = SimpleNamespace(eth=SimpleNamespace(get_block=get_block, max_priority_fee=1))
+    oracle = FeeOracle(w3, max_age=60)
+    assert oracle.fees()['maxFeePerGas'] == 21
+    block = {'number': 2, 'baseFeePerGas': 20}
+    assert oracle.fees()['maxFeePerGas'] == 21
+    assert len(blocks) == 1
+
+    oracle.max_age = 0
+    assert oracle.fees()['maxFeePerGas'] == 41
+
+
+def test_legacy_chains_get_a_gas_price():
+    w3 = SimpleNamespace(eth=SimpleNamespace(get_block=lambda identifier: {'number': 1}, gas_price=7))
+    assert FeeOracle(w3).fees() == {'gasPrice': 7}
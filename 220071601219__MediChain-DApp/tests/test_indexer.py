@@ -0,0 +1,189 @@
+import sqlite3
+
+import pytest
+from eth_abi import encode  # type: ignore
+from web3 import Web3  # type: ignore
+
+from cid_codec import cid_to_digest
+from conftest import make_cid
+from indexer import EventIndexer
+
+ADDRESS = Web3.to_checksum_address('0x' + 'cc' * 20)
+DOCTOR = Web3.to_checksum_address('0x' + 'd0' * 20)
+PATIENTS = [Web3.to_checksum_address(f"0x{i:040x}") for i in range(1, 5)]
+
+
+def event(name, *inputs):
+    return {'type': 'event', 'name': name, 'anonymous': False,
+            'inputs': [{'name': n, 'type': t, 'indexed': indexed} for n, t, indexed in inputs]}
+
+
+# The MediChain events the indexer projects
+EVENTS_ABI = [
+    event('PatientRegistered', ('patient', 'address', True), ('name', 'string', False), ('email', 'string', False),
+          ('age', 'uint256', False), ('designation', 'uint256', False)),
+    event('DoctorRegistered', ('doctor', 'address', True), ('name', 'string', False), ('email', 'string', False)),
+    event('MedicalRecordUpdated', ('patient', 'address', True), ('recordId', 'uint256', False),
+          ('ipfsHash', 'bytes32', False), ('timestamp', 'uint256', False)),
+    event('MedicalRecordDeleted', ('patient', 'address', True), ('recordId', 'uint256', False),
+          ('timestamp', 'uint256', False)),
+    event('AccessGranted', ('patient', 'address', True), ('doctor', 'address', True)),
+    event('AccessRevoked', ('patient', 'address', True), ('doctor', 'address', True)),
+    event('TransactionCreated', ('id', 'uint256', False), ('sender', 'address', True),
+          ('receiver', 'address', True), ('value', 'uint256', False)),
+    event('TransactionSettled', ('id', 'uint256', False), ('sender', 'address', True),
+          ('receiver', 'address', True)),
+    event('AuditLogged', ('patient', 'address', True), ('actor', 'address', True), ('action', 'uint8', False),
+          ('timestamp', 'uint256', False)),
+]
+
+
+class Chain:
+    """Mines eth-tester blocks and applies MediChain logs for them straight to an indexer."""
+
+    def __init__(self, w3, indexer):
+        self.w3 = w3
+        self.indexer = indexer
+        self.contract = indexer.contract
+
+    def log(self, block, index, name, args):
+        item = next(i for i in EVENTS_ABI if i['name'] == name)
+        signature = f"{name}({','.join(i['type'] for i in item['inputs'])})"
+        topics = [Web3.keccak(text=signature)] + [
+            encode([i['type']], [args[i['name']]]) for i in item['inputs'] if i['indexed']]
+        data = encode([i['type'] for i in item['inputs'] if not i['indexed']],
+                      [args[i['name']] for i in item['inputs'] if not i['indexed']])
+        return {
+            'address': ADDRESS, 'topics': topics, 'data': data, 'removed': False,
+            'blockNumber': block['number'], 'blockHash': block['hash'], 'logIndex': index,
+            'transactionIndex': 0, 'transactionHash': Web3.keccak(text=f"{block['number']}-{index}"),
+        }
+
+    def emit(self, *events, value=1):
+        """Mine a block (told apart by ``value``) holding ``events``: ``(name, args)`` pairs."""
+        self.w3.eth.wait_for_transaction_receipt(self.w3.eth.send_transaction(
+            {'from': self.w3.eth.accounts[0], 'to': self.w3.eth.accounts[1], 'value': value}))
+        block = self.w3.eth.get_block('latest')
+        logs = [self.log(block, i, name, args) for i, (name, args) in enumerate(events)]
+        self.indexer._apply(logs, block['number'], block['hash'])
+        return block['number']
+
+
+def registration(patient, seed):
+    return [
+        ('PatientRegistered', {'patient': patient, 'name': f'Patient {seed}', 'email': f'p{seed}@example.com',
+                               'age': 30, 'designation': 1}),
+        ('MedicalRecordUpdated', {'patient': patient, 'recordId': 0, 'ipfsHash': cid_to_digest(make_cid(seed)),
+                                  'timestamp': 1}),
+    ]
+
+
+def grant(patient):
+    return ('AccessGranted', {'patient': patient, 'doctor': DOCTOR})
+
+
+def revoke(patient):
+    return ('AccessRevoked', {'patient': patient, 'doctor': DOCTOR})
+
+
+@pytest.fixture
+def indexer(w3, tmp_path):
+    contract = w3.eth.contract(address=ADDRESS, abi=EVENTS_ABI)
+    return EventIndexer(w3, contract, str(tmp_path / 'index.db'))
+
+
+@pytest.fixture
+def chain(w3, indexer):
+    chain = Chain(w3, indexer)
+    chain.emit(('DoctorRegistered', {'doctor': DOCTOR, 'name': 'Dr. House', 'email': 'house@example.com'}),
+               *[e for i, patient in enumerate(PATIENTS) for e in registration(patient, i)])
+    return chain
+
+
+def test_checkpoint_follows_the_head(w3, tmp_path):
+    contract = w3.eth.contract(address=ADDRESS, abi=EVENTS_ABI)
+    indexer = EventIndexer(w3, contract, str(tmp_path / 'index.db'), confirmations=2)
+    assert indexer.checkpoint() is None and not indexer.ready()
+    for value in range(5):
+        w3.eth.send_transaction({'from': w3.eth.accounts[0], 'to': w3.eth.accounts[1], 'value': value + 1})
+    while indexer.sync_once():
+        pass
+    assert indexer.checkpoint() == w3.eth.block_number - 2
+    assert indexer.ready()
+    # The checkpoint is persisted with the projection
+    assert EventIndexer(w3, contract, indexer.db_path).checkpoint() == indexer.checkpoint()
+
+
+def test_patients_keep_the_contract_list_order(chain, indexer):
+    chain.emit(*[grant(patient) for patient in PATIENTS])
+    # removeFromList moves the last patient into the revoked one's slot
+    chain.emit(revoke(PATIENTS[1]))
+    order = [PATIENTS[0], PATIENTS[3], PATIENTS[2]]
+    assert [p['address'] for p in indexer.doctor_patients(DOCTOR)] == order
+    assert [p['address'] for p in indexer.doctor_patients(DOCTOR, offset=1, limit=1)] == order[1:2]
+    chain.emit(grant(PATIENTS[1]))
+    assert [p['address'] for p in indexer.doctor_patients(DOCTOR)] == order + [PATIENTS[1]]
+    assert indexer.doctor_patients_count(DOCTOR) == 4
+
+
+def test_unsettled_balance_is_a_running_total(chain, indexer):
+    patient = PATIENTS[0]
+    chain.emit(*[('TransactionCreated', {'id': i, 'sender': patient, 'receiver': DOCTOR, 'value': value})
+                 for i, value in ((1, 100), (2, 2 ** 70), (3, 5))])
+    assert indexer.unsettled_balance(patient) == {'owed': 105 + 2 ** 70, 'due': 0}
+    chain.emit(('TransactionSettled', {'id': 2, 'sender': patient, 'receiver': DOCTOR}),
+               ('TransactionSettled', {'id': 2, 'sender': patient, 'receiver': DOCTOR}))
+    assert indexer.unsettled_balance(patient) == {'owed': 105, 'due': 0}
+    assert indexer.unsettled_balance(DOCTOR) == {'owed': 0, 'due': 105}
+    assert indexer.unsettled_balance(PATIENTS[1]) == {'owed': 0, 'due': 0}
+
+
+def test_reorg_rolls_the_projection_back(w3, chain, indexer):
+    patient = PATIENTS[0]
+    chain.emit(grant(PATIENTS[0]), grant(PATIENTS[1]),
+               ('TransactionCreated', {'id': 1, 'sender': patient, 'receiver': DOCTOR, 'value': 10}))
+    ancestor = indexer.checkpoint()
+    snapshot = w3.testing.snapshot()
+    chain.emit(revoke(PATIENTS[0]), grant(PATIENTS[2]),
+               ('MedicalRecordUpdated', {'patient': patient, 'recordId': 1,
+                                         'ipfsHash': cid_to_digest(make_cid('orphaned')), 'timestamp': 2}),
+               ('TransactionSettled', {'id': 1, 'sender': patient, 'receiver': DOCTOR}),
+               ('TransactionCreated', {'id': 2, 'sender': PATIENTS[1], 'receiver': DOCTOR, 'value': 7}))
+    assert [p['address'] for p in indexer.doctor_patients(DOCTOR)] == [PATIENTS[1], PATIENTS[2]]
+    assert indexer.unsettled_balance(DOCTOR) == {'owed': 0, 'due': 7}
+
+    # Replace the block those logs were in
+    w3.testing.revert(snapshot)
+    w3.eth.send_transaction({'from': w3.eth.accounts[0], 'to': w3.eth.accounts[1], 'value': 99})
+    indexer.sync_once()
+    assert indexer.checkpoint() == w3.eth.block_number
+    assert [p['address'] for p in indexer.doctor_patients(DOCTOR)] == [PATIENTS[0], PATIENTS[1]]
+    assert indexer.medical_records(patient) == ([{'id': 0, 'ipfsHash': make_cid(0)}], None)
+    assert indexer.unsettled_balance(DOCTOR) == {'owed': 0, 'due': 10}
+    assert indexer.unsettled_balance(PATIENTS[1]) == {'owed': 0, 'due': 0}
+    assert [t['Settled'] for t in indexer.transactions(patient)] == [False]
+    assert ancestor < indexer.checkpoint()
+
+
+def test_records_and_audit_reads(chain, indexer):
+    patient = PATIENTS[0]
+    chain.emit(('MedicalRecordUpdated', {'patient': patient, 'recordId': 1,
+                                         'ipfsHash': cid_to_digest(make_cid('x')), 'timestamp': 2}),
+               ('MedicalRecordDeleted', {'patient': patient, 'recordId': 0, 'timestamp': 3}),
+               ('AuditLogged', {'patient': patient, 'actor': DOCTOR, 'action': 2, 'timestamp': 3}))
+    assert indexer.medical_records(patient) == ([{'id': 1, 'ipfsHash': make_cid('x')}], None)
+    assert indexer.audit_history(patient) == [{'actor': DOCTOR, 'action': 'delete record', 'timestamp': 3}]
+    assert indexer.patient(patient)['name'] == 'Patient 0'
+
+
+def test_stores_from_before_access_positions_are_rebuilt(w3, chain, indexer):
+    chain.emit(*[grant(patient) for patient in PATIENTS[:3]], revoke(PATIENTS[0]))
+    conn = sqlite3.connect(indexer.db_path)
+    with conn:
+        conn.execute('DROP TABLE access')
+        conn.execute('CREATE TABLE access (patient TEXT NOT NULL, doctor TEXT NOT NULL, '
+                     'PRIMARY KEY (patient, doctor))')
+        conn.execute('DELETE FROM balances')
+    conn.close()
+    reopened = EventIndexer(w3, indexer.contract, indexer.db_path)
+    assert [p['address'] for p in reopened.doctor_patients(DOCTOR)] == [PATIENTS[2], PATIENTS[1]]
@@ -0,0 +1,114 @@
+import io
+import json
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from web3 import Web3  # type: ignore
+
+from metrics import Histogram, Metrics, function_selectors
+
+ABI = [
+    {'type': 'function', 'name': 'getAllDoctors', 'inputs': []},
+    {'type': 'function', 'name': 'register', 'inputs': [
+        {'name': '_name', 'type': 'string'}, {'name': '_age', 'type': 'uint256'}]},
+    {'type': 'function', 'name': 'submit', 'inputs': [
+        {'name': 'items', 'type': 'tuple[]', 'components': [
+            {'name': 'who', 'type': 'address'}, {'name': 'value', 'type': 'uint256'}]}]},
+    {'type': 'event', 'name': 'AccessGranted', 'inputs': []},
+]
+
+
+def selector(signature):
+    return Web3.to_hex(Web3.keccak(text=signature)[:4])
+
+
+def rpc_response(body, content=b'{}', ms=5):
+    data = json.dumps(body).encode()
+    request = SimpleNamespace(body=data, headers={'Content-Length': str(len(data))})
+    return SimpleNamespace(request=request, content=content, elapsed=timedelta(milliseconds=ms))
+
+
+def samples(metrics, name):
+    """``{labels: value}`` of the rendered lines of metric ``name``."""
+    found = {}
+    for line in metrics.render().splitlines():
+        if line.startswith(name + '{') or line.startswith(name + ' '):
+            series, value = line.rsplit(' ', 1)
+            found[series[len(name):]] = float(value)
+    return found
+
+
+@pytest.fixture
+def metrics():
+    return Metrics(selectors=function_selectors(ABI))
+
+
+def test_selectors_cover_functions_only():
+    assert function_selectors(ABI) == {
+        selector('getAllDoctors()'): 'getAllDoctors',
+        selector('register(string,uint256)'): 'register',
+        selector('submit((address,uint256)[])'): 'submit',
+    }
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency', 'Latency', ('route',), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 5):
+        histogram.observe(value, 'dashboard')
+    assert histogram.render()[2:] == [
+        'latency_bucket{route="dashboard",le="0.1"} 1',
+        'latency_bucket{route="dashboard",le="1"} 3',
+        'latency_bucket{route="dashboard",le="+Inf"} 4',
+        'latency_sum{route="dashboard"} 6.25',
+        'latency_count{route="dashboard"} 4',
+    ]
+
+
+def test_rpc_calls_are_labelled_with_route_and_function(metrics):
+    call = {'jsonrpc': '2.0', 'id': 1, 'method': 'eth_call',
+            'params': [{'to': '0x' + 'cc' * 20, 'data': selector('getAllDoctors()')}, 'latest']}
+    metrics.begin_request('dashboard')
+    metrics._on_rpc_response(rpc_response([call, {**call, 'id': 2}, {'id': 3, 'method': 'eth_blockNumber'}]))
+    metrics._on_rpc_response(rpc_response({'id': 4, 'method': 'eth_chainId'}))
+    metrics.end_request(200)
+
+    calls = samples(metrics, 'medichain_rpc_calls_total')
+    assert calls['{route="dashboard",method="eth_call",function="getAllDoctors"}'] == 2
+    assert calls['{route="dashboard",method="eth_blockNumber",function=""}'] == 1
+    round_trips = samples(metrics, 'medichain_rpc_seconds_count')
+    assert round_trips['{route="dashboard",method="batch",function=""}'] == 1
+    assert round_trips['{route="dashboard",method="eth_chainId",function=""}'] == 1
+    assert samples(metrics, 'medichain_route_rpc_calls_sum') == {'{route="dashboard"}': 4}
+    assert samples(metrics, 'medichain_route_seconds_count') == {'{route="dashboard",status="200"}': 1}
+
+
+def test_calls_outside_requests_count_as_background(metrics):
+    metrics._on_rpc_response(rpc_response({'id': 1, 'method': 'eth_getLogs'}))
+    metrics.observe_rpc('eth_call', 'register', 0.01)
+    calls = samples(metrics, 'medichain_rpc_calls_total')
+    assert calls == {'{route="background",method="eth_getLogs",function=""}': 1,
+                     '{route="background",method="eth_call",function="register"}': 1}
+
+
+def test_uploads_are_timed_and_sized(metrics):
+    class Store:
+        def put(self, stream, filename=None, content_type=None):
+            if not stream.read():
+                raise ValueError('empty upload')
+            return 'cid'
+
+    store = metrics.instrument_blob_store(Store())
+    assert store.put(io.BytesIO(b'x' * 300)) == 'cid'
+    with pytest.raises(ValueError):
+        store.put(io.BytesIO(b''))
+    assert samples(metrics, 'medichain_upload_seconds_count') == {
+        '{backend="Store",outcome="ok"}': 1, '{backend="Store",outcome="error"}': 1}
+    assert samples(metrics, 'medichain_upload_bytes_sum') == {'{backend="Store"}': 300}
+
+
+def test_gauges_render_numbers_only(metrics):
+    metrics.gauges['medichain_call_cache'] = lambda: {'hits': 3, 'ratio': 0.5, 'enabled': True, 'name': 'x'}
+    assert samples(metrics, 'medichain_call_cache_hits') == {'': 3}
+    assert samples(metrics, 'medichain_call_cache_ratio') == {'': 0.5}
+    assert 'medichain_call_cache_enabled' not in metrics.render()
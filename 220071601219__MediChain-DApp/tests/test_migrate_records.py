@@ -0,0 +1,62 @@
+import base64
+
+import pytest
+
+from cid_codec import DAG_PB, EMPTY_DIGEST, SHA2_256, cid_to_digest, record_cid
+from conftest import make_cid
+from migrate_records import migrate, read_old_state, record_digest
+from tx_queue import TransactionQueue
+
+
+def test_record_digest_converts_cid_strings():
+    cid = make_cid(0)
+    assert record_digest(cid) == cid_to_digest(cid)
+    # Already a digest (an old deployment of the digest contract)
+    assert record_digest(cid_to_digest(cid)) == cid_to_digest(cid)
+
+
+def test_record_digest_accepts_cid_v1_with_a_warning(capsys):
+    digest = cid_to_digest(make_cid(0))
+    v1 = 'b' + base64.b32encode(bytes([1, DAG_PB, SHA2_256, 32]) + digest).decode().lower().rstrip('=')
+    assert record_digest(v1) == digest
+    assert make_cid(0) in capsys.readouterr().out
+
+
+def test_record_digest_rejects_other_hashes():
+    with pytest.raises(ValueError):
+        record_digest('not-a-cid')
+
+
+def test_migration_copies_a_deployment(w3, deploy, send, funded_account):
+    doctor, patient, other = w3.eth.accounts[1:4]
+    old = deploy()
+    send(old.functions.register('Dr. House', 0, 2, 'house@example.com', EMPTY_DIGEST), doctor)
+    for address, name, seed in ((patient, 'Alice', 0), (other, 'Bob', 1)):
+        send(old.functions.register(name, 30, 1, f'{name.lower()}@example.com', cid_to_digest(make_cid(seed))),
+             address)
+    send(old.functions.grantAccessToDoctor(doctor), patient)
+    send(old.functions.createOrUpdateMedicalRecords([patient] * 3, [cid_to_digest(make_cid(s)) for s in (2, 3, 4)]),
+         doctor)
+    send(old.functions.deleteMedicalRecord(patient, 2), patient)
+
+    migrator = funded_account()
+    new = deploy(migrator.address, migrating=True)
+    tx_queue = TransactionQueue(w3, workers=1, poll_interval=0.05)
+    tx_queue.start()
+    doctors, patients = read_old_state(old)
+    assert migrate(new, tx_queue, migrator.address, migrator.key, doctors, patients)
+
+    assert new.functions.getAllDoctors().call() == [doctor]
+    assert new.functions.isDoctorAuthorized(patient, doctor).call()
+    for address in (patient, other):
+        assert new.functions.getPatientBasicInfo(address).call() == old.functions.getPatientBasicInfo(address).call()
+        assert new.functions.getMedicalRecords(address).call() == old.functions.getMedicalRecords(address).call()
+    # Record ids carry over, the deleted one included
+    assert new.functions.getMedicalRecordsCount(patient).call() == 3
+    assert [record_cid(r) for r in new.functions.getMedicalRecords(patient).call()] == \
+        [make_cid(0), make_cid(2), '', make_cid(4)]
+
+    # A second run finds nothing missing
+    block = w3.eth.block_number
+    assert migrate(new, tx_queue, migrator.address, migrator.key, *read_old_state(old))
+    assert w3.eth.block_number == block
@@ -0,0 +1,74 @@
+import pytest
+
+from nonce_manager import NonceManager
+
+
+@pytest.fixture
+def sender(w3):
+    return w3.eth.accounts[1]
+
+
+def transfer(w3, sender):
+    w3.eth.wait_for_transaction_receipt(
+        w3.eth.send_transaction({'from': sender, 'to': w3.eth.accounts[2], 'value': 1}))
+
+
+def test_nonces_are_seeded_from_the_node(w3, sender):
+    transfer(w3, sender)
+    transfer(w3, sender)
+    nonces = NonceManager(w3)
+    assert [nonces.allocate(sender) for _ in range(3)] == [2, 3, 4]
+
+
+def test_released_nonces_are_reused_first(w3, sender):
+    nonces = NonceManager(w3)
+    allocated = [nonces.allocate(sender) for _ in range(4)]
+    assert allocated == [0, 1, 2, 3]
+    nonces.release(sender, 1)
+    assert nonces.allocate(sender) == 1
+    assert nonces.allocate(sender) == 4
+
+
+def test_releasing_the_newest_nonce_hands_it_out_again(w3, sender):
+    nonces = NonceManager(w3)
+    nonce = nonces.allocate(sender)
+    nonces.release(sender, nonce)
+    assert nonces.allocate(sender) == nonce
+
+
+def test_resync_picks_up_transactions_from_elsewhere(w3, sender):
+    nonces = NonceManager(w3)
+    assert nonces.allocate(sender) == 0
+    nonces.release(sender, 0)
+    transfer(w3, sender)
+    transfer(w3, sender)
+    # Still local state: another wallet used the account meanwhile
+    assert nonces.allocate(sender) == 0
+    nonces.done(sender)
+    nonces.resync(sender)
+    assert nonces.allocate(sender) == 2
+
+
+def test_idle_accounts_are_reseeded(w3, sender):
+    nonces = NonceManager(w3, resync_after=0)
+    assert nonces.allocate(sender) == 0
+    nonces.release(sender, 0)
+    transfer(w3, sender)
+    assert nonces.allocate(sender) == 1
+
+
+def test_accounts_are_independent(w3, sender):
+    nonces = NonceManager(w3)
+    transfer(w3, sender)
+    assert nonces.allocate(sender) == 1
+    assert nonces.allocate(w3.eth.accounts[3]) == 0
+
+
+@pytest.mark.parametrize('message, expected', [
+    ('nonce too low', True),
+    ('Nonce too high', True),
+    ('replacement transaction underpriced', True),
+    ('insufficient funds for gas * price + value', False),
+])
+def test_is_nonce_error(message, expected):
+    assert NonceManager.is_nonce_error(ValueError(message)) is expected
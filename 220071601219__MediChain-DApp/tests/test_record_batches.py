@@ -0,0 +1,150 @@
+from types import SimpleNamespace
+
+import pytest
+from eth_abi import encode  # type: ignore
+from web3 import Web3  # type: ignore
+
+from cid_codec import cid_to_digest
+from conftest import make_cid
+from record_batches import (RecordBatcher, merkle_levels, merkle_proof, merkle_root, record_leaf,
+                            verify_proof)
+
+PATIENTS = [Web3.to_checksum_address(f"0x{i:040x}") for i in range(1, 6)]
+DOCTOR = Web3.to_checksum_address('0x' + 'd0' * 20)
+
+
+class FakeQueue:
+    """Stands in for ``TransactionQueue``: records submissions and reports set statuses."""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def submit(self, contract_fn, tx_params, private_key, description=''):
+        job_id = f"job-{len(self.jobs)}"
+        self.jobs[job_id] = {'fn': contract_fn, 'params': tx_params, 'key': private_key,
+                             'status': {'id': job_id, 'status': 'queued', 'tx_hash': None,
+                                        'block_number': None, 'error': None}}
+        return job_id
+
+    def status(self, job_id):
+        job = self.jobs.get(job_id)
+        return dict(job['status']) if job else None
+
+    def finish(self, job_id, status, error=None):
+        self.jobs[job_id]['status'].update(status=status, tx_hash='0x' + 'ab' * 32, block_number=7, error=error)
+
+
+class FakeContract:
+    """``anchorRecordBatch`` calls are captured; ``recordBatches`` reports every root as unknown."""
+
+    def __init__(self):
+        self.functions = SimpleNamespace(
+            anchorRecordBatch=lambda patients, digests: ('anchorRecordBatch', patients, digests),
+            recordBatches=lambda root: SimpleNamespace(call=lambda: (None, 0, 0)),
+        )
+
+
+@pytest.fixture
+def batcher(tmp_path):
+    return RecordBatcher(None, FakeContract(), FakeQueue(), str(tmp_path / 'batches.db'), max_batch=4)
+
+
+def records(count, offset=0):
+    return [(PATIENTS[i % len(PATIENTS)], make_cid(offset + i)) for i in range(count)]
+
+
+@pytest.mark.parametrize('count', range(1, 20))
+def test_every_leaf_has_a_valid_proof(count):
+    leaves = [bytes(Web3.keccak(text=str(i))) for i in range(count)]
+    levels = merkle_levels(leaves)
+    root = merkle_root(leaves)
+    for index, leaf in enumerate(leaves):
+        assert verify_proof(leaf, merkle_proof(levels, index), root)
+    assert not verify_proof(bytes(Web3.keccak(text='other')), merkle_proof(levels, 0), root)
+
+
+def test_merkle_tree_needs_leaves():
+    with pytest.raises(ValueError):
+        merkle_root([])
+
+
+def test_record_leaf_hashes_the_abi_encoded_digest():
+    patient, cid = PATIENTS[0], make_cid(0)
+    inner = Web3.keccak(encode(['address', 'bytes32'], [patient, cid_to_digest(cid)]))
+    assert record_leaf(patient, cid) == bytes(Web3.keccak(inner))
+    assert record_leaf(patient.lower(), cid) == record_leaf(patient, cid)
+
+
+def test_add_submits_one_transaction_per_batch(batcher):
+    batch = records(10)
+    submitted = batcher.add(DOCTOR, '0xkey', batch)
+    assert len(submitted) == 3
+    jobs = batcher.tx_queue.jobs
+    name, patients, digests = jobs[submitted[0][1]]['fn']
+    assert name == 'anchorRecordBatch'
+    assert patients == [patient for patient, _ in batch[:4]]
+    assert digests == [cid_to_digest(cid) for _, cid in batch[:4]]
+    assert all(job['params'] == {'from': DOCTOR} and job['key'] == '0xkey' for job in jobs.values())
+    assert [batcher.batch(root)['count'] for root, _ in submitted] == [4, 4, 2]
+
+
+def test_stored_proofs_verify_against_their_root(batcher):
+    batch = records(10)
+    batcher.add(DOCTOR, '0xkey', batch)
+    for patient in PATIENTS:
+        for proof in batcher.proofs(patient):
+            leaf = record_leaf(proof['patient'], proof['cid'])
+            assert verify_proof(leaf, [bytes.fromhex(h[2:]) for h in proof['proof']], bytes.fromhex(proof['root'][2:]))
+    assert sum(len(batcher.proofs(patient)) for patient in PATIENTS) == 10
+    assert len(batcher.proofs(PATIENTS[0], batch[0][1])) == 1
+
+
+def test_invalid_cid_submits_nothing(batcher):
+    with pytest.raises(ValueError):
+        batcher.add(DOCTOR, '0xkey', [(PATIENTS[0], 'bafy-not-a-v0-cid')])
+    assert batcher.tx_queue.jobs == {}
+
+
+def test_duplicate_batch_is_skipped(batcher):
+    batch = records(3)
+    assert len(batcher.add(DOCTOR, '0xkey', batch)) == 1
+    assert batcher.add(DOCTOR, '0xkey', batch) == []
+    assert len(batcher.tx_queue.jobs) == 1
+
+
+def test_mined_batches_are_anchored(batcher):
+    [(root, job_id)] = batcher.add(DOCTOR, '0xkey', records(3))
+    batcher.refresh()
+    assert batcher.batch(root)['status'] == 'submitted'
+    batcher.tx_queue.finish(job_id, 'mined')
+    batcher.refresh()
+    batch = batcher.batch(root)
+    assert (batch['status'], batch['block_number']) == ('anchored', 7)
+    assert batcher.stats() == {'submitted': 0, 'anchored': 1, 'failed': 0}
+    assert {proof['status'] for proof in batcher.proofs(PATIENTS[0])} == {'anchored'}
+
+
+def test_failed_batches_can_be_submitted_again(batcher):
+    batch = records(3)
+    [(root, job_id)] = batcher.add(DOCTOR, '0xkey', batch)
+    batcher.tx_queue.finish(job_id, 'failed', 'Transaction reverted')
+    batcher.refresh()
+    assert batcher.batch(root)['status'] == 'failed'
+    assert batcher.stats()['failed'] == 1
+
+    [(again, new_job)] = batcher.add(DOCTOR, '0xkey', batch)
+    assert (again, batcher.batch(root)['status']) == (root, 'submitted')
+    assert new_job != job_id
+    # Re-submitting replaces the leaves instead of duplicating them
+    assert len(batcher.proofs(PATIENTS[0])) == 1
+
+
+def test_anchored_records_are_listed_from_the_store(batcher):
+    [(first, first_job), (second, _)] = batcher.add(DOCTOR, '0xkey', [(PATIENTS[0], make_cid(i)) for i in range(6)])
+    batcher.tx_queue.finish(first_job, 'mined')
+    batcher.refresh()
+    # Only the mined batch's records are anchored
+    assert batcher.anchored_records_count(PATIENTS[0]) == 4
+    page = batcher.anchored_records(PATIENTS[0], 1, 2)
+    assert [(r['ipfsHash'], r['root'], r['position']) for r in page] == [(make_cid(1), first, 1), (make_cid(2), first, 2)]
+    assert batcher.anchored_records(PATIENTS[1]) == []
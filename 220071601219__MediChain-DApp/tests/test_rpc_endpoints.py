@@ -0,0 +1,143 @@
+import json
+
+import pytest
+import requests
+
+from rpc_endpoints import MultiEndpointProvider, NoHealthyEndpoint
+
+NODE_A, NODE_B = 'http://node-a:8545', 'http://node-b:8545'
+
+
+class Nodes:
+    """A ``requests.Session`` stand-in answering JSON-RPC per node: heads, outages and a request log."""
+
+    def __init__(self, heads):
+        self.heads = dict(heads)
+        self.down = set()
+        self.posts = []
+
+    def post(self, uri, data, headers, timeout):
+        body = json.loads(data)
+        self.posts.append((uri, [r['method'] for r in body] if isinstance(body, list) else body['method']))
+        if uri in self.down:
+            raise requests.ConnectionError(f"{uri} refused the connection")
+        answers = [self.answer(uri, r) for r in (body if isinstance(body, list) else [body])]
+        content = json.dumps(answers if isinstance(body, list) else answers[0]).encode()
+        return type('Response', (), {'content': content, 'raise_for_status': lambda self: None})()
+
+    def answer(self, uri, request):
+        if request['method'] == 'eth_call':
+            return {'jsonrpc': '2.0', 'id': request['id'], 'error': {'code': 3, 'message': 'execution reverted'}}
+        return {'jsonrpc': '2.0', 'id': request['id'], 'result': hex(self.heads[uri])}
+
+    def sent_to(self, method):
+        return [uri for uri, m in self.posts if m == method]
+
+
+@pytest.fixture
+def nodes():
+    return Nodes({NODE_A: 100, NODE_B: 100})
+
+
+@pytest.fixture
+def provider(nodes):
+    provider = MultiEndpointProvider([NODE_A, NODE_B], session=nodes, failure_threshold=2, max_lag=2)
+    provider.probe()
+    a, b = provider.endpoints
+    a.latency, b.latency = 0.001, 0.010
+    return provider
+
+
+def test_reads_go_to_the_fastest_node(provider, nodes):
+    provider.make_request('eth_chainId', [])
+    assert nodes.sent_to('eth_chainId') == [NODE_A]
+
+
+def test_lagging_nodes_stop_serving_reads(provider, nodes):
+    nodes.heads[NODE_A] = 90
+    provider.probe()
+    assert provider.endpoints[0].lagging
+    assert provider.read_endpoint() == NODE_B
+    # Reads naming a block prefer nodes known to have it
+    nodes.heads[NODE_A] = 101
+    provider.probe()
+    assert provider.read_endpoint(min_block=101) == NODE_A
+    assert [e.uri for e in provider.read_order(min_block=101)] == [NODE_A, NODE_B]
+
+
+def test_failed_requests_move_to_the_next_node(provider, nodes):
+    nodes.down.add(NODE_A)
+    assert provider.make_request('eth_chainId', [])['result'] == hex(100)
+    assert nodes.sent_to('eth_chainId') == [NODE_A, NODE_B]
+    assert provider.endpoints[0].failures == 1
+
+
+def test_node_errors_are_answers_not_failures(provider, nodes):
+    response = provider.make_request('eth_call', [{'to': '0x' + '00' * 20}, 'latest'])
+    assert response['error']['message'] == 'execution reverted'
+    assert nodes.sent_to('eth_call') == [NODE_A]
+    assert provider.errors == 0
+
+
+def test_breaker_opens_and_a_probe_closes_it(provider, nodes):
+    nodes.down.add(NODE_A)
+    for _ in range(2):
+        provider.make_request('eth_chainId', [])
+    assert provider.stats()['open_circuits'] == 1
+    # Open: the node is not even tried
+    nodes.posts.clear()
+    provider.make_request('eth_chainId', [])
+    assert nodes.sent_to('eth_chainId') == [NODE_B]
+
+    # Probes still reach it; the first one to succeed closes the circuit
+    provider.probe()
+    assert nodes.sent_to('eth_blockNumber') == [NODE_A, NODE_B]
+    assert provider.stats()['open_circuits'] == 1
+    nodes.down.clear()
+    provider.probe()
+    assert provider.stats()['open_circuits'] == 0
+    assert provider.read_endpoint() == NODE_A
+
+
+def test_writes_stay_on_one_node_until_it_fails(provider, nodes):
+    provider.make_request('eth_sendRawTransaction', ['0x00'])
+    nodes.down.add(NODE_A)
+    provider.make_request('eth_sendRawTransaction', ['0x01'])
+    nodes.down.clear()
+    # Nonces and receipts follow the writes, even though node A is back and faster
+    provider.make_request('eth_getTransactionCount', ['0x' + '00' * 20, 'pending'])
+    assert nodes.sent_to('eth_sendRawTransaction') == [NODE_A, NODE_A, NODE_B]
+    assert nodes.sent_to('eth_getTransactionCount') == [NODE_B]
+    assert provider.stats()['write_failovers'] == 1
+
+
+def test_every_node_failing_raises(provider, nodes):
+    nodes.down.update({NODE_A, NODE_B})
+    with pytest.raises(NoHealthyEndpoint):
+        provider.make_request('eth_chainId', [])
+    for _ in range(2):
+        with pytest.raises(NoHealthyEndpoint):
+            provider.make_request('eth_chainId', [])
+    assert provider.stats()['open_circuits'] == 2
+    with pytest.raises(NoHealthyEndpoint, match='circuits open'):
+        provider.make_request('eth_chainId', [])
+
+
+def test_batches_are_posted_to_the_read_node(provider, nodes):
+    batch = [{'jsonrpc': '2.0', 'id': i, 'method': 'eth_blockNumber', 'params': []} for i in range(3)]
+    responses = provider.post_batch(batch)
+    assert [r['id'] for r in responses] == [0, 1, 2]
+    assert nodes.posts[-1] == (NODE_A, ['eth_blockNumber'] * 3)
+
+
+def test_receipt_batches_follow_the_writes(provider, nodes):
+    nodes.down.add(NODE_A)
+    provider.make_request('eth_sendRawTransaction', ['0x00'])
+    nodes.down.clear()
+    receipts = [{'jsonrpc': '2.0', 'id': i, 'method': 'eth_getTransactionReceipt', 'params': ['0x00']}
+                for i in range(2)]
+    provider.post_batch(receipts)
+    assert nodes.posts[-1] == (NODE_B, ['eth_getTransactionReceipt'] * 2)
+    # Mixed batches are reads
+    provider.post_batch(receipts + [{'jsonrpc': '2.0', 'id': 2, 'method': 'eth_blockNumber', 'params': []}])
+    assert nodes.posts[-1][0] == NODE_A
@@ -0,0 +1,48 @@
+import pytest
+from eth_account import Account  # type: ignore
+
+import signer as signer_module
+from signer import FORK_AVAILABLE, Signer
+
+
+def transfer(w3, nonce=0, value=1):
+    return {'to': w3.eth.accounts[2], 'value': value, 'gas': 21000, 'nonce': nonce, 'chainId': w3.eth.chain_id,
+            'maxFeePerGas': 10 ** 10, 'maxPriorityFeePerGas': 10 ** 9}
+
+
+def test_signatures_match_eth_account(w3, funded_account):
+    account = funded_account()
+    tx = transfer(w3)
+    assert Signer(w3).sign(tx, account.key) == bytes(Account.sign_transaction(tx, account.key).raw_transaction)
+
+
+def test_sent_transactions_are_mined(w3, funded_account):
+    account = funded_account()
+    tx_hash = Signer(w3).send(transfer(w3, value=5), account.key)
+    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    assert (receipt['status'], receipt['from']) == (1, account.address)
+
+
+def test_accounts_are_derived_once_per_key(w3, monkeypatch):
+    keys = [Account.create().key.to_0x_hex() for _ in range(3)]
+    derived = []
+    from_key = Account.from_key
+    monkeypatch.setattr(signer_module.Account, 'from_key', lambda key: derived.append(key) or from_key(key))
+    signer = Signer(w3, cache_size=2)
+    assert signer.address_of(keys[0]) == signer.address_of(keys[0]) == from_key(keys[0]).address
+    signer.address_of(keys[1])
+    signer.address_of(keys[2])
+    # The least recently used key was dropped
+    signer.address_of(keys[0])
+    assert derived == [keys[0], keys[1], keys[2], keys[0]]
+
+
+@pytest.mark.skipif(not FORK_AVAILABLE, reason="signing pools need fork")
+def test_pooled_signatures_match_in_process_ones(w3, funded_account):
+    account = funded_account()
+    pooled = Signer(w3, processes=2).start()
+    try:
+        txs = [transfer(w3, nonce=i) for i in range(4)]
+        assert [pooled.sign(tx, account.key) for tx in txs] == [Signer(w3).sign(tx, account.key) for tx in txs]
+    finally:
+        pooled.shutdown()
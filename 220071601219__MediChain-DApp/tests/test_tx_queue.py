@@ -0,0 +1,173 @@
+import time
+
+import pytest
+from web3.exceptions import ContractLogicError, TransactionNotFound  # type: ignore
+
+from tx_queue import FINAL_STATES, TransactionQueue
+
+
+class Transfer:
+    """A plain value transfer shaped like a ``ContractFunction`` for the queue."""
+
+    abi = {'inputs': []}
+    args = ()
+    fn_name = 'transfer'
+
+    def __init__(self, w3, to, value=1, revert=False):
+        self.w3 = w3
+        self.address = to
+        self.value = value
+        self.revert = revert
+
+    def estimate_gas(self, params):
+        if self.revert:
+            raise ContractLogicError('execution reverted: Not authorized')
+        return 21000
+
+    def call(self, params):
+        self.estimate_gas(params)
+
+    def build_transaction(self, params):
+        if self.revert:
+            self.estimate_gas(params)
+        return {**params, 'to': self.address, 'value': self.value, 'chainId': self.w3.eth.chain_id}
+
+
+class FlakySigner:
+    """Wraps a ``Signer`` and fails the first ``failures`` sends before anything is broadcast."""
+
+    def __init__(self, signer, failures, message='connection reset'):
+        self.signer = signer
+        self.failures = failures
+        self.message = message
+
+    def send(self, tx, private_key):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError(self.message)
+        return self.signer.send(tx, private_key)
+
+
+def node_receipt(w3, tx_hash):
+    """The receipt fields of ``eth_getTransactionReceipt`` the queue reads, hex-encoded like a node sends them."""
+    try:
+        receipt = w3.eth.get_transaction_receipt(tx_hash)
+    except TransactionNotFound:
+        return None
+    return {field: hex(receipt[field]) for field in ('status', 'blockNumber', 'gasUsed')}
+
+
+def wait(tx_queue, job_ids, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        statuses = [tx_queue.status(job_id) for job_id in job_ids]
+        if all(status['status'] in FINAL_STATES for status in statuses):
+            return statuses
+        time.sleep(0.05)
+    raise AssertionError(f"Jobs not final after {timeout}s: {statuses}")
+
+
+@pytest.fixture
+def account(funded_account):
+    return funded_account()
+
+
+@pytest.fixture
+def tx_queue(w3):
+    # eth-tester mines on arrival and rejects nonce gaps (no mempool), so one worker sends in order
+    tx_queue = TransactionQueue(w3, workers=1, poll_interval=0.05)
+    tx_queue.start()
+    return tx_queue
+
+
+def test_queued_jobs_from_one_account_are_all_mined(w3, tx_queue, account):
+    receiver = w3.eth.accounts[2]
+    before = w3.eth.get_balance(receiver)
+    job_ids = [tx_queue.submit(Transfer(w3, receiver, value=i + 1), {'from': account.address}, account.key,
+                               f"Transfer {i}") for i in range(8)]
+    statuses = wait(tx_queue, job_ids)
+    assert {status['status'] for status in statuses} == {'mined'}
+    assert w3.eth.get_balance(receiver) - before == sum(range(1, 9))
+    nonces = sorted(w3.eth.get_transaction(status['tx_hash'])['nonce'] for status in statuses)
+    assert nonces == list(range(8))
+
+
+def test_reverting_job_fails_without_using_a_nonce(w3, tx_queue, account):
+    [failed] = wait(tx_queue, [tx_queue.submit(Transfer(w3, w3.eth.accounts[2], revert=True),
+                                               {'from': account.address}, account.key, "Revert")])
+    assert failed['status'] == 'failed'
+    assert 'Not authorized' in failed['error']
+    assert failed['tx_hash'] is None
+
+    [mined] = wait(tx_queue, [tx_queue.submit(Transfer(w3, w3.eth.accounts[2]), {'from': account.address},
+                                              account.key, "Transfer")])
+    assert w3.eth.get_transaction(mined['tx_hash'])['nonce'] == 0
+
+
+def test_failed_sends_are_retried(w3, account):
+    tx_queue = TransactionQueue(w3, workers=1, poll_interval=0.05)
+    tx_queue.signer = FlakySigner(tx_queue.signer, failures=1)
+    tx_queue.start()
+    [status] = wait(tx_queue, [tx_queue.submit(Transfer(w3, w3.eth.accounts[2]), {'from': account.address},
+                                               account.key, "Transfer")])
+    assert (status['status'], status['attempts'], status['error']) == ('mined', 2, None)
+    assert w3.eth.get_transaction(status['tx_hash'])['nonce'] == 0
+
+
+def test_jobs_fail_after_max_retries(w3, account):
+    tx_queue = TransactionQueue(w3, workers=1, max_retries=0, poll_interval=0.05)
+    tx_queue.signer = FlakySigner(tx_queue.signer, failures=1)
+    tx_queue.start()
+    [status] = wait(tx_queue, [tx_queue.submit(Transfer(w3, w3.eth.accounts[2]), {'from': account.address},
+                                               account.key, "Transfer")])
+    assert (status['status'], status['error']) == ('failed', 'connection reset')
+
+
+def test_receipts_of_all_jobs_are_polled_in_one_batch(w3, account):
+    batches = []
+
+    def post_batch(batch, min_block=None):
+        batches.append([request['method'] for request in batch])
+        return [{'jsonrpc': '2.0', 'id': request['id'], 'result': node_receipt(w3, request['params'][0])}
+                for request in reversed(batch)]
+
+    w3.provider.post_batch = post_batch
+    tx_queue = TransactionQueue(w3, workers=1, poll_interval=0.5)
+    tx_queue.start()
+    job_ids = [tx_queue.submit(Transfer(w3, w3.eth.accounts[2], value=i + 1), {'from': account.address},
+                               account.key) for i in range(5)]
+    statuses = wait(tx_queue, job_ids)
+    assert {status['status'] for status in statuses} == {'mined'}
+    assert {method for batch in batches for method in batch} == {'eth_getTransactionReceipt'}
+    # Fewer requests than jobs: one batch covered several of them
+    assert len(batches) < len(job_ids)
+
+
+def test_out_of_gas_jobs_are_requeued_once(w3, account):
+    tx_queue = TransactionQueue(w3)
+    job_id = tx_queue.submit(Transfer(w3, w3.eth.accounts[2]), {'from': account.address}, account.key)
+    job = tx_queue._queue.get_nowait()
+    out_of_gas = {'status': 0, 'gasUsed': 21000, 'blockNumber': 1}
+
+    job.update(tx={'gas': 21000})
+    tx_queue._settle(job, out_of_gas, '0x01')
+    assert tx_queue._queue.get_nowait() is job
+    assert tx_queue.status(job_id)['status'] == 'queued'
+
+    job.update(tx={'gas': 21000})
+    tx_queue._settle(job, out_of_gas, '0x02')
+    assert tx_queue._queue.empty()
+    assert (tx_queue.status(job_id)['status'], tx_queue.status(job_id)['error']) == ('failed', 'Transaction reverted')
+    assert job.private_key is None
+
+
+def test_unknown_jobs_have_no_status(tx_queue):
+    assert tx_queue.status('missing') is None
+
+
+def test_old_jobs_are_forgotten(w3, account):
+    tx_queue = TransactionQueue(w3, max_jobs=2)
+    job_ids = [tx_queue.submit(Transfer(w3, w3.eth.accounts[2]), {'from': account.address}, account.key)
+               for _ in range(3)]
+    assert tx_queue.status(job_ids[0]) is None
+    assert tx_queue.status(job_ids[2])['status'] == 'queued'
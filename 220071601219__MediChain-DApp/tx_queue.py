@@ -0,0 +1,288 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from web3 import Web3  # type: ignore
+from web3.exceptions import ContractLogicError, TransactionNotFound  # type: ignore
+
+from batch_reads import can_batch, post_batch
+from fees import FeeOracle, GasEstimator
+from nonce_manager import NonceManager
+from signer import Signer
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATES = ('mined', 'failed')
+
+
+class TxJob:
+    """A queued contract write and its progress through sign/broadcast/receipt."""
+
+    def __init__(self, contract_fn, tx_params, private_key, description):
+        self.id = uuid.uuid4().hex
+        self.contract_fn = contract_fn
+        self.tx_params = dict(tx_params)
+        self.private_key = private_key
+        self.description = description
+        self.status = 'queued'
+        self.tx_hash = None
+        self.block_number = None
+        self.error = None
+        self.attempts = 0
+        self.replacements = 0
+        self.gas_retried = False
+        # The signed transaction being awaited and every hash sent for its nonce
+        self.tx = None
+        self.hashes = []
+        self.sent_at = None
+        self.resent_at = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def update(self, **fields):
+        for key, value in fields.items():
+            setattr(self, key, value)
+        self.updated_at = time.time()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'description': self.description,
+            'status': self.status,
+            'tx_hash': self.tx_hash,
+            'block_number': self.block_number,
+            'error': self.error,
+            'attempts': self.attempts,
+            'replacements': self.replacements,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+
+
+class TransactionQueue:
+    """Signs and broadcasts contract writes on worker threads and awaits them on one poller.
+
+    Request handlers call ``submit()`` and return immediately with the job id;
+    callers poll ``status()``. Nonces come from a local ``NonceManager`` so one
+    account can have several writes in flight. Gas limits and fees missing
+    from ``tx_params`` are filled in from a ``GasEstimator`` and ``FeeOracle``,
+    and signing goes through a ``Signer`` (in-thread unless given a pooled one).
+    Workers hand broadcast transactions to a single receipt poller, which asks
+    for the receipts of everything in flight in one JSON-RPC batch per tick
+    (``session`` is used for the batch POSTs). Failed sends are retried and
+    transactions that sit unmined for ``stuck_after`` seconds are replaced at
+    the same nonce with a bumped fee.
+    """
+
+    def __init__(self, w3, workers=4, max_retries=3, stuck_after=60, receipt_timeout=300,
+                 poll_interval=1.0, fee_bump=1.125, max_replacements=3, max_jobs=1000, nonces=None,
+                 fees=None, gas=None, signer=None, session=None):
+        self.w3 = w3
+        self.session = session
+        self.nonces = nonces or NonceManager(w3)
+        self.fees = fees or FeeOracle(w3)
+        self.gas = gas or GasEstimator(w3)
+        self.signer = signer or Signer(w3)
+        self.workers = workers
+        self.max_retries = max_retries
+        self.stuck_after = stuck_after
+        self.receipt_timeout = receipt_timeout
+        self.poll_interval = poll_interval
+        self.fee_bump = fee_bump
+        self.max_replacements = max_replacements
+        self.max_jobs = max_jobs
+
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        # Broadcast jobs awaiting a receipt, by id; only the poller removes them
+        self._watched = {}
+        self._watched_lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        targets = [(self._work, f'medichain-tx-{i}') for i in range(self.workers)]
+        targets.append((self._poll, 'medichain-tx-receipts'))
+        for target, name in targets:
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, contract_fn, tx_params, private_key, description=''):
+        """Queue ``contract_fn`` for sending and return its job id."""
+        job = TxJob(contract_fn, tx_params, private_key, description)
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        self._queue.put(job)
+        return job.id
+
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    # ---------------------- Worker ---------------------- #
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._process(job)
+            except Exception as e:
+                logger.error(f"Transaction job {job.id} crashed: {e}")
+                self._finish(job, status='failed', error=str(e))
+            finally:
+                self._queue.task_done()
+
+    def _process(self, job):
+        """Sign and broadcast ``job``, retrying failed sends, then hand it to the receipt poller."""
+        sender = job.tx_params['from']
+        while True:
+            job.update(attempts=job.attempts + 1)
+            nonce = self.nonces.allocate(sender)
+            try:
+                tx = job.contract_fn.build_transaction(self._tx_params(job, nonce))
+                tx_hash = self._send(tx, job.private_key)
+            except ContractLogicError as e:
+                # Estimation says it would revert; retrying cannot help
+                self.nonces.release(sender, nonce)
+                self._finish(job, status='failed', error=str(e))
+                return
+            except Exception as e:
+                # Nothing was broadcast, so it is safe to try again
+                if self.nonces.is_nonce_error(e):
+                    # Our view of the account is stale (another sender, dropped tx): resync
+                    self.nonces.done(sender)
+                    self.nonces.resync(sender)
+                else:
+                    self.nonces.release(sender, nonce)
+                logger.warning(f"Transaction job {job.id} attempt {job.attempts} failed: {e}")
+                if job.attempts > self.max_retries:
+                    self._finish(job, status='failed', error=str(e))
+                    return
+                job.update(status='queued', error=str(e))
+                time.sleep(min(2 ** job.attempts, 30))
+                continue
+            break
+
+        tx_hash = Web3.to_hex(tx_hash)
+        now = time.time()
+        job.update(status='sent', tx_hash=tx_hash, error=None, tx=tx, hashes=[tx_hash], sent_at=now, resent_at=now)
+        with self._watched_lock:
+            self._watched[job.id] = job
+
+    def _finish(self, job, **fields):
+        # The key is only kept for replacements and resends
+        job.update(private_key=None, tx=None, **fields)
+
+    def _tx_params(self, job, nonce):
+        params = {**job.tx_params, 'nonce': nonce}
+        if 'gas' not in params:
+            params['gas'] = self.gas.estimate(job.contract_fn, params)
+        if not {'gasPrice', 'maxFeePerGas'} & params.keys():
+            params.update(self.fees.fees())
+        return params
+
+    def _send(self, tx, private_key):
+        return self.signer.send(tx, private_key)
+
+    # ---------------------- Receipt poller ---------------------- #
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._watched_lock:
+                jobs = list(self._watched.values())
+            if not jobs:
+                continue
+            try:
+                # A replaced transaction can still be the one that gets mined
+                receipts = self._receipts([tx_hash for job in jobs for tx_hash in job.hashes])
+            except Exception as e:
+                logger.warning(f"Fetching receipts failed: {e}")
+                continue
+            for job in jobs:
+                try:
+                    self._check(job, receipts)
+                except Exception as e:
+                    logger.error(f"Transaction job {job.id} crashed: {e}")
+                    self._unwatch(job)
+                    self._finish(job, status='failed', error=str(e))
+
+    def _receipts(self, hashes):
+        """Receipts of ``hashes`` by hash (``None`` while unmined), in one JSON-RPC batch where possible."""
+        if not can_batch(self.w3):
+            receipts = {}
+            for tx_hash in hashes:
+                try:
+                    receipts[tx_hash] = self.w3.eth.get_transaction_receipt(tx_hash)
+                except TransactionNotFound:
+                    receipts[tx_hash] = None
+            return receipts
+        responses = post_batch(self.w3, [('eth_getTransactionReceipt', [tx_hash]) for tx_hash in hashes],
+                               self.session)
+        receipts = {}
+        for tx_hash, response in zip(hashes, responses):
+            if 'error' in response:
+                raise ValueError(response['error'].get('message'))
+            receipt = response['result']
+            # Only the fields the queue reads are decoded from the raw hex
+            receipts[tx_hash] = receipt and {
+                field: int(receipt[field], 16) for field in ('status', 'blockNumber', 'gasUsed')}
+        return receipts
+
+    def _unwatch(self, job):
+        with self._watched_lock:
+            self._watched.pop(job.id, None)
+
+    def _check(self, job, receipts):
+        sender = job.tx_params['from']
+        mined = next((tx_hash for tx_hash in job.hashes if receipts.get(tx_hash)), None)
+        now = time.time()
+        if mined is not None:
+            self._unwatch(job)
+            self.nonces.done(sender)
+            self._settle(job, receipts[mined], mined)
+        elif now - job.sent_at > self.receipt_timeout:
+            self._unwatch(job)
+            # The nonce may now be a gap that blocks later transactions
+            self.nonces.done(sender)
+            self.nonces.resync(sender)
+            self._finish(job, status='failed', error=f"No receipt after {self.receipt_timeout}s")
+        elif now - job.resent_at > self.stuck_after and job.replacements < self.max_replacements:
+            bumped = self._bump_fees(job.tx)
+            job.update(resent_at=now)
+            try:
+                tx_hash = Web3.to_hex(self._send(bumped, job.private_key))
+            except Exception as e:
+                # e.g. the original was mined meanwhile; keep polling the hashes we have
+                logger.warning(f"Replacing transaction for job {job.id} failed: {e}")
+            else:
+                job.update(tx=bumped, hashes=job.hashes + [tx_hash], replacements=job.replacements + 1,
+                           tx_hash=tx_hash)
+
+    def _settle(self, job, receipt, tx_hash):
+        if receipt['status'] == 1:
+            self._finish(job, status='mined', tx_hash=tx_hash, block_number=receipt['blockNumber'])
+        elif receipt['gasUsed'] >= job.tx['gas'] and 'gas' not in job.tx_params and not job.gas_retried:
+            # Out of gas on a cached estimate for this argument shape: re-estimate once,
+            # sending again from a worker with a fresh nonce
+            self.gas.forget(job.contract_fn)
+            job.update(status='queued', gas_retried=True, tx_hash=tx_hash, error='Out of gas, retrying')
+            self._queue.put(job)
+        else:
+            # Reverted on-chain: retrying would revert again
+            self._finish(job, status='failed', tx_hash=tx_hash, block_number=receipt['blockNumber'],
+                         error='Transaction reverted')
+
+    def _bump_fees(self, tx):
+        """Same nonce, higher fee: nodes require at least a 10% bump to replace."""
+        tx = dict(tx)
+        for field in ('gasPrice', 'maxFeePerGas', 'maxPriorityFeePerGas'):
+            if field in tx:
+                tx[field] = int(tx[field] * self.fee_bump) + 1
+        return tx